@@ -6,12 +6,24 @@ import numpy as np
 from pathlib import Path
 import json
 import ast
+import tempfile
+from contextlib import nullcontext
 
 from PIL import Image
 
-from src.editor import procesar_imagen as procesar_imagen
+from src.editor import procesar_imagen as procesar_imagen, reducir_a_ancho
 from src.utils.escaneo import ejecutar_escanner_interactivo
 from src.utils.crear_template import crear_template_page
+from src.utils.instrumentacion import etapa, sesion_medicion, servir_prometheus
+from src.utils.plantillas import RegistroPlantillas
+from src.utils.cache_resultados import cache_desde_entorno, huella_parametros
+from src.utils.ingesta import decodificar_subida
+from src.utils.captura import capturar
+from src.utils.clasificacion import CONFIANZA_MINIMA, clasificar
+from src.utils.exportar import pdf_caras, a4_combinado
+from src.utils.perspectiva import MOTOR
+from src.utils.apply_watermark import ANGLE, SPACING, FONT_SCALE
+from src.utils.sesion import almacen, guardar_imagen, hay_imagen, huella, imagen, sesion_id
 
 from dotenv import load_dotenv
 
@@ -39,6 +51,142 @@ def local_css(file_name):
 
 local_css("assets/style.css")
 
+DEVELOPMENT = os.getenv('MODE') == 'DEVELOPMENT'
+
+def medicion():
+    # instrumentación por etapas solo en desarrollo (sin coste en producción)
+    return sesion_medicion(log=True) if DEVELOPMENT else nullcontext()
+
+@st.cache_resource
+def cache_descargas():
+    # bytes codificados por huella de (imagen, parámetros, formato, calidad),
+    # compartida por todas las sesiones y purgada periódicamente
+    return cache_desde_entorno('CACHE_DESCARGAS')
+
+@st.cache_resource
+def endpoint_metricas(puerto):
+    # un único servidor /metrics compartido por todas las sesiones
+    return servir_prometheus(puerto, extra=[cache_descargas()])
+
+if DEVELOPMENT and os.getenv('METRICS_PORT'):
+    endpoint_metricas(int(os.getenv('METRICS_PORT')))
+
+@st.cache_resource
+def registro_plantillas():
+    # compartido entre sesiones; recarga solo los JSON cuyo mtime cambie
+    return RegistroPlantillas(os.getenv('TEMPLATES_FOLDER'))
+
+WIDTH_DISPLAY = 600
+
+def imagen_proxy():
+    # copia reducida para la vista previa, guardada con la huella de la
+    # imagen confirmada: solo se despierta la confirmada cuando esta cambia
+    huella_confirmada = huella('confirmada')
+    if huella('proxy') != huella_confirmada:
+        guardar_imagen('proxy', reducir_a_ancho(imagen('confirmada'), WIDTH_DISPLAY), huella_confirmada)
+    return imagen('proxy')
+
+def clasificacion_confirmada():
+    # anverso/reverso de la imagen confirmada, una sola vez por imagen (sobre la vista previa)
+    huella_confirmada = huella('confirmada')
+    guardada = st.session_state.get('clasificacion')
+    if guardada is None or guardada[0] != huella_confirmada:
+        registro = registro_plantillas()
+        guardada = (huella_confirmada, clasificar(imagen_proxy(), [registro.obtener(n) for n in registro.nombres()]))
+        st.session_state.clasificacion = guardada
+    return guardada[1]
+
+def a_rgb(imagen):
+    # las imágenes en gris (2D) se muestran y guardan tal cual
+    return imagen if imagen.ndim == 2 else cv2.cvtColor(imagen, cv2.COLOR_BGR2RGB)
+
+def codificar(imagen, formato, calidad=90):
+    with etapa('rgb', imagen):
+        img_pil = Image.fromarray(a_rgb(imagen))
+    buf = io.BytesIO()
+    with etapa(f'encode_{formato.lower()}', imagen):
+        if formato == "JPEG":
+            # las imágenes en gris se guardan como JPEG de un canal
+            img_pil.save(buf, format="JPEG", quality=calidad)
+        else:
+            img_pil.save(buf, format=formato)
+    return buf.getvalue()
+
+def cargar_subida(fichero):
+    # se decodifica una sola vez por fichero subido (no en cada rerun)
+    if st.session_state.get('subida_id') != fichero.file_id:
+        guardar_imagen('original', decodificar_subida(fichero))
+        st.session_state.subida_id = fichero.file_id
+
+def cargar_video(fichero, max_fotogramas=300):
+    # analiza el vídeo una sola vez por fichero y guarda su mejor fotograma
+    if st.session_state.get('subida_id') == fichero.file_id:
+        return
+    barra = st.progress(0.0, text="Buscando el mejor fotograma...")
+    ruta = None
+    try:
+        with tempfile.NamedTemporaryFile(suffix=Path(fichero.name).suffix, delete=False) as tmp:
+            tmp.write(fichero.getvalue())
+            ruta = tmp.name
+        resultado = capturar(ruta, max_fotogramas=max_fotogramas, tiempo_real=False,
+                             progreso=lambda i, *_: barra.progress(min(1.0, (i + 1) / max_fotogramas)))
+    except ValueError:
+        # vídeo que no se puede abrir o decodificar: no se vuelve a intentar en cada rerun
+        st.session_state.subida_id = fichero.file_id
+        st.session_state.captura = None
+        st.error("No se pudo leer el vídeo. Prueba con otro formato o con una foto.")
+        return
+    finally:
+        barra.empty()
+        if ruta:
+            os.remove(ruta)
+    st.session_state.subida_id = fichero.file_id
+    if resultado["imagen"] is None:
+        st.session_state.captura = None
+        st.error("No se encontró el documento en ningún fotograma. Prueba con otro vídeo o una foto.")
+        return
+    huella_original = guardar_imagen('original', resultado["imagen"])
+    st.session_state.captura = dict(resultado["puntuacion"], indice=resultado["indice"], **resultado["estadisticas"])
+    # las esquinas ya refinadas del fotograma elegido: el recorte Auto las reutiliza
+    st.session_state.deteccion_captura = (huella_original, {"puntos": resultado["puntos"],
+                                                            "confianza": resultado["puntuacion"]["confianza"]})
+
+def deteccion_capturada():
+    # solo vale mientras 'original' siga siendo el fotograma del vídeo
+    guardada = st.session_state.get('deteccion_captura')
+    if guardada is None or guardada[0] != huella('original'):
+        return None
+    return guardada[1]
+
+def panel_instrumentacion(medidor):
+    if medidor is None or not medidor.registros:
+        return
+    with st.sidebar.expander(f"⏱️ Etapas ({medidor.total_ms():.0f} ms)", expanded=False):
+        st.dataframe([
+            {"etapa": r["etapa"], "ms": round(r["ms"], 2),
+             "KB": None if r["bytes"] is None else round(r["bytes"] / 1024),
+             "shape": str(r["shape_salida"] or r["shape_entrada"])}
+            for r in medidor.registros
+        ], hide_index=True)
+
+def panel_memoria():
+    uso = almacen().uso(sesion_id())
+    with st.sidebar.expander(f"🧠 Memoria ({uso['sesion']['bytes'] / 2**20:.1f} MB)", expanded=False):
+        st.dataframe([
+            {"imagen": nombre, "shape": str(tuple(i["shape"])), "viva": i["viva"], "KB": round(i["bytes"] / 1024)}
+            for nombre, i in uso["sesion"]["imagenes"].items()
+        ], hide_index=True)
+        st.caption(f"Global: {uso['bytes'] / 2**20:.1f} / {uso['max_bytes_global'] / 2**20:.0f} MB "
+                   f"en {uso['sesiones']} sesiones · comprimidas {uso['comprimidas']} · "
+                   f"expulsadas {uso['expulsadas']}")
+        cache = cache_descargas().estadisticas()
+        st.caption(f"Caché de descargas: {cache['entradas']} resultados, {cache['bytes'] / 2**20:.1f} MB · "
+                   f"aciertos {cache['aciertos'] + cache['aciertos_disco']} · fallos {cache['fallos']} · "
+                   f"caducadas {cache['caducadas']}")
+        recortes = MOTOR.uso()
+        st.caption(f"Recortes memoizados: {recortes['entradas']}, {recortes['bytes'] / 2**20:.1f} / "
+                   f"{recortes['max_bytes'] / 2**20:.0f} MB")
+
 # --- PERSISTENCIA DE DATOS EN MEMORIA ---
 if "rects" not in st.session_state:
     st.session_state.rects = []
@@ -48,12 +196,10 @@ if "final_json" not in st.session_state:
     st.session_state.final_json = None
 if "nueva_template" not in st.session_state:
     st.session_state.nueva_template = False
-if "imagen_confirmada" not in st.session_state:
-    st.session_state.imagen_confirmada = None
+if "caras" not in st.session_state:
+    st.session_state.caras = {}
 if "crear_template_state" not in st.session_state:
     st.session_state.crear_template_state = False
-if "imagen_original" not in st.session_state:
-    st.session_state.imagen_original = None
 if "vista" not in st.session_state:
     st.session_state.vista = 'inicio'  # 'inicio', 'recorte','general' or 'procesado'
 
@@ -63,31 +209,54 @@ st.sidebar.button("🏠 Selección de imagen", on_click=lambda: st.session_state
 
 # ------- Recorte de imagen ----------
 st.sidebar.divider()
-st.sidebar.button("🔄 Recorte", on_click=lambda: st.session_state.update(vista='recorte', ejecutar_enabled=False, crear_template_state=False), disabled=st.session_state.imagen_original is None)
+st.sidebar.button("🔄 Recorte", on_click=lambda: st.session_state.update(vista='recorte', ejecutar_enabled=False, crear_template_state=False), disabled=not hay_imagen('original'))
 
 modo = st.sidebar.radio("Recorte", ['Auto','Manual','Completa'], index=0, disabled=not st.session_state.vista=='recorte', help="Selecciona el modo de recorte de la imagen.")
 
 # ---- procesar --------------------
 st.sidebar.divider()
-boton_ejecutar = st.sidebar.button("🚀 PROCESAR IMAGEN", disabled=st.session_state.imagen_confirmada is None, on_click=lambda: st.session_state.update(vista='procesado'))
+boton_ejecutar = st.sidebar.button("🚀 PROCESAR IMAGEN", disabled=not hay_imagen('confirmada'), on_click=lambda: st.session_state.update(vista='procesado'))
 
 # -------- blanco y negro ------------
-check_bnw = st.sidebar.checkbox("Blanco y Negro", value=True, disabled=st.session_state.imagen_confirmada is None or st.session_state.vista != 'procesado')
+check_bnw = st.sidebar.checkbox("Blanco y Negro", value=True, disabled=not hay_imagen('confirmada') or st.session_state.vista != 'procesado')
 
 # -------- desenfoque de datos ---------
+opciones_plantilla = registro_plantillas().nombres() if not st.session_state.nueva_template else ["NUEVO"] + registro_plantillas().nombres()
+indice_plantilla, clasificacion = 0, None
+if not st.session_state.nueva_template and hay_imagen('confirmada') and st.session_state.vista == 'procesado':
+    # plantilla elegida automáticamente; con poca confianza se pide a mano
+    clasificacion = clasificacion_confirmada()
+    if clasificacion["confianza"] >= CONFIANZA_MINIMA and clasificacion["plantilla"] in opciones_plantilla:
+        indice_plantilla = opciones_plantilla.index(clasificacion["plantilla"])
+    else:
+        indice_plantilla = None
 name_template = st.sidebar.selectbox(
     "Plantilla",
-    ("DNI_FRONTAL", "DNI_TRASERA") if not st.session_state.nueva_template else ("NUEVO", "DNI_FRONTAL", "DNI_TRASERA"),
+    opciones_plantilla,
     help="Selecciona la plantilla que coincide con el tipo de documento que estás editando.",
-    index=0,
-    disabled=st.session_state.imagen_confirmada is None or st.session_state.vista != 'procesado'
+    index=indice_plantilla,
+    placeholder="Elige la plantilla",
+    disabled=not hay_imagen('confirmada') or st.session_state.vista != 'procesado'
 )
+if indice_plantilla is None:
+    st.sidebar.caption("⚠️ No se ha podido identificar la cara del documento: elige la plantilla.")
+elif clasificacion is not None:
+    st.sidebar.caption(f"🔎 Detectada automáticamente ({clasificacion['confianza']:.0%})")
 
-crear_template = st.sidebar.toggle("🛠️ Crear/Editar plantilla personalizada", disabled=st.session_state.imagen_confirmada is None or st.session_state.vista != 'procesado', key="crear_template_state")
+crear_template = st.sidebar.toggle("🛠️ Crear/Editar plantilla personalizada", disabled=not hay_imagen('confirmada') or st.session_state.vista != 'procesado', key="crear_template_state")
 
 check_desenfoque = True #st.sidebar.checkbox("Seleccionar zonas", value=False)
 st.sidebar.segmented_control("Tipo de desenfoque:", ["Difuminado", "Sólido blanco", "Sólido negro"], key="blur_type", selection_mode="single", default="Difuminado", disabled=st.session_state.vista != 'procesado')
 
+plantilla_elegida = registro_plantillas().obtener(name_template) if name_template not in ("NUEVO", None) else None
+alinear = st.sidebar.checkbox("Alinear con la referencia", value=True,
+                              disabled=st.session_state.vista != 'procesado' or not getattr(plantilla_elegida, 'referencia', None),
+                              help="Ajusta la plantilla a la tarjeta comparándola con su imagen de referencia (templates/<plantilla>.referencia.png).")
+ajustar_texto = st.sidebar.checkbox("Ajustar a texto detectado", value=False, disabled=st.session_state.vista != 'procesado',
+                                    help="Amplía las zonas de la plantilla hasta cubrir el texto que tocan (útil si el recorte no está centrado).")
+suavizar_bordes = st.sidebar.checkbox("Suavizar bordes del difuminado", value=False, disabled=st.session_state.vista != 'procesado',
+                                      help="Funde el borde de las zonas difuminadas con la imagen en lugar de dejar un corte neto.")
+
 if st.session_state.blur_type == "Difuminado":
     gaussiano = True
     solido_blanco = False
@@ -121,6 +290,14 @@ opacidad_marca_de_agua = st.sidebar.slider(
                             step=0.1, disabled=not check_watermark or st.session_state.vista != 'procesado'
                         )
 
+with st.sidebar.expander("Ajustes de la marca de agua", expanded=False):
+    angulo_marca_de_agua = st.slider("Ángulo", min_value=-90, max_value=90, value=ANGLE, step=5,
+                                     disabled=not check_watermark or st.session_state.vista != 'procesado')
+    espaciado_marca_de_agua = st.slider("Espaciado", min_value=0, max_value=300, value=SPACING, step=10,
+                                        disabled=not check_watermark or st.session_state.vista != 'procesado')
+    escala_marca_de_agua = st.slider("Tamaño del texto", min_value=0.5, max_value=5.0, value=FONT_SCALE, step=0.25,
+                                     disabled=not check_watermark or st.session_state.vista != 'procesado')
+
 if st.session_state.watermark_color=='Auto':
     color_marca_de_agua = None
 elif st.session_state.watermark_color=="Blanco":
@@ -138,25 +315,32 @@ st.write("Sube una foto o usa la cámara.")
 
 # Si el usuario no ha pulsado procesar, mostramos la original
 if st.session_state.vista == 'inicio' and not crear_template:
-    imagen_original = None
     
-    tab1, tab2 = st.tabs(["📸 Cámara", "📁 Archivo/Galería"])
+    tab1, tab2, tab3 = st.tabs(["📸 Cámara", "📁 Archivo/Galería", "🎞️ Vídeo"])
 
     with tab1:
         foto_camara = st.camera_input("Tomar foto desde cámara", )
         if foto_camara:
-            file_bytes = np.asarray(bytearray(foto_camara.read()), dtype=np.uint8)
-            st.session_state.imagen_original = cv2.imdecode(file_bytes, 1)
+            cargar_subida(foto_camara)
 
     with tab2:
         foto_archivo = st.file_uploader("Selecciona una imagen", type=["jpg", "jpeg", "png"])
         if foto_archivo:
-            file_bytes = np.asarray(bytearray(foto_archivo.read()), dtype=np.uint8)
-            st.session_state.imagen_original = cv2.imdecode(file_bytes, 1)
+            cargar_subida(foto_archivo)
+
+    with tab3:
+        # se recorre el vídeo y se queda el fotograma más nítido, sin reflejos
+        video = st.file_uploader("Graba unos segundos enfocando el documento", type=["mp4", "mov", "webm", "avi"])
+        if video:
+            cargar_video(video)
+            captura = st.session_state.get('captura')
+            if captura:
+                st.caption(f"Fotograma {captura['indice'] + 1} de {captura['fotogramas']} · "
+                           f"puntuación {captura['puntuacion']:.0%} · confianza {captura['confianza']:.0%} · "
+                           f"reflejos {captura['reflejo']:.1%}")
             
-    if st.session_state.imagen_original is not None:
-        imagen_original = st.session_state.imagen_original
-        WIDTH_DISPLAY = 600
+    imagen_original = imagen('original')
+    if imagen_original is not None:
         ratio = imagen_original.shape[1] / WIDTH_DISPLAY
         new_h = int(imagen_original.shape[0] / ratio)
 
@@ -171,81 +355,134 @@ if st.session_state.vista == 'inicio' and not crear_template:
             
 elif st.session_state.vista == 'recorte' and not crear_template:
 
-    if 'imagen_original' in st.session_state and st.session_state.imagen_original is not None:
+    imagen_original = imagen('original')
+    if imagen_original is not None:
         st.subheader("Vista previa")
-        ejecutar_escanner_interactivo(modo=modo, img_cv2_bgr=st.session_state.imagen_original)
+        with medicion() as medidor:
+            ejecutar_escanner_interactivo(modo=modo, img_cv2_bgr=imagen_original, deteccion=deteccion_capturada(),
+                                          huella_original=huella('original'))
+        panel_instrumentacion(medidor)
 
 elif crear_template:
    crear_template_page()
 
+elif (boton_ejecutar or st.session_state.vista == 'procesado') and not hay_imagen('confirmada'):
+    # el almacén pudo expulsarla (sesión inactiva o memoria agotada)
+    st.warning("⚠️ La imagen ya no está disponible. Vuelve a seleccionarla.")
+
+elif (boton_ejecutar or st.session_state.vista == 'procesado') and name_template is None:
+    st.info("👈 Elige en la barra lateral la plantilla del documento.")
+
 elif boton_ejecutar or st.session_state.vista == 'procesado':
-    # Procesamiento al pulsar el botón
-    with st.spinner("Editando imagen..."):
-        if name_template == "NUEVO":
-            if st.session_state.nueva_template is None:
-                st.error("⚠️ Debes crear y guardar una plantilla personalizada antes de procesar la imagen.")
-                boton_ejecutar = False
-                crear_template = True
+    with medicion() as medidor:
+        # Procesamiento al pulsar el botón
+        with st.spinner("Editando imagen..."):
+            if name_template == "NUEVO":
+                if st.session_state.nueva_template is None:
+                    st.error("⚠️ Debes crear y guardar una plantilla personalizada antes de procesar la imagen.")
+                    st.stop()
+                else:
+                    template = st.session_state.nueva_template
             else:
-                template = st.session_state.nueva_template
-        else:
-            try:
-                with open(os.path.join(os.getenv('TEMPLATES_FOLDER'), Path(name_template).stem + '.json'), 'r') as file:
-                    template = json.load(file)
-            except FileNotFoundError:
-                st.error(f"⚠️ No se encontró la plantilla {name_template}. Por favor, crea una plantilla personalizada.")
-
-        # Llamada a tu función
-        imagen_final = procesar_imagen(
-            st.session_state['imagen_confirmada'], black_n_white=check_bnw,
-            development=(os.getenv('MODE') == 'DEVELOPMENT'), gaussian=gaussiano, solid_white=solido_blanco, solid_black=solido_negro, 
-            watermark=marca_de_agua, template=template, color=color_marca_de_agua, opacidad=opacidad_marca_de_agua
-        )
+                template = registro_plantillas().obtener(name_template)
+                if template is None:
+                    st.error(f"⚠️ No se encontró la plantilla {name_template}. Por favor, crea una plantilla personalizada.")
+                    st.stop()
+
+            parametros = dict(
+                black_n_white=check_bnw, gaussian=gaussiano, solid_white=solido_blanco, solid_black=solido_negro, alinear=alinear, ajustar_texto=ajustar_texto,
+                suavizar_bordes=suavizar_bordes,
+                watermark=marca_de_agua, template=template, color=color_marca_de_agua, opacidad=opacidad_marca_de_agua,
+                max_lado=int(os.getenv('MAX_LADO_SALIDA')) if os.getenv('MAX_LADO_SALIDA') else None,
+                angulo=angulo_marca_de_agua, espaciado=espaciado_marca_de_agua, escala_fuente=escala_marca_de_agua
+            )
+
+            # Vista previa sobre la copia reducida (proxy): cada cambio de un
+            # control solo reprocesa una imagen de WIDTH_DISPLAY px de ancho
+            imagen_final = procesar_imagen(imagen_proxy(), **parametros)
         
-        st.subheader("✨ Resultado")
-        st.image(cv2.cvtColor(imagen_final, cv2.COLOR_BGR2RGB), width='content')
-
-    # 3. CONVERSIÓN DE ARRAY A BYTES
-    # Convertimos el array de NumPy a un objeto de la librería PIL
-    img_pil = Image.fromarray(cv2.cvtColor(imagen_final, cv2.COLOR_BGR2RGB))
-    
-    buf = io.BytesIO()
-    
-    # NOMBRE DE FICHERO
-    name_file = st.text_input('Nombre del fichero:', value="DNI")
-
-    # 4.1 BOTÓN DE DESCARGA JPG
-    img_pil.convert("RGB").save(buf, format="JPEG", quality=90)
-    extension = "jpg"
-    mimetype = "image/jpeg"
-    st.download_button(
-        label=f"📥 Descargar como JPEG",
-        data=buf.getvalue(),
-        file_name=f"{name_file}.{extension}",
-        mime=mimetype,
-        use_container_width=True
-    )
-    
-    st.slider(label="Calidad de imagen JPEG",                  
-                            min_value=0,
-                            max_value=100,
-                            value=90,
-                            step=1)
+            st.subheader("✨ Resultado")
+            st.image(a_rgb(imagen_final), width='content')
+
+        # NOMBRE DE FICHERO
+        name_file = st.text_input('Nombre del fichero:', value="DNI")
+
+        # 3. RENDER A RESOLUCIÓN COMPLETA Y CONVERSIÓN A BYTES
+        # Solo se ejecuta al pulsar un botón de descarga (en otro hilo) y el
+        # resultado se guarda por huella, así que repetirla no recalcula nada.
+        # La imagen completa se pide al almacén solo en ese momento
+        almacen_sesion, sesion = almacen(), sesion_id()
+        huella_completa = huella('confirmada')
+        def descarga(formato, calidad=None):
+            clave = huella_parametros(imagen=huella_completa, formato=formato, calidad=calidad,
+                                      referencia=getattr(parametros["template"], 'referencia', None), **parametros)
+            return lambda: cache_descargas().obtener_o_calcular(
+                clave, lambda: codificar(procesar_imagen(almacen_sesion.obtener(sesion, 'confirmada'), **parametros),
+                                         formato, calidad))
+
+        calidad_jpeg = st.slider(label="Calidad de imagen JPEG",                  
+                                min_value=0,
+                                max_value=100,
+                                value=90,
+                                step=1)
+
+        # 4.1 BOTÓN DE DESCARGA JPG
+        extension = "jpg"
+        mimetype = "image/jpeg"
+        st.download_button(
+            label=f"📥 Descargar como JPEG",
+            data=descarga("JPEG", calidad_jpeg),
+            file_name=f"{name_file}.{extension}",
+            mime=mimetype,
+            use_container_width=True
+        )
     
-    # 4.2 BOTÓN DE DESCARGA PNG
-    img_pil.save(buf, format="PNG")
-    extension = "png"
-    mimetype = "image/png"
-    st.download_button(
-        label=f"📥 Descargar como PNG",
-        data=buf.getvalue(),
-        file_name=f"{name_file}.{extension}",
-        mime=mimetype,
-        use_container_width=True
-    )
+        # 4.2 BOTÓN DE DESCARGA PNG
+        extension = "png"
+        mimetype = "image/png"
+        st.download_button(
+            label=f"📥 Descargar como PNG",
+            data=descarga("PNG"),
+            file_name=f"{name_file}.{extension}",
+            mime=mimetype,
+            use_container_width=True
+        )
+
+        # 4.3 ANVERSO Y REVERSO EN UN ÚNICO FICHERO
+        # Se guarda solo el JPEG de cada cara; el PDF lo incrusta tal cual
+        # (sin recomprimir) y el A4 lo decodifica al descargar
+        cara = template.get("cara") or ("reverso" if name_template == "DNI_TRASERA" else "anverso")
+        if st.button(f"📎 Guardar como {cara}", use_container_width=True):
+            st.session_state.caras[cara] = descarga("JPEG", calidad_jpeg)()
+        caras = st.session_state.caras
+        if "anverso" in caras and "reverso" in caras:
+            jpeg_anverso, jpeg_reverso = caras["anverso"], caras["reverso"]
+            st.download_button(
+                label="📥 Descargar anverso y reverso (PDF)",
+                data=lambda: pdf_caras([jpeg_anverso, jpeg_reverso]),
+                file_name=f"{name_file}.pdf",
+                mime="application/pdf",
+                use_container_width=True
+            )
+            st.download_button(
+                label="📥 Descargar anverso y reverso (A4 JPEG)",
+                data=lambda: codificar(a4_combinado([
+                    cv2.imdecode(np.frombuffer(j, dtype=np.uint8), cv2.IMREAD_UNCHANGED)
+                    for j in (jpeg_anverso, jpeg_reverso)]), "JPEG", calidad_jpeg),
+                file_name=f"{name_file}_A4.jpg",
+                mime="image/jpeg",
+                use_container_width=True
+            )
+        elif caras:
+            st.caption(f"Guardado: {', '.join(caras)}. Procesa la otra cara para descargar ambas juntas.")
+
+    panel_instrumentacion(medidor)
     
 else:
     st.info("👋 ¡Hola! Selecciona una imagen arriba para empezar a editar.")
 
+if DEVELOPMENT:
+    panel_memoria()
+
 # --- 5. PIE DE PÁGINA (TIPO PWA) ---
 st.divider()
\ No newline at end of file
@@ -0,0 +1,116 @@
+"""
+Cobertura y latencia de la alineación de plantillas (src/utils/alineacion.py).
+
+Uso:
+    python -m benchmarks.bench_alineacion
+    python -m benchmarks.bench_alineacion -n 100 --desplazamiento 0.04 --giro 3
+
+Para cada tarjeta sintética la plantilla son sus líneas de texto y la
+referencia es la propia tarjeta limpia. La imagen a redactar es la tarjeta
+desplazada, girada y escalada un poco (recorte impreciso) y degradada
+(desenfoque, ruido, JPEG). Informa:
+
+- cobertura del texto real con las regiones de la plantilla escaladas (sin
+  alinear) y con las alineadas (Plantilla.poligonos con la homografía, como
+  en procesar_imagen), y fracción de tarjetas cubiertas por completo,
+- fracción de tarjetas en las que la alineación se descarta,
+- latencia p50/p95 de homografia() con la referencia ya precalculada, y lo
+  que cuesta precalcularla (lo que se ahorra en cada llamada).
+
+Sale con código 1 si el p95 supera OBJETIVO_MS.
+"""
+import argparse
+import json
+import sys
+import time
+
+import cv2
+import numpy as np
+
+from benchmarks.bench_texto import degradar
+from benchmarks.sinteticas import tarjeta_sintetica
+from src.utils.alineacion import Referencia, homografia
+from src.utils.plantillas import compilar_plantilla
+
+OBJETIVO_MS = 15.0
+
+
+def rasterizar(poligonos, shape):
+    mascara = np.zeros(shape, dtype=np.uint8)
+    for poligono in poligonos:
+        cv2.fillPoly(mascara, [poligono], 1)
+    return mascara.astype(bool)
+
+
+def cobertura(poligonos, texto):
+    # fracción de los píxeles de texto real que quedan dentro de alguna región
+    return (texto & rasterizar(poligonos, texto.shape)).sum() / max(1, texto.sum())
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark de la alineación de plantillas.")
+    parser.add_argument("-n", "--tarjetas", type=int, default=50)
+    parser.add_argument("--ancho", type=int, default=1011)
+    parser.add_argument("--desplazamiento", type=float, default=0.03,
+                        help="Desplazamiento máximo del recorte, relativo al tamaño de la tarjeta")
+    parser.add_argument("--giro", type=float, default=2.0, help="Giro máximo en grados")
+    parser.add_argument("--escala", type=float, default=0.03, help="Variación máxima de escala")
+    args = parser.parse_args(argv)
+
+    cv2.setNumThreads(1)
+    tiempos, precalculo, antes, despues, descartadas = [], [], [], [], 0
+    for seed in range(args.tarjetas):
+        rng = np.random.default_rng(2000 + seed)
+        card, cajas = tarjeta_sintetica(args.ancho, seed=seed, etiquetas=True)
+        h, w = card.shape[:2]
+        # plantilla con una región por línea de texto de la tarjeta limpia
+        plantilla = compilar_plantilla({"version": 2, "size": [w, h], "regiones": [
+            {"nombre": f"linea_{i}", "forma": "rectangulo", "puntos": [[x1 / w, y1 / h], [x2 / w, y2 / h]]}
+            for i, (x1, y1, x2, y2) in enumerate(cajas)]})
+
+        t0 = time.perf_counter()
+        referencia = Referencia(card)
+        precalculo.append((time.perf_counter() - t0) * 1000)
+
+        M = cv2.getRotationMatrix2D((w / 2, h / 2), rng.uniform(-1, 1) * args.giro,
+                                    1 + rng.uniform(-1, 1) * args.escala)
+        M[:, 2] += rng.uniform(-1, 1, 2) * args.desplazamiento * (w, h)
+        recorte = degradar(cv2.warpAffine(card, M, (w, h), borderMode=cv2.BORDER_REPLICATE), rng)
+        H_real = np.vstack([M, [0, 0, 1]]) @ np.diag([w, h, 1.0])
+        texto = rasterizar(plantilla.poligonos((w, h), H_real), (h, w))
+
+        t0 = time.perf_counter()
+        H = homografia(recorte, referencia)
+        tiempos.append((time.perf_counter() - t0) * 1000)
+
+        escalados = plantilla.poligonos((w, h))
+        if H is None:
+            descartadas += 1
+            alineados = escalados
+        else:
+            alineados = plantilla.poligonos((w, h), H)
+        antes.append(cobertura(escalados, texto))
+        despues.append(cobertura(alineados, texto))
+
+    p95 = float(np.percentile(tiempos, 95))
+    resultado = {
+        "tarjetas": args.tarjetas,
+        "cobertura_antes": round(float(np.mean(antes)), 3),
+        "cobertura_despues": round(float(np.mean(despues)), 3),
+        "completas_antes": round(float(np.mean(np.array(antes) >= 0.95)), 3),
+        "completas_despues": round(float(np.mean(np.array(despues) >= 0.95)), 3),
+        "descartadas": round(descartadas / args.tarjetas, 3),
+        "precalculo_ms": round(float(np.median(precalculo)), 2),
+        "p50_ms": round(float(np.percentile(tiempos, 50)), 2),
+        "p95_ms": round(p95, 2),
+        "objetivo_ms": OBJETIVO_MS,
+    }
+    print(json.dumps(resultado, indent=2))
+    if p95 > OBJETIVO_MS:
+        print("FUERA DE OBJETIVO")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
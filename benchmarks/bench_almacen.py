@@ -0,0 +1,70 @@
+"""
+Memoria por sesión con el almacén de imágenes frente a guardar los arrays
+en st.session_state.
+
+Uso:
+    python -m benchmarks.bench_almacen
+    python -m benchmarks.bench_almacen --sesiones 200 --activas 10
+
+Simula sesiones que han subido una foto (reducida a LADO_INGESTA), la han
+recortado y confirmado y tienen la vista previa: antes cada una retenía
+original + recorte/confirmada + proxy como arrays. Con el almacén solo las
+'activas' mantienen arrays; el resto queda comprimido. Informa bytes por
+sesión, sesiones que caben en el mismo presupuesto y el coste de despertar.
+"""
+import argparse
+import json
+import sys
+import time
+
+import numpy as np
+
+from benchmarks.sinteticas import imagen_sintetica, tarjeta_sintetica
+from src.editor import reducir_a_ancho
+from src.utils.almacen import MB, AlmacenImagenes
+from src.utils.ingesta import LADO_INGESTA
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark del almacén de imágenes por sesión.")
+    parser.add_argument("--sesiones", type=int, default=50)
+    parser.add_argument("--activas", type=int, default=5, help="Sesiones que siguen usando sus imágenes")
+    parser.add_argument("--formato", choices=["jpg", "png"], default="png")
+    args = parser.parse_args(argv)
+
+    original = imagen_sintetica(LADO_INGESTA, LADO_INGESTA * 3 // 4, seed=1)
+    recorte = tarjeta_sintetica(1011, seed=2)
+    proxy = reducir_a_ancho(recorte, 600)
+    antes = original.nbytes + recorte.nbytes + proxy.nbytes
+
+    almacen = AlmacenImagenes(max_bytes_sesion=64 * MB, max_bytes_global=1 << 40, formato=args.formato)
+    for i in range(args.sesiones):
+        # cada sesión con sus propios arrays, como en la app
+        almacen.guardar(i, 'original', original.copy())
+        almacen.guardar(i, 'recorte', recorte.copy())
+        almacen.copiar(i, 'recorte', 'confirmada')
+        almacen.guardar(i, 'proxy', proxy.copy())
+    almacen.dormir()
+
+    t0 = time.perf_counter()
+    for i in range(args.activas):
+        almacen.obtener(i, 'confirmada')
+        almacen.obtener(i, 'proxy')
+    despertar_ms = (time.perf_counter() - t0) * 1000 / max(1, args.activas)
+
+    uso = almacen.uso()
+    despues = uso["bytes"] / args.sesiones
+    print(json.dumps({
+        "sesiones": args.sesiones,
+        "activas": args.activas,
+        "mb_por_sesion_antes": round(antes / MB, 2),
+        "mb_por_sesion_almacen": round(despues / MB, 2),
+        "factor_sesiones": round(antes / despues, 1),
+        "despertar_ms": round(despertar_ms, 2),
+        "uso": {k: uso[k] for k in ("bytes", "bytes_vivos", "bytes_comprimidos", "comprimidas", "descomprimidas")},
+    }, indent=2))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,108 @@
+"""
+Acierto y latencia de la clasificación anverso/reverso (src/utils/clasificacion.py).
+
+Uso:
+    python -m benchmarks.bench_clasificacion
+    python -m benchmarks.bench_clasificacion -n 200 --ancho 2000
+
+Clasifica anversos y reversos sintéticos con un recorte algo impreciso
+(desplazamiento, giro y escala) y degradados (desenfoque, ruido, JPEG)
+contra las plantillas de TEMPLATES_FOLDER, en dos casos:
+
+- "mrz": solo con la cara declarada en cada plantilla,
+- "referencia": además con una imagen de referencia sintética por plantilla.
+
+Informa el acierto, la fracción de tarjetas con confianza suficiente
+(el resto se pediría a mano), los errores con confianza suficiente (los
+que no se pueden permitir) y la latencia p50/p95. Sale con código 1 si el
+p95 supera OBJETIVO_MS o si hay algún error con confianza suficiente.
+"""
+import argparse
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+import cv2
+import numpy as np
+from dotenv import load_dotenv
+
+from benchmarks.bench_texto import degradar
+from benchmarks.sinteticas import reverso_sintetico, tarjeta_sintetica
+from src.utils.clasificacion import CONFIANZA_MINIMA, clasificar
+from src.utils.plantillas import RegistroPlantillas
+
+load_dotenv()
+
+OBJETIVO_MS = 5.0
+CARAS = {"anverso": tarjeta_sintetica, "reverso": reverso_sintetico}
+
+
+def recorte_impreciso(card, rng, desplazamiento=0.03, giro=2.0, escala=0.03):
+    h, w = card.shape[:2]
+    M = cv2.getRotationMatrix2D((w / 2, h / 2), rng.uniform(-1, 1) * giro, 1 + rng.uniform(-1, 1) * escala)
+    M[:, 2] += rng.uniform(-1, 1, 2) * desplazamiento * (w, h)
+    return cv2.warpAffine(card, M, (w, h), borderMode=cv2.BORDER_REPLICATE)
+
+
+def evaluar(registro, tarjetas):
+    plantillas = [registro.obtener(n) for n in registro.nombres()]
+    caras = {p.nombre: p.get("cara") for p in plantillas}
+    tiempos, aciertos, seguras, errores_seguros = [], 0, 0, 0
+    for card, esperada in tarjetas:
+        t0 = time.perf_counter()
+        r = clasificar(card, plantillas)
+        tiempos.append((time.perf_counter() - t0) * 1000)
+        acierto = caras.get(r["plantilla"]) == esperada
+        aciertos += acierto
+        if r["confianza"] >= CONFIANZA_MINIMA:
+            seguras += 1
+            errores_seguros += not acierto
+    n = len(tarjetas)
+    return {
+        "acierto": round(aciertos / n, 3),
+        "con_confianza": round(seguras / n, 3),
+        "errores_con_confianza": errores_seguros,
+        "p50_ms": round(float(np.percentile(tiempos, 50)), 2),
+        "p95_ms": round(float(np.percentile(tiempos, 95)), 2),
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark de la clasificación anverso/reverso.")
+    parser.add_argument("-n", "--tarjetas", type=int, default=100, help="Tarjetas por cara")
+    parser.add_argument("--ancho", type=int, default=1011)
+    args = parser.parse_args(argv)
+
+    cv2.setNumThreads(1)
+    tarjetas = []
+    for cara, generar in CARAS.items():
+        for seed in range(args.tarjetas):
+            rng = np.random.default_rng(3000 + seed)
+            tarjetas.append((degradar(recorte_impreciso(generar(args.ancho, seed=seed), rng), rng), cara))
+
+    originales = RegistroPlantillas(os.getenv('TEMPLATES_FOLDER'))
+    resultado = {"tarjetas": len(tarjetas), "confianza_minima": CONFIANZA_MINIMA, "objetivo_ms": OBJETIVO_MS}
+    resultado["mrz"] = evaluar(originales, tarjetas)
+
+    with tempfile.TemporaryDirectory() as carpeta:
+        for nombre in originales.nombres():
+            shutil.copy(os.path.join(originales.carpeta, nombre + ".json"), carpeta)
+            cara = originales.obtener(nombre).get("cara")
+            if cara in CARAS:
+                # una muestra distinta de todas las evaluadas
+                cv2.imwrite(os.path.join(carpeta, nombre + ".referencia.png"), CARAS[cara](args.ancho, seed=10_000))
+        resultado["referencia"] = evaluar(RegistroPlantillas(carpeta), tarjetas)
+
+    print(json.dumps(resultado, indent=2))
+    casos = (resultado["mrz"], resultado["referencia"])
+    if any(c["p95_ms"] > OBJETIVO_MS or c["errores_con_confianza"] for c in casos):
+        print("FUERA DE OBJETIVO")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
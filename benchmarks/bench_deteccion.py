@@ -0,0 +1,63 @@
+"""
+Benchmark puntuado de la detección automática del documento.
+
+Uso:
+    python -m benchmarks.bench_deteccion -n 30 --tamano 12MP
+
+Genera escenas sintéticas con una tarjeta en perspectiva, ejecuta
+detectar_documento y mide la tasa de acierto (error medio de esquina por
+debajo del umbral), el error medio en píxeles y la latencia p50/p95.
+"""
+import argparse
+import json
+import sys
+import time
+
+import cv2
+import numpy as np
+
+from benchmarks.sinteticas import TAMANOS, escena_con_tarjeta
+from src.utils.deteccion import detectar_documento
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark de detección de documentos.")
+    parser.add_argument("-n", "--escenas", type=int, default=30)
+    parser.add_argument("--tamano", choices=list(TAMANOS), default="12MP")
+    parser.add_argument("--umbral", type=float, default=0.01,
+                        help="Error de esquina máximo para contar acierto, relativo al lado mayor")
+    parser.add_argument("-o", "--salida", help="Guardar el resultado en JSON")
+    args = parser.parse_args(argv)
+
+    cv2.setNumThreads(1)
+    w, h = TAMANOS[args.tamano]
+    tiempos, errores, aciertos = [], [], 0
+    for seed in range(args.escenas):
+        img, reales = escena_con_tarjeta(w, h, seed=seed)
+        t0 = time.perf_counter()
+        res = detectar_documento(img)
+        tiempos.append((time.perf_counter() - t0) * 1000)
+        if res is None:
+            continue
+        error = float(np.linalg.norm(res["puntos"] - reales, axis=1).mean())
+        errores.append(error)
+        if error <= args.umbral * max(w, h):
+            aciertos += 1
+
+    resultado = {
+        "tamano": args.tamano,
+        "escenas": args.escenas,
+        "tasa_acierto": aciertos / args.escenas,
+        "error_medio_px": float(np.mean(errores)) if errores else None,
+        "p50_ms": float(np.percentile(tiempos, 50)),
+        "p95_ms": float(np.percentile(tiempos, 95)),
+    }
+    print(json.dumps(resultado, indent=2))
+    if args.salida:
+        with open(args.salida, "w") as f:
+            json.dump(resultado, f, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,69 @@
+"""
+Tamaño y latencia de la exportación conjunta de un par anverso/reverso.
+
+Uso:
+    python -m benchmarks.bench_exportar
+    python -m benchmarks.bench_exportar --ancho 2000 -n 50
+
+Mide pdf_caras (incrustando los JPEG sin recomprimir) y a4_combinado +
+encode sobre dos tarjetas sintéticas ya redactadas y compara con los
+objetivos de src/utils/exportar.py. Sale con código 1 si alguno se supera.
+"""
+import argparse
+import json
+import sys
+import time
+
+import cv2
+import numpy as np
+
+from benchmarks.sinteticas import tarjeta_sintetica
+from src.utils.exportar import a4_combinado, pdf_caras
+
+# (KB, ms) para un par de 1011 px de ancho a calidad 90
+OBJETIVOS = {"pdf": (400, 2.0), "a4": (300, 25.0)}
+
+
+def medir(funcion, repeticiones):
+    tiempos = []
+    for _ in range(repeticiones):
+        t0 = time.perf_counter()
+        datos = funcion()
+        tiempos.append((time.perf_counter() - t0) * 1000)
+    return datos, float(np.percentile(tiempos, 50)), float(np.percentile(tiempos, 95))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark de la exportación anverso/reverso.")
+    parser.add_argument("--ancho", type=int, default=1011, help="Ancho de cada cara (px)")
+    parser.add_argument("--calidad", type=int, default=90)
+    parser.add_argument("--ppp", type=int, default=150)
+    parser.add_argument("-n", "--repeticiones", type=int, default=20)
+    args = parser.parse_args(argv)
+
+    caras = [tarjeta_sintetica(args.ancho, seed=s) for s in (1, 2)]
+    params = [cv2.IMWRITE_JPEG_QUALITY, args.calidad]
+    jpegs = [cv2.imencode(".jpg", c, params)[1].tobytes() for c in caras]
+
+    casos = {
+        "pdf": lambda: pdf_caras(jpegs),
+        "a4": lambda: cv2.imencode(".jpg", a4_combinado(caras, args.ppp), params)[1].tobytes(),
+    }
+    resultados, fuera = {}, []
+    for nombre, funcion in casos.items():
+        datos, p50, p95 = medir(funcion, args.repeticiones)
+        kb = len(datos) / 1024
+        max_kb, max_ms = OBJETIVOS[nombre]
+        resultados[nombre] = {"kb": round(kb, 1), "p50_ms": round(p50, 3), "p95_ms": round(p95, 3),
+                              "objetivo_kb": max_kb, "objetivo_ms": max_ms}
+        if kb > max_kb or p50 > max_ms:
+            fuera.append(nombre)
+
+    print(json.dumps(resultados, indent=2))
+    for nombre in fuera:
+        print(f"FUERA DE OBJETIVO: {nombre}")
+    return 1 if fuera else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,227 @@
+"""
+Micro-benchmarks de las etapas del pipeline de redacción.
+
+Uso:
+    python -m benchmarks.bench_pipeline -o base.json
+    python -m benchmarks.bench_pipeline -o nuevo.json --comparar base.json --umbral 0.15
+    python -m benchmarks.bench_pipeline --rapido --etapas blur watermark
+
+Cada caso (etapa x tamaño x color/gris x variante) se ejecuta en un proceso
+nuevo sobre imágenes sintéticas, de modo que el pico de RSS es el del caso.
+Se guardan p50/p95 de latencia (ms), el pico de RSS (MB), la memoria
+reservada por llamada (pico de tracemalloc) y, en 'encode', el tamaño del
+fichero en JSON. Con --comparar se marca como regresión todo
+caso cuyo p50 empeore más que el umbral relativo, y el script sale con
+código 1.
+"""
+import argparse
+import json
+import platform
+import resource
+import sys
+import time
+import tracemalloc
+from concurrent.futures import ProcessPoolExecutor
+
+import cv2
+import numpy as np
+
+from benchmarks.sinteticas import TAMANOS, imagen_sintetica, escalar_rectangulos
+
+TEMPLATE = {"size": [860, 530], "rectangles": [[[647, 105], [764, 140]], [[730, 375], [845, 413]],
+                                               [[672, 440], [839, 491]], [[335, 384], [493, 414]]]}
+
+ETAPAS = ("procesar_imagen", "watermark", "blur", "rectangulos", "perspectiva", "encode")
+
+
+def _variantes(etapa):
+    from src.utils.redaccion import METODOS
+    if etapa == "procesar_imagen":
+        return ("difuminado", "solido", "inplace")
+    if etapa == "watermark":
+        return ("cache", "frio")
+    if etapa == "blur":
+        return METODOS
+    if etapa == "encode":
+        return ("jpg", "png")
+    return ("-",)
+
+
+def _preparar(etapa, variante, img):
+    """
+    Devuelve (preparar, medir): 'preparar' se llama fuera del cronómetro antes
+    de cada repetición y 'medir' es la operación cronometrada.
+    """
+    h, w = img.shape[:2]
+    rects = escalar_rectangulos(TEMPLATE["rectangles"], TEMPLATE["size"], (w, h))
+    buf = np.empty_like(img)
+
+    def copiar():
+        np.copyto(buf, img)
+
+    if etapa == "procesar_imagen":
+        from src.editor import forma_salida, procesar_imagen
+        template = {"size": [w, h], "rectangles": rects}
+        if variante == "inplace":
+            # difuminado escribiendo en un buffer de salida reutilizado
+            out = np.empty(forma_salida(img, black_n_white=False), dtype=np.uint8)
+            return (lambda: None), lambda: procesar_imagen(img, black_n_white=False, gaussian=True, watermark="COPIA",
+                                                           template=template, color=(0, 0, 255), inplace=True, out=out)
+        gaussian = variante == "difuminado"
+        return copiar, lambda: procesar_imagen(buf, black_n_white=False, gaussian=gaussian, solid_black=not gaussian,
+                                               watermark="COPIA", template=template, color=(0, 0, 255))
+
+    if etapa == "watermark":
+        from src.utils.apply_watermark import apply_rotated_watermark, _mascara_marca_de_agua, _sello
+
+        def frio():
+            _mascara_marca_de_agua.cache_clear()
+            _sello.cache_clear()
+        preparar = frio if variante == "frio" else (lambda: None)
+        return preparar, lambda: apply_rotated_watermark(img, "COPIA", 35, opacity=0.5, color=(0, 0, 255))
+
+    if etapa == "blur":
+        from src.utils.rectangles import apply_gaussian_blur_to_rectangle
+        return copiar, lambda: apply_gaussian_blur_to_rectangle(buf, rects, metodo=variante)
+
+    if etapa == "rectangulos":
+        from src.utils.rectangles import draw_rectangle_on_image
+        return copiar, lambda: draw_rectangle_on_image(buf, rects, color=(0, 0, 0), thickness=-1)
+
+    if etapa == "perspectiva":
+        from src.utils.perspectiva import MOTOR
+        puntos = np.float32([[0.08 * w, 0.12 * h], [0.93 * w, 0.05 * h], [0.95 * w, 0.9 * h], [0.05 * w, 0.95 * h]])
+        # sin memoización: se mide el warp completo
+        return MOTOR.limpiar, lambda: MOTOR.recortar(img, puntos)
+
+    if etapa == "encode":
+        # en gris se codifica un JPEG/PNG de un canal
+        params = [cv2.IMWRITE_JPEG_QUALITY, 90] if variante == "jpg" else []
+        return (lambda: None), lambda: cv2.imencode("." + variante, img, params)[1]
+
+    raise ValueError(f"Etapa desconocida: {etapa}")
+
+
+def ejecutar_caso(caso, repeticiones, calentamiento):
+    """
+    Ejecuta un caso en el proceso actual y devuelve sus métricas.
+    """
+    cv2.setNumThreads(1)
+    w, h = TAMANOS[caso["tamano"]]
+    img = imagen_sintetica(w, h, color=caso["color"])
+    preparar, medir = _preparar(caso["etapa"], caso["variante"], img)
+
+    for _ in range(calentamiento):
+        preparar()
+        medir()
+
+    tiempos = []
+    for _ in range(repeticiones):
+        preparar()
+        t0 = time.perf_counter()
+        resultado = medir()
+        tiempos.append((time.perf_counter() - t0) * 1000)
+
+    # memoria reservada por una llamada (pico de tracemalloc, incluye los arrays de numpy/OpenCV)
+    preparar()
+    tracemalloc.start()
+    medir()
+    _, pico = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    # ru_maxrss: KB en Linux, bytes en macOS
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    rss_mb = rss / (1024 * 1024) if sys.platform == "darwin" else rss / 1024
+
+    metricas = dict(caso, p50_ms=float(np.percentile(tiempos, 50)), p95_ms=float(np.percentile(tiempos, 95)),
+                    repeticiones=repeticiones, rss_pico_mb=rss_mb, asignado_mb=pico / (1024 * 1024))
+    if caso["etapa"] == "encode":
+        metricas["bytes_salida"] = int(resultado.nbytes)
+    return metricas
+
+
+def generar_casos(etapas, tamanos, colores):
+    casos = []
+    for etapa in etapas:
+        for variante in _variantes(etapa):
+            for tamano in tamanos:
+                for color in colores:
+                    casos.append({"id": f"{etapa}/{variante}/{tamano}/{'color' if color else 'gris'}",
+                                  "etapa": etapa, "variante": variante, "tamano": tamano, "color": color})
+    return casos
+
+
+def comparar(resultados, base, umbral):
+    """
+    Compara p50 contra un fichero de resultados anterior.
+
+    Returns:
+        list: [(id, p50_base, p50_nuevo, ratio), ...] de los casos que empeoran más que 'umbral'.
+    """
+    previos = {r["id"]: r for r in base["resultados"]}
+    regresiones = []
+    for r in resultados:
+        anterior = previos.get(r["id"])
+        if anterior is None or anterior["p50_ms"] <= 0:
+            continue
+        ratio = r["p50_ms"] / anterior["p50_ms"]
+        if ratio > 1 + umbral:
+            regresiones.append((r["id"], anterior["p50_ms"], r["p50_ms"], ratio))
+    return regresiones
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmarks del pipeline de redacción.")
+    parser.add_argument("-o", "--salida", default="bench_output.json", help="Fichero JSON de resultados")
+    parser.add_argument("--etapas", nargs="+", choices=ETAPAS, default=list(ETAPAS))
+    parser.add_argument("--tamanos", nargs="+", choices=list(TAMANOS), default=list(TAMANOS))
+    parser.add_argument("--solo-color", action="store_true", help="No medir la variante en gris")
+    parser.add_argument("-n", "--repeticiones", type=int, default=20)
+    parser.add_argument("--calentamiento", type=int, default=2)
+    parser.add_argument("--rapido", action="store_true", help="Solo VGA y HD, 5 repeticiones")
+    parser.add_argument("--comparar", help="JSON de una ejecución anterior")
+    parser.add_argument("--umbral", type=float, default=0.15, help="Empeoramiento relativo del p50 tolerado")
+    args = parser.parse_args(argv)
+
+    tamanos = ["VGA", "HD"] if args.rapido else args.tamanos
+    repeticiones = 5 if args.rapido else args.repeticiones
+    casos = generar_casos(args.etapas, tamanos, (True,) if args.solo_color else (True, False))
+
+    resultados = []
+    # un proceso por caso para que el pico de RSS no arrastre casos anteriores
+    with ProcessPoolExecutor(max_workers=1, max_tasks_per_child=1) as pool:
+        for caso in casos:
+            r = pool.submit(ejecutar_caso, caso, repeticiones, args.calentamiento).result()
+            resultados.append(r)
+            tamano = f"  {r['bytes_salida'] / 1024:8.1f} KB" if "bytes_salida" in r else ""
+            print(f"{r['id']:<45} p50 {r['p50_ms']:9.2f} ms  p95 {r['p95_ms']:9.2f} ms  RSS {r['rss_pico_mb']:7.1f} MB  "
+                  f"reservado {r['asignado_mb']:7.1f} MB{tamano}")
+
+    salida = {
+        "meta": {
+            "fecha": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "python": platform.python_version(),
+            "opencv": cv2.__version__,
+            "numpy": np.__version__,
+            "maquina": platform.machine(),
+            "procesador": platform.processor(),
+        },
+        "resultados": resultados,
+    }
+    with open(args.salida, "w") as f:
+        json.dump(salida, f, indent=2)
+
+    if args.comparar:
+        with open(args.comparar) as f:
+            base = json.load(f)
+        regresiones = comparar(resultados, base, args.umbral)
+        for caso_id, antes, ahora, ratio in regresiones:
+            print(f"REGRESIÓN {caso_id}: {antes:.2f} ms -> {ahora:.2f} ms (x{ratio:.2f})")
+        if regresiones:
+            return 1
+        print(f"Sin regresiones (umbral {args.umbral:.0%}).")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,113 @@
+"""
+Precisión, exhaustividad y latencia del detector de texto (src/utils/texto.py).
+
+Uso:
+    python -m benchmarks.bench_texto
+    python -m benchmarks.bench_texto -n 100 --ancho 1011 --desplazamiento 0.04
+
+Sobre tarjetas sintéticas etiquetadas (una caja por línea de texto), con
+ruido, desenfoque y recompresión JPEG:
+
+- precisión / exhaustividad por caja (IoU >= --iou con una caja real),
+- cobertura del texto real con la plantilla desplazada (recorte
+  descentrado) antes y después de ajustar_rectangulos,
+- latencia p50/p95 de detectar_texto en un núcleo.
+
+Sale con código 1 si el p95 supera OBJETIVO_MS.
+"""
+import argparse
+import json
+import sys
+import time
+
+import cv2
+import numpy as np
+
+from benchmarks.sinteticas import tarjeta_sintetica
+from src.utils.texto import ajustar_rectangulos, detectar_texto
+
+OBJETIVO_MS = 50.0
+
+
+def degradar(card, rng):
+    card = cv2.GaussianBlur(card, (0, 0), rng.uniform(0.3, 1.2))
+    card = cv2.add(card, rng.integers(0, 18, size=card.shape, dtype=np.uint8))
+    ok, buf = cv2.imencode(".jpg", card, [cv2.IMWRITE_JPEG_QUALITY, int(rng.integers(60, 90))])
+    return cv2.imdecode(buf, cv2.IMREAD_COLOR)
+
+
+def iou(a, b):
+    ix = max(0, min(a[2], b[2]) - max(a[0], b[0]))
+    iy = max(0, min(a[3], b[3]) - max(a[1], b[1]))
+    inter = ix * iy
+    union = (a[2] - a[0]) * (a[3] - a[1]) + (b[2] - b[0]) * (b[3] - b[1]) - inter
+    return inter / union if union else 0.0
+
+
+def cobertura(rects, cajas, shape):
+    # fracción de los píxeles de texto real que quedan dentro de algún rectángulo
+    texto = np.zeros(shape, dtype=bool)
+    cubierto = np.zeros(shape, dtype=bool)
+    for x1, y1, x2, y2 in cajas:
+        texto[y1:y2, x1:x2] = True
+    for x1, y1, x2, y2 in rects:
+        cubierto[max(0, y1):y2, max(0, x1):x2] = True
+    return (texto & cubierto).sum() / max(1, texto.sum())
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark del detector de texto.")
+    parser.add_argument("-n", "--tarjetas", type=int, default=50)
+    parser.add_argument("--ancho", type=int, default=1011)
+    parser.add_argument("--iou", type=float, default=0.5)
+    parser.add_argument("--desplazamiento", type=float, default=0.03,
+                        help="Desplazamiento máximo de la plantilla, relativo al tamaño de la tarjeta")
+    args = parser.parse_args(argv)
+
+    cv2.setNumThreads(1)
+    tiempos, verdaderos, detectadas, recuperadas, reales = [], 0, 0, 0, 0
+    antes, despues = [], []
+    for seed in range(args.tarjetas):
+        rng = np.random.default_rng(1000 + seed)
+        card, cajas = tarjeta_sintetica(args.ancho, seed=seed, etiquetas=True)
+        card = degradar(card, rng)
+        h, w = card.shape[:2]
+
+        t0 = time.perf_counter()
+        propuestas = detectar_texto(card)
+        tiempos.append((time.perf_counter() - t0) * 1000)
+
+        detectadas += len(propuestas)
+        reales += len(cajas)
+        verdaderos += sum(any(iou(p, c) >= args.iou for c in cajas) for p in propuestas)
+        recuperadas += sum(any(iou(p, c) >= args.iou for p in propuestas) for c in cajas)
+
+        # plantilla = algunas líneas reales, desplazadas como en un recorte descentrado
+        elegidas = [c for c in cajas if rng.random() < 0.5] or cajas[:1]
+        dx, dy = (rng.uniform(-1, 1, 2) * args.desplazamiento * (w, h)).round().astype(int)
+        plantilla = [(x1 + dx, y1 + dy, x2 + dx, y2 + dy) for x1, y1, x2, y2 in elegidas]
+        antes.append(cobertura(plantilla, elegidas, (h, w)))
+        despues.append(cobertura(ajustar_rectangulos(plantilla, propuestas, (w, h)), elegidas, (h, w)))
+
+    p95 = float(np.percentile(tiempos, 95))
+    resultado = {
+        "tarjetas": args.tarjetas,
+        "precision": round(verdaderos / max(1, detectadas), 3),
+        "exhaustividad": round(recuperadas / max(1, reales), 3),
+        "cobertura_antes": round(float(np.mean(antes)), 3),
+        "cobertura_despues": round(float(np.mean(despues)), 3),
+        "completas_antes": round(float(np.mean(np.array(antes) >= 0.99)), 3),
+        "completas_despues": round(float(np.mean(np.array(despues) >= 0.99)), 3),
+        "p50_ms": round(float(np.percentile(tiempos, 50)), 2),
+        "p95_ms": round(p95, 2),
+        "objetivo_ms": OBJETIVO_MS,
+    }
+    print(json.dumps(resultado, indent=2))
+    if p95 > OBJETIVO_MS:
+        print("FUERA DE OBJETIVO")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,90 @@
+"""
+Prueba de carga del servicio HTTP de redacción (src/servicio.py).
+
+Uso:
+    python -m src.servicio --workers 4 &
+    python -m benchmarks.carga_servicio --url http://127.0.0.1:8600 -n 200 -c 16
+
+Envía 'n' peticiones con 'c' en vuelo usando una escena sintética (o la
+imagen indicada con --imagen) y reporta peticiones por segundo, latencias
+p50/p95/p99 y códigos de respuesta. Cada petición añade unos bytes tras el
+final del JPEG para no acertar en la caché de resultados del servicio;
+con --repetir se envía siempre el mismo cuerpo y se cuentan los aciertos.
+"""
+import argparse
+import asyncio
+import json
+import sys
+import time
+from collections import Counter
+
+import cv2
+import numpy as np
+from tornado.httpclient import AsyncHTTPClient, HTTPClientError
+
+from benchmarks.sinteticas import TAMANOS, escena_con_tarjeta
+
+
+async def _lanzar(url, cuerpo, n, concurrencia, timeout, repetir=False):
+    cliente = AsyncHTTPClient(max_clients=concurrencia)
+    pendientes = iter(range(n))
+    latencias, codigos, cache = [], Counter(), Counter()
+
+    async def trabajador():
+        for i in pendientes:
+            t0 = time.perf_counter()
+            try:
+                r = await cliente.fetch(url, method="POST", body=cuerpo if repetir else cuerpo + i.to_bytes(4, "big"),
+                                         headers={"Content-Type": "application/octet-stream"}, request_timeout=timeout)
+                codigos[r.code] += 1
+                cache[r.headers.get("X-Cache", "-")] += 1
+            except HTTPClientError as e:
+                codigos[e.code] += 1
+            except Exception as e:
+                codigos[type(e).__name__] += 1
+            latencias.append((time.perf_counter() - t0) * 1000)
+
+    t0 = time.perf_counter()
+    await asyncio.gather(*(trabajador() for _ in range(concurrencia)))
+    return time.perf_counter() - t0, latencias, codigos, cache
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Prueba de carga del servicio de redacción.")
+    parser.add_argument("--url", default="http://127.0.0.1:8600")
+    parser.add_argument("-n", "--peticiones", type=int, default=100)
+    parser.add_argument("-c", "--concurrencia", type=int, default=8)
+    parser.add_argument("--imagen", help="Imagen a enviar (por defecto, una escena sintética)")
+    parser.add_argument("--tamano", choices=list(TAMANOS), default="FHD")
+    parser.add_argument("--query", default="template=DNI_FRONTAL&recorte=Auto&desenfoque=Difuminado&formato=jpg")
+    parser.add_argument("--timeout", type=float, default=60.0)
+    parser.add_argument("--repetir", action="store_true", help="Enviar siempre el mismo cuerpo (mide la caché)")
+    args = parser.parse_args(argv)
+
+    if args.imagen:
+        with open(args.imagen, "rb") as f:
+            cuerpo = f.read()
+    else:
+        img, _ = escena_con_tarjeta(*TAMANOS[args.tamano])
+        cuerpo = cv2.imencode(".jpg", img, [cv2.IMWRITE_JPEG_QUALITY, 90])[1].tobytes()
+
+    url = f"{args.url.rstrip('/')}/redactar?{args.query}"
+    segundos, latencias, codigos, cache = asyncio.run(
+        _lanzar(url, cuerpo, args.peticiones, args.concurrencia, args.timeout, args.repetir))
+    resultado = {
+        "peticiones": args.peticiones,
+        "concurrencia": args.concurrencia,
+        "segundos": segundos,
+        "peticiones_por_segundo": args.peticiones / segundos,
+        "p50_ms": float(np.percentile(latencias, 50)),
+        "p95_ms": float(np.percentile(latencias, 95)),
+        "p99_ms": float(np.percentile(latencias, 99)),
+        "codigos": {str(k): v for k, v in codigos.items()},
+        "cache": dict(cache),
+    }
+    print(json.dumps(resultado, indent=2))
+    return 0 if set(codigos) == {200} else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,154 @@
+"""
+Generadores de imágenes sintéticas para los benchmarks (no se guarda ninguna
+imagen real de DNI en el repositorio).
+"""
+import cv2
+import numpy as np
+
+TAMANOS = {
+    "VGA": (640, 480),
+    "HD": (1280, 720),
+    "FHD": (1920, 1080),
+    "12MP": (4000, 3000),
+}
+
+
+def imagen_sintetica(w, h, color=True, seed=0):
+    """
+    Imagen con degradado, ruido y líneas de texto, parecida en contenido
+    (bordes, zonas planas) a una foto de un documento.
+
+    Args:
+        w (int), h (int): tamaño en píxeles.
+        color (bool): BGR si es True, gris (2D) si es False.
+        seed (int): semilla del ruido.
+
+    Returns:
+        np.ndarray: imagen uint8.
+    """
+    rng = np.random.default_rng(seed)
+    gx = np.linspace(60, 200, w, dtype=np.float32)[None, :]
+    gy = np.linspace(0, 40, h, dtype=np.float32)[:, None]
+    base = gx + gy
+    img = np.empty((h, w, 3), dtype=np.uint8)
+    for c, desplazamiento in enumerate((0, 15, 30)):
+        img[:, :, c] = np.clip(base + desplazamiento, 0, 255)
+    img = cv2.add(img, rng.integers(0, 12, size=(h, w, 3), dtype=np.uint8))
+
+    escala = max(w / 860, 0.5)
+    paso = int(40 * escala)
+    for i, y in enumerate(range(paso, h - paso // 2, paso)):
+        cv2.putText(img, f"LINEA {i} ABCDEFGH 12345678", (int(20 * escala), y), cv2.FONT_HERSHEY_SIMPLEX,
+                    0.8 * escala, (20, 20, 20), max(1, int(2 * escala)), cv2.LINE_AA)
+
+    if not color:
+        img = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
+    return img
+
+
+def escalar_rectangulos(rectangles, size_origen, size_destino):
+    """
+    Escala los rectángulos de una plantilla (pensados para size_origen) a otro tamaño.
+    """
+    fx = size_destino[0] / size_origen[0]
+    fy = size_destino[1] / size_origen[1]
+    return [[[int(p[0] * fx), int(p[1] * fy)] for p in r] for r in rectangles]
+
+
+def tarjeta_sintetica(ancho=856, seed=0, etiquetas=False):
+    """
+    Tarjeta ID-1 (85.6 x 54 mm) sintética: fondo claro, foto, bloques de
+    texto y banda inferior, con la misma maquetación aproximada que un DNI.
+
+    Args:
+        etiquetas (bool): devolver también las cajas de cada línea de texto.
+
+    Returns:
+        np.ndarray: imagen BGR uint8 de ancho x ancho/1.585, o
+        tuple: (imagen, [(x1, y1, x2, y2), ...]) con etiquetas=True.
+    """
+    rng = np.random.default_rng(seed)
+    alto = round(ancho * 54 / 85.6)
+    e = ancho / 856
+    base = rng.integers(190, 235, size=3)
+    card = np.empty((alto, ancho, 3), dtype=np.uint8)
+    card[:] = base
+    card = cv2.add(card, rng.integers(0, 10, size=(alto, ancho, 3), dtype=np.uint8))
+    cv2.rectangle(card, (int(30 * e), int(90 * e)), (int(260 * e), int(400 * e)),
+                  tuple(int(v) for v in rng.integers(60, 140, size=3)), -1)
+    cajas = []
+    for i, y in enumerate(range(int(110 * e), int(460 * e), int(52 * e))):
+        texto = "".join(rng.choice(list("ABCDEFGHJKLMNPRSTUVWXYZ0123456789"), size=int(rng.integers(6, 14))))
+        grosor = max(1, int(2 * e))
+        cv2.putText(card, texto, (int(300 * e), y), cv2.FONT_HERSHEY_SIMPLEX, 0.9 * e, (30, 30, 30),
+                    grosor, cv2.LINE_AA)
+        # solo mayúsculas y dígitos: la tinta acaba en la línea base (sin descendentes)
+        (tw, th), _ = cv2.getTextSize(texto, cv2.FONT_HERSHEY_SIMPLEX, 0.9 * e, grosor)
+        cajas.append((int(300 * e), y - th, int(300 * e) + tw, y + grosor))
+    cv2.rectangle(card, (0, int(470 * e)), (ancho - 1, alto - 1), tuple(int(v) for v in base - 40), -1)
+    return (card, cajas) if etiquetas else card
+
+
+def reverso_sintetico(ancho=856, seed=0):
+    """
+    Reverso sintético de una tarjeta ID-1: unas líneas cortas de texto arriba
+    y las tres líneas de la zona MRZ ocupando casi todo el ancho abajo, con
+    la maquetación aproximada del reverso de un DNI.
+
+    Returns:
+        np.ndarray: imagen BGR uint8 de ancho x ancho/1.585.
+    """
+    rng = np.random.default_rng(seed)
+    alto = round(ancho * 54 / 85.6)
+    e = ancho / 856
+    base = rng.integers(190, 235, size=3)
+    card = np.empty((alto, ancho, 3), dtype=np.uint8)
+    card[:] = base
+    card = cv2.add(card, rng.integers(0, 10, size=(alto, ancho, 3), dtype=np.uint8))
+    grosor = max(1, int(2 * e))
+    for y in range(int(60 * e), int(300 * e), int(48 * e)):
+        texto = "".join(rng.choice(list("ABCDEFGHJKLMNPRSTUVWXYZ 0123456789"), size=int(rng.integers(8, 24))))
+        cv2.putText(card, texto, (int(30 * e), y), cv2.FONT_HERSHEY_SIMPLEX, 0.8 * e, (30, 30, 30),
+                    grosor, cv2.LINE_AA)
+    # MRZ: 3 líneas de 30 caracteres de paso fijo entre x = 14 y 821 (a 856 de ancho)
+    caracteres = list("ABCDEFGHIJKLMNOPQRSTUVWXYZ0123456789<<<<<<")
+    paso = 807 * e / 30
+    for y in (int(400 * e), int(440 * e), int(480 * e)):
+        for i, c in enumerate(rng.choice(caracteres, size=30)):
+            cv2.putText(card, str(c), (int(14 * e + i * paso), y), cv2.FONT_HERSHEY_SIMPLEX, 0.85 * e, (30, 30, 30),
+                        grosor, cv2.LINE_AA)
+    return card
+
+
+def escena_con_tarjeta(w=4000, h=3000, seed=0, card=None):
+    """
+    Coloca una tarjeta sintética con una perspectiva aleatoria sobre un fondo
+    texturizado más oscuro.
+
+    Returns:
+        tuple: (imagen BGR, esquinas reales (4, 2) float32 en orden tl, tr, br, bl).
+    """
+    rng = np.random.default_rng(seed)
+    if card is None:
+        card = tarjeta_sintetica(seed=seed)
+    ch, cw = card.shape[:2]
+
+    fondo = rng.integers(40, 110, size=(h // 16 + 1, w // 16 + 1, 3), dtype=np.uint8)
+    img = cv2.resize(fondo, (w, h), interpolation=cv2.INTER_CUBIC)
+    img = cv2.add(img, rng.integers(0, 20, size=(h, w, 3), dtype=np.uint8))
+
+    # tarjeta ocupando entre el 40% y el 75% del ancho, con cierta perspectiva
+    ancho = rng.uniform(0.4, 0.75) * w
+    alto = ancho * ch / cw
+    cx = rng.uniform(0.5 * ancho, w - 0.5 * ancho)
+    cy = rng.uniform(0.5 * alto + 0.05 * h, h - 0.5 * alto - 0.05 * h)
+    angulo = np.deg2rad(rng.uniform(-12, 12))
+    base = np.array([[-ancho / 2, -alto / 2], [ancho / 2, -alto / 2], [ancho / 2, alto / 2], [-ancho / 2, alto / 2]])
+    rot = np.array([[np.cos(angulo), -np.sin(angulo)], [np.sin(angulo), np.cos(angulo)]])
+    jitter = rng.uniform(-0.04, 0.04, size=(4, 2)) * (ancho, alto)
+    esquinas = (base @ rot.T + jitter + (cx, cy)).astype(np.float32)
+
+    origen = np.float32([[0, 0], [cw, 0], [cw, ch], [0, ch]])
+    M = cv2.getPerspectiveTransform(origen, esquinas)
+    cv2.warpPerspective(card, M, (w, h), dst=img, borderMode=cv2.BORDER_TRANSPARENT)
+    return img, esquinas
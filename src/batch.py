@@ -0,0 +1,316 @@
+"""
+Modo por lotes (sin Streamlit) para redactar muchos DNIs de una vez.
+
+Uso:
+    python -m src.batch ./entrada --template DNI_FRONTAL --salida ./salida
+    python -m src.batch "./entrada/*_front.jpg" -t DNI_FRONTAL -o ./salida --workers 8
+    python -m src.batch ./entrada -t auto -o ./salida --recorte Auto
+
+Cada fichero pasa por decode -> recorte -> procesar_imagen -> encode en un
+ProcessPoolExecutor. Con '-t auto' la plantilla (anverso/reverso) se elige
+para cada fichero tras el recorte (src/utils/clasificacion.py); si la
+confianza es baja el fichero falla y se lista en el resumen. Al final se escribe un resumen por fichero (tiempos y
+fallos) en <salida>/resumen.json.
+
+La salida conserva las subcarpetas de la entrada (relativas a la carpeta
+común, p.ej. con un glob recursivo) y, si dos ficheros de la misma carpeta
+solo difieren en la extensión, la original se mantiene en el nombre
+(a.png -> a.png.jpg) para que ninguno sobrescriba a otro.
+"""
+import argparse
+import glob
+import json
+import os
+import sys
+import time
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import cv2
+from dotenv import load_dotenv
+
+from src.editor import forma_salida, procesar_imagen
+from src.utils.espacio_trabajo import ESPACIO
+from src.utils.plantillas import RegistroPlantillas
+from src.utils.clasificacion import elegir_plantilla
+from src.utils.deteccion import detectar_documento
+from src.utils.perspectiva import MOTOR, leer_politica
+
+load_dotenv()
+
+EXTENSIONES = (".jpg", ".jpeg", ".png")
+PLANTILLA_AUTO = "auto"
+
+# estado por proceso (se rellena en _init_worker)
+_opciones = None
+
+
+def listar_imagenes(entrada):
+    """
+    Devuelve la lista ordenada de imágenes a procesar.
+
+    Args:
+        entrada (str): directorio o patrón glob.
+
+    Returns:
+        list: rutas de las imágenes encontradas.
+    """
+    if os.path.isdir(entrada):
+        rutas = [os.path.join(entrada, f) for f in os.listdir(entrada)]
+    else:
+        rutas = glob.glob(entrada, recursive=True)
+    return sorted(r for r in rutas if r.lower().endswith(EXTENSIONES) and os.path.isfile(r))
+
+
+def nombres_salida(rutas, carpeta, extension):
+    """
+    Fichero de salida de cada imagen, sin que dos entradas compartan uno.
+
+    Returns:
+        dict: {ruta: <carpeta>/<subcarpeta relativa>/<nombre><extension>}.
+    """
+    if not rutas:
+        return {}
+    base = os.path.commonpath([os.path.dirname(os.path.abspath(r)) for r in rutas])
+    relativas = {r: os.path.relpath(os.path.abspath(r), base) for r in rutas}
+    repetidas = Counter(os.path.splitext(rel)[0] for rel in relativas.values())
+    salidas = {}
+    for ruta, rel in relativas.items():
+        raiz = os.path.splitext(rel)[0]
+        salidas[ruta] = os.path.join(carpeta, (rel if repetidas[raiz] > 1 else raiz) + extension)
+    return salidas
+
+
+def cargar_template(name_template):
+    template = RegistroPlantillas(os.getenv('TEMPLATES_FOLDER')).obtener(name_template)
+    if template is None:
+        raise FileNotFoundError(f"No se encontró la plantilla {name_template}")
+    return template
+
+
+def cargar_plantillas():
+    # candidatas de '-t auto'
+    registro = RegistroPlantillas(os.getenv('TEMPLATES_FOLDER'))
+    plantillas = [registro.obtener(n) for n in registro.nombres()]
+    if not plantillas:
+        raise FileNotFoundError(f"No hay plantillas en {registro.carpeta}")
+    return plantillas
+
+
+def recortar(image, modo, politica='bordes', max_lado=None):
+    """
+    Recorte previo a procesar_imagen. 'Completa' usa la imagen entera y
+    'Auto' detecta el documento y corrige su perspectiva; con max_lado el
+    recorte y la reducción de tamaño se hacen en un único warp.
+    """
+    if modo == 'Completa':
+        return image
+    if modo == 'Auto':
+        deteccion = detectar_documento(image)
+        if deteccion is None:
+            raise ValueError("No se detectó el documento")
+        return MOTOR.recortar(image, deteccion["puntos"], politica=politica, max_lado=max_lado)
+    raise ValueError(f"Modo de recorte no soportado en lotes: {modo}")
+
+
+def redactar(image, op, template, buffer="salida"):
+    """
+    procesar_imagen con las opciones del lote, escribiendo en el buffer de
+    salida 'buffer' del proceso (reutilizado entre ficheros del mismo tamaño).
+    El resultado es válido hasta la siguiente llamada con el mismo 'buffer'.
+    """
+    out = ESPACIO.obtener(buffer, forma_salida(image, op["black_n_white"], op["max_lado"]))
+    return procesar_imagen(
+        image, black_n_white=op["black_n_white"], gaussian=op["gaussian"],
+        solid_white=op["solid_white"], solid_black=op["solid_black"],
+        watermark=op["watermark"], template=template, color=op["color"],
+        opacidad=op["opacidad"], max_lado=op["max_lado"], alinear=op["alinear"],
+        ajustar_texto=op["ajustar_texto"], suavizar_bordes=op["suavizar_bordes"], inplace=True, out=out
+    )
+
+
+def codificar(image, formato, calidad=90):
+    params = [cv2.IMWRITE_JPEG_QUALITY, calidad] if formato == "jpg" else []
+    ok, buf = cv2.imencode("." + formato, image, params)
+    if not ok:
+        raise ValueError("No se pudo codificar la imagen")
+    return buf
+
+
+def leer_como(op):
+    # en blanco y negro se decodifica directamente a un canal
+    return cv2.IMREAD_GRAYSCALE if op["black_n_white"] else cv2.IMREAD_COLOR
+
+
+def _init_worker(opciones):
+    global _opciones
+    _opciones = opciones
+    # un hilo de OpenCV por proceso: el paralelismo lo pone el pool
+    cv2.setNumThreads(1)
+
+
+def procesar_fichero(ruta):
+    """
+    decode -> recorte -> procesar_imagen -> encode para un único fichero.
+
+    Returns:
+        dict: resumen con tiempos por etapa (ms) o el error producido.
+    """
+    op = _opciones
+    resumen = {"fichero": ruta, "ok": False, "tiempos_ms": {}}
+    tiempos = resumen["tiempos_ms"]
+    try:
+        t0 = time.perf_counter()
+        image = cv2.imread(ruta, leer_como(op))
+        if image is None:
+            raise ValueError("No se pudo decodificar la imagen")
+        t1 = time.perf_counter()
+        tiempos["decode"] = (t1 - t0) * 1000
+
+        image = recortar(image, op["recorte"], op["politica"], op["max_lado"])
+        t2 = time.perf_counter()
+        tiempos["recorte"] = (t2 - t1) * 1000
+
+        template = op["template"]
+        if template is None:
+            template, clasificacion = elegir_plantilla(image, op["plantillas"])
+            resumen["plantilla"] = template.nombre
+            resumen["confianza"] = round(clasificacion["confianza"], 3)
+            tiempos["clasificacion"] = (time.perf_counter() - t2) * 1000
+            t2 = time.perf_counter()
+
+        imagen_final = redactar(image, op, template)
+        t3 = time.perf_counter()
+        tiempos["procesado"] = (t3 - t2) * 1000
+
+        buf = codificar(imagen_final, op["formato"], op["calidad"])
+        salida = op["salidas"][ruta]
+        os.makedirs(os.path.dirname(salida), exist_ok=True)
+        with open(salida, 'wb') as f:
+            f.write(buf)
+        t4 = time.perf_counter()
+        tiempos["encode"] = (t4 - t3) * 1000
+        tiempos["total"] = (t4 - t0) * 1000
+
+        resumen["ok"] = True
+        resumen["salida"] = salida
+    except Exception as e:
+        resumen["error"] = f"{type(e).__name__}: {e}"
+    return resumen
+
+
+def ejecutar_lote(rutas, opciones, workers=None, funcion=procesar_fichero):
+    """
+    Procesa todas las rutas en paralelo con 'funcion' y devuelve el resumen agregado.
+    """
+    workers = workers or os.cpu_count() or 1
+    os.makedirs(opciones["salida"], exist_ok=True)
+
+    t0 = time.perf_counter()
+    resultados = []
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(opciones,)) as pool:
+        futuros = [pool.submit(funcion, r) for r in rutas]
+        for futuro in as_completed(futuros):
+            resultados.append(futuro.result())
+    total = time.perf_counter() - t0
+
+    resultados.sort(key=lambda r: r["fichero"])
+    fallos = [r for r in resultados if not r["ok"]]
+    return {
+        "workers": workers,
+        "ficheros": len(resultados),
+        "fallos": len(fallos),
+        "segundos": total,
+        "imagenes_por_segundo": (len(resultados) / total) if total > 0 else 0.0,
+        "resultados": resultados,
+    }
+
+
+def anadir_argumentos(parser):
+    """
+    Argumentos comunes a los modos por lotes (salida, recorte y redacción).
+    """
+    parser.add_argument("-o", "--salida", default="./salida", help="Directorio de salida")
+    parser.add_argument("-w", "--workers", type=int, default=None, help="Número de procesos (por defecto, núcleos)")
+    parser.add_argument("--recorte", choices=["Completa", "Auto"], default="Completa")
+    parser.add_argument("--tamano-recorte", default=os.getenv('TAMANO_RECORTE', 'bordes'),
+                        help="Tamaño del recorte: 'bordes', 'id1' o ANCHOxALTO (p.ej. 1011x638)")
+    parser.add_argument("--desenfoque", choices=["Difuminado", "Sólido blanco", "Sólido negro"], default="Difuminado")
+    parser.add_argument("--color", action="store_true", help="Mantener color (por defecto blanco y negro)")
+    parser.add_argument("--marca-de-agua", default="COPIA", help="Texto de la marca de agua ('' para desactivar)")
+    parser.add_argument("--opacidad", type=float, default=0.5)
+    parser.add_argument("--sin-alinear", action="store_true",
+                        help="No alinear la plantilla con su imagen de referencia")
+    parser.add_argument("--ajustar-texto", action="store_true",
+                        help="Ampliar los rectángulos de la plantilla al texto detectado")
+    parser.add_argument("--suavizar-bordes", action="store_true",
+                        help="Fundir los bordes del desenfoque con la imagen")
+    parser.add_argument("--max-lado", type=int, default=None, help="Limitar el lado mayor de la salida (px)")
+    parser.add_argument("--calidad", type=int, default=90, help="Calidad JPEG")
+
+
+def leer_opciones(args, **extra):
+    """
+    Diccionario de opciones para los workers a partir de los argumentos comunes.
+    """
+    return dict({
+        "salida": args.salida,
+        "recorte": args.recorte,
+        "politica": leer_politica(args.tamano_recorte),
+        "black_n_white": not args.color,
+        "gaussian": args.desenfoque == "Difuminado",
+        "solid_white": args.desenfoque == "Sólido blanco",
+        "solid_black": args.desenfoque == "Sólido negro",
+        "watermark": args.marca_de_agua or None,
+        "color": None,
+        "opacidad": args.opacidad,
+        "alinear": not args.sin_alinear,
+        "ajustar_texto": args.ajustar_texto,
+        "suavizar_bordes": args.suavizar_bordes,
+        "max_lado": args.max_lado,
+        "calidad": args.calidad,
+    }, **extra)
+
+
+def informar(resumen, salida):
+    """
+    Escribe resumen.json, muestra los fallos y devuelve el código de salida.
+    """
+    with open(os.path.join(salida, "resumen.json"), 'w') as f:
+        json.dump(resumen, f, indent=2, ensure_ascii=False)
+
+    print(f"{resumen['ficheros']} ficheros, {resumen['fallos']} fallos, "
+          f"{resumen['segundos']:.2f} s ({resumen['imagenes_por_segundo']:.1f} img/s, {resumen['workers']} procesos)")
+    for r in resumen["resultados"]:
+        if not r["ok"]:
+            print(f"  FALLO {r['fichero']}: {r['error']}")
+    return 0 if resumen["fallos"] == 0 else 2
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Redacción de DNIs por lotes.")
+    parser.add_argument("entrada", help="Directorio o patrón glob de imágenes")
+    parser.add_argument("-t", "--template", required=True,
+                        help="Nombre de la plantilla (p.ej. DNI_FRONTAL) o 'auto' para elegirla por fichero")
+    anadir_argumentos(parser)
+    parser.add_argument("--formato", choices=["jpg", "png"], default="jpg")
+    args = parser.parse_args(argv)
+
+    rutas = listar_imagenes(args.entrada)
+    if not rutas:
+        print(f"No se encontraron imágenes en {args.entrada}")
+        return 1
+
+    salidas = nombres_salida(rutas, args.salida, "." + args.formato)
+    if args.template == PLANTILLA_AUTO:
+        opciones = leer_opciones(args, template=None, plantillas=cargar_plantillas(), formato=args.formato,
+                                 salidas=salidas)
+    else:
+        opciones = leer_opciones(args, template=cargar_template(args.template), formato=args.formato,
+                                 salidas=salidas)
+    resumen = ejecutar_lote(rutas, opciones, workers=args.workers)
+    return informar(resumen, args.salida)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,45 +1,168 @@
-from src.utils.rectangles import select_rectangles_on_image, draw_rectangle_on_image, apply_gaussian_blur_to_rectangle
-from src.utils.apply_watermark import apply_rotated_watermark
+from src.utils.apply_watermark import apply_rotated_watermark, FONT, FONT_SCALE, THICKNESS, SPACING, ANGLE
+from src.utils.instrumentacion import etapa
+from src.utils.plantillas import compilar_plantilla
+from src.utils.espacio_trabajo import ESPACIO
+from src.utils.texto import ajustar_poligonos, detectar_texto
+from src.utils.alineacion import alinear_plantilla
+from src.utils.redaccion import desenfocar, redactar_regiones, sigma_desde_kernel
 import os
 from dotenv import load_dotenv
 import cv2
+import numpy as np
 
 load_dotenv()
 
-def procesar_imagen(image, development=None, black_n_white=True, solid_white=False, solid_black=False, gaussian=False, watermark=None, color=(125, 125, 125), opacidad=0.5, template='image'):
-    
-    image_file = f'{template}.jpg'
-    
-    if black_n_white:
-        image = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
-    
-    get_size = template['size']
-    image = cv2.resize(image, tuple(get_size)) 
-
-    if development:
-        # get rectangles
-        aux = select_rectangles_on_image(image, image_filename=image_file, save_template=True)
-        get_rectangles = aux['rectangles']
-
-        print("\nFinal Coordinates of the drawn rectangles:")
-        if get_rectangles:
-            for i, (start, end) in enumerate(get_rectangles):
-                print(f"  Rectangle {i+1}: Start={start}, End={end}")
-        else:
-            print("No rectangles were drawn.")
-            
+KERNEL_DESENFOQUE = 101
+SUAVIZADO_BORDES = 6   # px al tamaño de la plantilla de la transición de los bordes del desenfoque
+
+def _tamano_limitado(h, w, max_lado):
+    if not max_lado or max(h, w) <= max_lado:
+        return h, w
+    f = max_lado / max(h, w)
+    return max(1, round(h * f)), max(1, round(w * f))
+
+def limitar_tamano(image, max_lado):
+    """
+    Reduce la imagen (manteniendo la proporción) si su lado mayor supera max_lado.
+    """
+    h, w = image.shape[:2]
+    nh, nw = _tamano_limitado(h, w, max_lado)
+    if (nh, nw) == (h, w):
+        return image
+    return cv2.resize(image, (nw, nh), interpolation=cv2.INTER_AREA)
+
+def forma_salida(image, black_n_white=True, max_lado=None):
+    """
+    Forma (h, w) o (h, w, c) del resultado de procesar_imagen para 'image',
+    p.ej. para reservar el buffer 'out' de inplace=True.
+    """
+    h, w = _tamano_limitado(*image.shape[:2], max_lado)
+    if image.ndim == 2 or black_n_white:
+        return (h, w)
+    return (h, w, image.shape[2])
+
+def reducir_a_ancho(image, ancho):
+    """
+    Copia reducida a 'ancho' píxeles (si la imagen es más ancha), manteniendo la proporción.
+    """
+    h, w = image.shape[:2]
+    if w <= ancho:
+        return image
+    return cv2.resize(image, (ancho, max(1, round(h * ancho / w))), interpolation=cv2.INTER_AREA)
+
+def procesar_imagen(image, black_n_white=True, solid_white=False, solid_black=False, gaussian=False, watermark=None, color=(125, 125, 125), opacidad=0.5, template='image', max_lado=None,
+                    angulo=ANGLE, espaciado=SPACING, fuente=FONT, escala_fuente=FONT_SCALE, grosor=THICKNESS,
+                    alinear=True, ajustar_texto=False, suavizar_bordes=False, inplace=False, out=None):
+    """
+    Redacta la imagen a su resolución nativa: las regiones de la plantilla
+    (normalizadas) se escalan a la imagen en lugar de redimensionar la imagen
+    al tamaño de la plantilla. 'max_lado' limita opcionalmente el tamaño de salida.
+
+    'solid_white', 'solid_black' y 'gaussian' eligen el modo de las regiones
+    que no tienen uno propio en la plantilla; las que lo tienen se redactan
+    siempre con el suyo. Todas se aplican en una sola etapa
+    (redaccion.redactar_regiones) con máscaras que se calculan una vez por
+    plantilla y tamaño de salida. Con 'suavizar_bordes' los bordes del
+    desenfoque se funden con la imagen en una franja de SUAVIZADO_BORDES px
+    (al tamaño de la plantilla) por fuera de cada región.
+
+    La marca de agua se configura con 'angulo' (grados), 'espaciado' (px entre
+    repeticiones), 'fuente' (cv2.FONT_*), 'escala_fuente' y 'grosor'; el
+    espaciado, la escala y el grosor son relativos al tamaño de la plantilla
+    y se escalan con la imagen.
+
+    Con 'alinear', si la plantilla tiene imagen de referencia, las regiones
+    se transforman con la homografía que lleva la referencia sobre la imagen
+    (src/utils/alineacion.py); si la alineación no es fiable se usan tal cual.
+
+    Con 'ajustar_texto' las regiones de la plantilla se amplían hasta
+    cubrir el texto detectado que ya tocan (src/utils/texto.py), por si el
+    recorte no está bien centrado.
+
+    Propiedad de los datos:
+        - inplace=False (por defecto): 'image' no se modifica nunca y se
+          devuelve un array nuevo, propiedad del llamante.
+        - inplace=True: el resultado se escribe en 'out' (uint8, contiguo, con
+          forma forma_salida(image, black_n_white, max_lado)) y se devuelve
+          'out'. Sin 'out' se escribe en la propia 'image', que entonces no
+          puede cambiar de forma (ni gris ni reducción). Los intermedios se
+          toman de los buffers reutilizables de ESPACIO. 'out' no debe
+          solaparse con 'image' salvo que sea el mismo array.
+    """
+    template = compilar_plantilla(template)
+
+    forma = forma_salida(image, black_n_white, max_lado)
+    if inplace:
+        destino = image if out is None else out
+        if destino.shape != forma or destino.dtype != np.uint8 or not destino.flags.c_contiguous:
+            raise ValueError(f"inplace=True necesita un destino uint8 contiguo de forma {forma}")
+    elif out is not None:
+        raise ValueError("'out' solo se admite con inplace=True")
+    else:
+        destino = np.empty(forma, dtype=np.uint8)
+
+    # el destino se rellena una vez (reducción / gris / copia) y después
+    # todas las etapas escriben en él
+    reducir = forma[:2] != image.shape[:2]
+    gris = len(forma) == 2 and image.ndim == 3
+    if reducir:
+        with etapa('resize', image) as e:
+            if not gris:
+                reducida = destino
+            elif inplace:
+                reducida = ESPACIO.obtener('reducida', forma + image.shape[2:])
+            else:
+                reducida = np.empty(forma + image.shape[2:], dtype=np.uint8)
+            cv2.resize(image, (forma[1], forma[0]), dst=reducida, interpolation=cv2.INTER_AREA)
+            e.salida(reducida)
+        image = reducida
+
+    if gris:
+        # a partir de aquí todo el pipeline trabaja con un solo canal
+        with etapa('gris', image) as e:
+            cv2.cvtColor(image, cv2.COLOR_BGR2GRAY, dst=destino)
+            e.salida(destino)
+    elif not reducir and destino is not image:
+        np.copyto(destino, image)
+    image = destino
+
+    h, w = image.shape[:2]
+    # la escala de la plantilla fija el tamaño relativo del desenfoque y la marca de agua
+    escala = w / template['size'][0]
+    poligonos = template.poligonos((w, h))
+    # las máscaras de la plantilla sin alinear ni ajustar sirven para cualquier imagen del mismo tamaño
+    clave = template.huella
+    if alinear and template.referencia:
+        with etapa('alineacion', image):
+            alineados = alinear_plantilla(image, template)
+        if alineados:
+            poligonos, clave = alineados, None
+    if ajustar_texto:
+        with etapa('texto', image):
+            poligonos = ajustar_poligonos(poligonos, detectar_texto(image), (w, h))
+        clave = None
+
+    # modo de la barra lateral para las regiones sin modo propio
+    fuerza = sigma_desde_kernel(int(KERNEL_DESENFOQUE * escala) | 1)
     if solid_white or solid_black:
-        # load template rectangles
-        get_rectangles = template['rectangles']
-        # image with solid rectangles
-        image = draw_rectangle_on_image(image, get_rectangles, color=((255,255,255) if solid_white else (0,0,0)), thickness=-1)
-        
+        heredado = ('solido', 0.0, (255, 255, 255) if solid_white else (0, 0, 0))
     elif gaussian:
-        # load template rectangles
-        get_rectangles = template['rectangles']
-        # image with gaussian blur on rectangles
-        image = apply_gaussian_blur_to_rectangle(image, get_rectangles)
-    
+        heredado = ('desenfoque', fuerza, None)
+    else:
+        heredado = None
+    efectos = template.efectos(heredado, escala, fuerza)
+
+    if any(efectos):
+        with etapa('redaccion', image) as e:
+            image = redactar_regiones(image, poligonos, efectos, clave=clave,
+                                      suavizado=SUAVIZADO_BORDES * escala if suavizar_bordes else 0)
+            e.salida(image)
+    elif gaussian and not poligonos:
+        # plantilla sin regiones: se difumina la imagen entera
+        with etapa('redaccion', image) as e:
+            image[...] = desenfocar(image, fuerza)
+            e.salida(image)
+
     if watermark:
         if color is None: # Auto
             if solid_white:
@@ -49,18 +172,29 @@ def procesar_imagen(image, development=None, black_n_white=True, solid_white=Fal
         else:
             color = color
         # image with watermark
-        image = apply_rotated_watermark(image, watermark, 35, color=color, opacity=opacidad)
+        with etapa('marca_de_agua', image) as e:
+            image = apply_rotated_watermark(image, watermark, angulo, color=color, opacity=opacidad,
+                                            font_scale=escala_fuente * escala, thickness=max(1, round(grosor * escala)),
+                                            spacing=round(espaciado * escala), font=fuente, out=image)
+            e.salida(image)
     
     #cv2.imwrite(template + '_result.jpg', image)
 
     return image
 
 if __name__=='__main__':
-    
+    import json
+
+    def _cargar_template(nombre):
+        with open(os.path.join(os.getenv('TEMPLATES_FOLDER'), nombre + '.json'), 'r') as file:
+            return json.load(file)
+
     # front ---------------------------------------------------------
     image_path = os.path.join(os.getenv('IMAGES_FOLDER'), 'dni_front_2.jpg')
-    procesar_imagen(image_path, autocrop=True)
-    
+    resultado = procesar_imagen(cv2.imread(image_path), gaussian=True, watermark='COPIA', template=_cargar_template('DNI_FRONTAL'))
+    cv2.imwrite('DNI_FRONTAL_result.jpg', resultado)
+
     # back -------------------------------------------------------
     image_path = os.path.join(os.getenv('IMAGES_FOLDER'), 'dni_back_2.jpg')
-    procesar_imagen(image_path, autocrop=False)
\ No newline at end of file
+    resultado = procesar_imagen(cv2.imread(image_path), gaussian=True, watermark='COPIA', template=_cargar_template('DNI_TRASERA'))
+    cv2.imwrite('DNI_TRASERA_result.jpg', resultado)
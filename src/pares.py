@@ -0,0 +1,130 @@
+"""
+Lotes de pares anverso/reverso exportados a un único PDF o A4 por documento.
+
+Uso:
+    python -m src.pares ./entrada -o ./salida
+    python -m src.pares ./entrada -o ./salida --exportar a4 --sufijos _front _back
+
+Los pares se forman por nombre: 'ID_frontal.jpg' y 'ID_trasera.jpg' generan
+'ID.pdf'. Cada cara pasa por recorte -> procesar_imagen -> encode JPEG en un
+worker y el PDF incrusta esos JPEG sin recomprimirlos. Los ficheros sin
+pareja cuentan en el total y se listan como fallos en <salida>/resumen.json.
+"""
+import argparse
+import os
+import sys
+import time
+from pathlib import Path
+
+import cv2
+
+from src import batch
+from src.batch import (anadir_argumentos, cargar_template, codificar, ejecutar_lote, informar,
+                       leer_como, leer_opciones, listar_imagenes, recortar, redactar)
+from src.utils.exportar import a4_combinado, pdf_caras
+
+
+def emparejar(rutas, sufijos=("_frontal", "_trasera")):
+    """
+    Agrupa las rutas por identificador común.
+
+    Returns:
+        tuple: ([(id, ruta_anverso, ruta_reverso), ...], [rutas sin pareja])
+    """
+    caras = {}
+    sueltas = []
+    for ruta in rutas:
+        stem = Path(ruta).stem
+        for i, sufijo in enumerate(sufijos):
+            if stem.lower().endswith(sufijo.lower()):
+                caras.setdefault(stem[:len(stem) - len(sufijo)], [None, None])[i] = ruta
+                break
+        else:
+            sueltas.append(ruta)
+
+    pares = []
+    for ident, (anverso, reverso) in sorted(caras.items()):
+        if anverso and reverso:
+            pares.append((ident, anverso, reverso))
+        else:
+            sueltas.append(anverso or reverso)
+    return pares, sorted(sueltas)
+
+
+def procesar_par(par):
+    """
+    Redacta las dos caras y las exporta juntas.
+
+    Returns:
+        dict: resumen con tiempos por etapa (ms) o el error producido.
+    """
+    op = batch._opciones
+    ident, *rutas = par
+    resumen = {"fichero": ident, "ok": False, "tiempos_ms": {}}
+    tiempos = resumen["tiempos_ms"]
+    try:
+        t0 = time.perf_counter()
+        caras = []
+        for ruta, template, buffer in zip(rutas, (op["template"], op["template_reverso"]), ("anverso", "reverso")):
+            image = cv2.imread(ruta, leer_como(op))
+            if image is None:
+                raise ValueError(f"No se pudo decodificar {ruta}")
+            image = recortar(image, op["recorte"], op["politica"], op["max_lado"])
+            caras.append(redactar(image, op, template, buffer))
+        t1 = time.perf_counter()
+        tiempos["procesado"] = (t1 - t0) * 1000
+
+        if op["exportar"] == "pdf":
+            datos = pdf_caras([codificar(c, "jpg", op["calidad"]) for c in caras], op["disposicion"])
+            extension = ".pdf"
+        else:
+            datos = codificar(a4_combinado(caras, op["ppp"]), "jpg", op["calidad"])
+            extension = ".jpg"
+        salida = os.path.join(op["salida"], ident + extension)
+        with open(salida, 'wb') as f:
+            f.write(datos)
+        t2 = time.perf_counter()
+        tiempos["exportar"] = (t2 - t1) * 1000
+        tiempos["total"] = (t2 - t0) * 1000
+
+        resumen["ok"] = True
+        resumen["salida"] = salida
+        resumen["bytes"] = len(datos)
+    except Exception as e:
+        resumen["error"] = f"{type(e).__name__}: {e}"
+    return resumen
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Exporta pares anverso/reverso de DNIs por lotes.")
+    parser.add_argument("entrada", help="Directorio o patrón glob de imágenes")
+    parser.add_argument("--anverso", default="DNI_FRONTAL", help="Plantilla del anverso")
+    parser.add_argument("--reverso", default="DNI_TRASERA", help="Plantilla del reverso")
+    parser.add_argument("--sufijos", nargs=2, default=["_frontal", "_trasera"], metavar=("ANVERSO", "REVERSO"),
+                        help="Sufijos de nombre de fichero de cada cara")
+    parser.add_argument("--exportar", choices=["pdf", "a4"], default="pdf")
+    parser.add_argument("--disposicion", choices=["a4", "paginas"], default="a4",
+                        help="PDF: ambas caras en un A4 o una página por cara")
+    parser.add_argument("--ppp", type=int, default=150, help="Resolución del A4 combinado")
+    anadir_argumentos(parser)
+    args = parser.parse_args(argv)
+
+    pares, sueltas = emparejar(listar_imagenes(args.entrada), args.sufijos)
+    if not pares:
+        print(f"No se encontraron pares en {args.entrada}")
+        return 1
+
+    opciones = leer_opciones(args, template=cargar_template(args.anverso),
+                             template_reverso=cargar_template(args.reverso),
+                             exportar=args.exportar, disposicion=args.disposicion, ppp=args.ppp)
+    resumen = ejecutar_lote(pares, opciones, workers=args.workers, funcion=procesar_par)
+    for ruta in sueltas:
+        resumen["resultados"].append({"fichero": ruta, "ok": False, "error": "Sin pareja"})
+    # cuentan como entradas del lote y como fallos, igual que un par fallido
+    resumen["ficheros"] += len(sueltas)
+    resumen["fallos"] += len(sueltas)
+    return informar(resumen, args.salida)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,371 @@
+"""
+Servicio HTTP asíncrono de redacción (tornado + asyncio).
+
+Uso:
+    python -m src.servicio --puerto 8600 --workers 4
+
+    curl -X POST -H "Content-Type: image/jpeg" --data-binary @dni.jpg \
+        "http://127.0.0.1:8600/redactar?template=DNI_FRONTAL&desenfoque=Difuminado&formato=jpg" -o out.jpg
+
+Endpoints:
+    POST /redactar   cuerpo = imagen (Content-Type image/* u octet-stream)
+                     o multipart con el campo 'imagen'.
+                     Opciones por query string: template (nombre o 'auto'),
+                     recorte (Completa|Auto),
+                     desenfoque (Difuminado|Sólido blanco|Sólido negro|Ninguno),
+                     gris (1|0), marca_de_agua, color (Auto|Blanco|Negro|Rojo),
+                     opacidad, alinear (1|0), ajustar_texto (1|0),
+                     suavizar_bordes (1|0),
+                     formato (jpg|png), calidad.
+    GET  /salud      estado y ocupación del servicio.
+    GET  /metrics    contadores por etapa en formato Prometheus.
+
+El trabajo de OpenCV (decode -> recorte -> procesar_imagen -> encode) se
+ejecuta en un ProcessPoolExecutor acotado, nunca en el bucle de eventos.
+Como mucho 'max_concurrencia' peticiones se procesan a la vez y
+'max_cola' esperan; el resto recibe 503 con Retry-After (backpressure).
+Cada petición tiene un tiempo máximo; si se supera se responde 504. El
+hueco de una petición agotada solo se libera cuando su trabajo termina de
+verdad en el pool, así los límites reflejan los procesos ocupados.
+Si con recorte=Auto no se encuentra el documento, o con template=auto no
+se identifica la plantilla, se responde 422; una plantilla inexistente o no
+válida es un 400. Cualquier otro fallo del trabajo se registra en el log
+"dni.servicio" y se responde 500. La salida se limita a MAX_LADO_SALIDA
+como en la app.
+
+Los resultados se guardan en una caché compartida por todos los clientes
+(CACHE_SERVICIO_MB, _TTL_S, _CARPETA; ver src/utils/cache_resultados.py)
+con clave la huella de los bytes subidos y de las opciones: repetir una
+petición responde sin pasar por el pool (cabecera X-Cache).
+"""
+import argparse
+import ast
+import asyncio
+import hashlib
+import logging
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+import cv2
+import tornado.web
+from dotenv import load_dotenv
+
+from src.batch import PLANTILLA_AUTO, recortar
+from src.editor import procesar_imagen
+from src.utils.cache_resultados import cache_desde_entorno, huella_parametros
+from src.utils.clasificacion import elegir_plantilla
+from src.utils.ingesta import decodificar_subida
+from src.utils.instrumentacion import AGREGADO, sesion_medicion, etapa
+from src.utils.plantillas import RegistroPlantillas
+
+load_dotenv()
+
+logger = logging.getLogger("dni.servicio")
+
+TROZO = 64 * 1024
+MAX_LADO_SALIDA = int(os.getenv('MAX_LADO_SALIDA')) if os.getenv('MAX_LADO_SALIDA') else None
+COLORES = {"Blanco": "COLOR_WHITE", "Negro": "COLOR_BLACK", "Rojo": "COLOR_RED"}
+
+_registro = None
+
+
+class PeticionInvalida(ValueError):
+    pass
+
+
+class ImagenNoProcesable(PeticionInvalida):
+    """La petición es válida pero en la imagen no se encuentra el documento (422)."""
+
+
+def _init_worker():
+    global _registro
+    cv2.setNumThreads(1)
+    _registro = RegistroPlantillas(os.getenv('TEMPLATES_FOLDER'))
+
+
+def leer_opciones(argumentos):
+    """
+    Valida las opciones de la query string y las convierte a los parámetros
+    de procesar_imagen.
+
+    Raises:
+        PeticionInvalida: si alguna opción no es válida.
+    """
+    def arg(nombre, defecto):
+        return argumentos.get(nombre, defecto)
+
+    desenfoque = arg("desenfoque", "Difuminado")
+    if desenfoque not in ("Difuminado", "Sólido blanco", "Sólido negro", "Ninguno"):
+        raise PeticionInvalida(f"desenfoque no válido: {desenfoque}")
+    color = arg("color", "Auto")
+    if color != "Auto" and color not in COLORES:
+        raise PeticionInvalida(f"color no válido: {color}")
+    formato = arg("formato", "jpg").lower()
+    if formato not in ("jpg", "png"):
+        raise PeticionInvalida(f"formato no válido: {formato}")
+    recorte = arg("recorte", "Completa")
+    if recorte not in ("Completa", "Auto"):
+        raise PeticionInvalida(f"recorte no válido: {recorte}")
+    try:
+        opacidad = float(arg("opacidad", "0.5"))
+        calidad = int(arg("calidad", "90"))
+    except ValueError as e:
+        raise PeticionInvalida(str(e))
+
+    return {
+        "template": arg("template", "DNI_FRONTAL"),
+        "recorte": recorte,
+        "black_n_white": arg("gris", "1") not in ("0", "false", "no"),
+        "gaussian": desenfoque == "Difuminado",
+        "solid_white": desenfoque == "Sólido blanco",
+        "solid_black": desenfoque == "Sólido negro",
+        "watermark": arg("marca_de_agua", "COPIA") or None,
+        "color": None if color == "Auto" else ast.literal_eval(os.getenv(COLORES[color])),
+        "opacidad": min(1.0, max(0.0, opacidad)),
+        "alinear": arg("alinear", "1") not in ("0", "false", "no"),
+        "ajustar_texto": arg("ajustar_texto", "0") not in ("0", "false", "no"),
+        "suavizar_bordes": arg("suavizar_bordes", "0") not in ("0", "false", "no"),
+        "formato": formato,
+        "calidad": min(100, max(0, calidad)),
+        "max_lado": MAX_LADO_SALIDA,
+    }
+
+
+def comprobar_plantilla(registro, nombre):
+    """
+    Returns:
+        Plantilla: la plantilla 'nombre' del registro.
+
+    Raises:
+        PeticionInvalida: si no existe o no es válida.
+    """
+    template = registro.obtener(nombre)
+    if template is None:
+        motivo = registro.errores.get(Path(nombre).stem)
+        raise PeticionInvalida(f"Plantilla {nombre} no válida: {motivo}" if motivo
+                               else f"No se encontró la plantilla {nombre}")
+    return template
+
+
+def redactar(datos, opciones):
+    """
+    decode -> recorte -> procesar_imagen -> encode (se ejecuta en un worker).
+
+    Returns:
+        tuple: (bytes codificados, registros de instrumentación)
+    """
+    auto = opciones["template"] == PLANTILLA_AUTO
+    template = None if auto else comprobar_plantilla(_registro, opciones["template"])
+
+    with sesion_medicion(memoria=False) as medidor:
+        with etapa('decode') as e:
+            image = decodificar_subida(datos, gris=opciones["black_n_white"])
+            e.salida(image)
+        if image is None:
+            raise PeticionInvalida("No se pudo decodificar la imagen")
+        with etapa('recorte', image):
+            try:
+                image = recortar(image, opciones["recorte"], max_lado=opciones["max_lado"])
+            except ValueError as e:
+                raise ImagenNoProcesable(str(e))
+        if auto:
+            with etapa('clasificacion', image):
+                try:
+                    template, _ = elegir_plantilla(image, [_registro.obtener(n) for n in _registro.nombres()])
+                except ValueError as e:
+                    raise ImagenNoProcesable(str(e))
+        imagen_final = procesar_imagen(
+            image, black_n_white=opciones["black_n_white"], gaussian=opciones["gaussian"],
+            solid_white=opciones["solid_white"], solid_black=opciones["solid_black"],
+            watermark=opciones["watermark"], template=template, color=opciones["color"],
+            opacidad=opciones["opacidad"], alinear=opciones["alinear"], ajustar_texto=opciones["ajustar_texto"],
+            suavizar_bordes=opciones["suavizar_bordes"], max_lado=opciones["max_lado"]
+        )
+        with etapa('encode', imagen_final):
+            params = [cv2.IMWRITE_JPEG_QUALITY, opciones["calidad"]] if opciones["formato"] == "jpg" else []
+            ok, buf = cv2.imencode("." + opciones["formato"], imagen_final, params)
+        if not ok:
+            raise ValueError("No se pudo codificar la imagen")
+    return buf.tobytes(), medidor.registros
+
+
+class Servicio:
+    """
+    Estado compartido: pool de procesos y límites de concurrencia.
+    """
+
+    def __init__(self, workers=None, max_concurrencia=None, max_cola=16, timeout=30.0, cache=None):
+        self.workers = workers or os.cpu_count() or 1
+        self.max_concurrencia = max_concurrencia or self.workers
+        self.max_cola = max_cola
+        self.timeout = timeout
+        self.pool = ProcessPoolExecutor(max_workers=self.workers, initializer=_init_worker)
+        self.semaforo = asyncio.Semaphore(self.max_concurrencia)
+        self.cache = cache if cache is not None else cache_desde_entorno('CACHE_SERVICIO', mb=128)
+        # solo para las versiones de la clave de caché: la carpeta se lee como
+        # mucho una vez por segundo y no en cada petición
+        self.plantillas = RegistroPlantillas(os.getenv('TEMPLATES_FOLDER'), intervalo=1.0)
+        self.en_curso = 0
+        self.esperando = 0
+        self.atendidas = 0
+        self.rechazadas = 0
+
+    def liberar(self):
+        # hueco de una petición cuyo trabajo ya ha terminado (o no llegó a empezar)
+        self.en_curso -= 1
+        self.semaforo.release()
+
+    def cerrar(self):
+        self.pool.shutdown(wait=False, cancel_futures=True)
+        self.cache.detener_purga()
+
+
+class RedactarHandler(tornado.web.RequestHandler):
+
+    def initialize(self, servicio):
+        self.servicio = servicio
+
+    async def post(self):
+        s = self.servicio
+        try:
+            opciones = leer_opciones({k: self.get_query_argument(k) for k in self.request.query_arguments})
+        except PeticionInvalida as e:
+            raise tornado.web.HTTPError(400, reason=str(e))
+
+        ficheros = self.request.files.get("imagen")
+        datos = ficheros[0]["body"] if ficheros else self.request.body
+        if not datos:
+            raise tornado.web.HTTPError(400, reason="Cuerpo vacío: envía la imagen")
+
+        t0 = time.perf_counter()
+        auto = opciones["template"] == PLANTILLA_AUTO
+        if not auto:
+            try:
+                comprobar_plantilla(s.plantillas, opciones["template"])
+            except PeticionInvalida as e:
+                raise tornado.web.HTTPError(400, reason=str(e))
+        clave = huella_parametros(datos=hashlib.blake2b(datos, digest_size=16).hexdigest(),
+                                  version_plantilla=s.plantillas.version(None if auto else opciones["template"]),
+                                  **opciones)
+        resultado = s.cache.get(clave)
+        if resultado is not None:
+            s.atendidas += 1
+            await self.responder(resultado, opciones, t0, "acierto")
+            return
+
+        # backpressure: si ya hay demasiadas peticiones esperando, rechazar
+        if s.semaforo.locked() and s.esperando >= s.max_cola:
+            s.rechazadas += 1
+            self.set_header("Retry-After", "1")
+            raise tornado.web.HTTPError(503, reason="Servicio saturado")
+
+        s.esperando += 1
+        try:
+            await asyncio.wait_for(s.semaforo.acquire(), timeout=s.timeout)
+        except asyncio.TimeoutError:
+            raise tornado.web.HTTPError(504, reason="Tiempo de espera agotado en cola")
+        finally:
+            s.esperando -= 1
+
+        s.en_curso += 1
+        try:
+            trabajo = s.pool.submit(redactar, datos, opciones)
+        except Exception:
+            s.liberar()
+            raise
+        # el hueco se libera cuando el trabajo acaba en el pool, no cuando se
+        # deja de esperarlo: un trabajo agotado sigue ocupando su proceso
+        bucle = asyncio.get_running_loop()
+        trabajo.add_done_callback(lambda _: bucle.call_soon_threadsafe(s.liberar))
+        try:
+            restante = max(0.1, s.timeout - (time.perf_counter() - t0))
+            resultado, registros = await asyncio.wait_for(asyncio.wrap_future(trabajo), timeout=restante)
+        except asyncio.TimeoutError:
+            raise tornado.web.HTTPError(504, reason="Tiempo de procesado agotado")
+        except ImagenNoProcesable as e:
+            raise tornado.web.HTTPError(422, reason=str(e))
+        except PeticionInvalida as e:
+            raise tornado.web.HTTPError(400, reason=str(e))
+        except Exception:
+            logger.exception("Fallo inesperado procesando la petición")
+            raise tornado.web.HTTPError(500, reason="Error interno al procesar la imagen")
+
+        for registro in registros:
+            AGREGADO.acumular(registro)
+        s.atendidas += 1
+        s.cache.put(clave, resultado)
+        await self.responder(resultado, opciones, t0, "fallo")
+
+    async def responder(self, resultado, opciones, t0, cache):
+        self.set_header("Content-Type", "image/jpeg" if opciones["formato"] == "jpg" else "image/png")
+        self.set_header("Content-Length", str(len(resultado)))
+        self.set_header("X-Cache", cache)
+        self.set_header("X-Tiempo-Ms", f"{(time.perf_counter() - t0) * 1000:.1f}")
+        vista = memoryview(resultado)
+        for i in range(0, len(vista), TROZO):
+            self.write(bytes(vista[i:i + TROZO]))
+            await self.flush()
+
+
+class SaludHandler(tornado.web.RequestHandler):
+
+    def initialize(self, servicio):
+        self.servicio = servicio
+
+    def get(self):
+        s = self.servicio
+        self.write({
+            "workers": s.workers, "max_concurrencia": s.max_concurrencia, "max_cola": s.max_cola,
+            "en_curso": s.en_curso, "esperando": s.esperando,
+            "atendidas": s.atendidas, "rechazadas": s.rechazadas,
+            "cache": s.cache.estadisticas(),
+        })
+
+
+class MetricasHandler(tornado.web.RequestHandler):
+
+    def initialize(self, servicio):
+        self.servicio = servicio
+
+    def get(self):
+        self.set_header("Content-Type", "text/plain; version=0.0.4")
+        self.write(AGREGADO.a_prometheus() + self.servicio.cache.a_prometheus())
+
+
+def crear_app(servicio):
+    return tornado.web.Application([
+        (r"/redactar", RedactarHandler, {"servicio": servicio}),
+        (r"/salud", SaludHandler, {"servicio": servicio}),
+        (r"/metrics", MetricasHandler, {"servicio": servicio}),
+    ])
+
+
+async def servir(puerto=8600, host="127.0.0.1", max_body_mb=25, **kwargs):
+    servicio = Servicio(**kwargs)
+    servidor = crear_app(servicio).listen(puerto, address=host, max_body_size=max_body_mb * 1024 * 1024)
+    print(f"Servicio de redacción en http://{host}:{puerto} ({servicio.workers} procesos)")
+    try:
+        await asyncio.Event().wait()
+    finally:
+        servidor.stop()
+        servicio.cerrar()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Servicio HTTP de redacción de DNIs.")
+    parser.add_argument("--puerto", type=int, default=8600)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("-w", "--workers", type=int, default=None, help="Procesos de OpenCV (por defecto, núcleos)")
+    parser.add_argument("--max-concurrencia", type=int, default=None, help="Peticiones procesándose a la vez")
+    parser.add_argument("--max-cola", type=int, default=16, help="Peticiones en espera antes de responder 503")
+    parser.add_argument("--timeout", type=float, default=30.0, help="Tiempo máximo por petición (s)")
+    parser.add_argument("--max-body-mb", type=int, default=25)
+    args = parser.parse_args(argv)
+    asyncio.run(servir(args.puerto, args.host, args.max_body_mb, workers=args.workers,
+                       max_concurrencia=args.max_concurrencia, max_cola=args.max_cola, timeout=args.timeout))
+
+
+if __name__ == '__main__':
+    main()
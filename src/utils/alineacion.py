@@ -0,0 +1,161 @@
+"""
+Alineación de la plantilla con la tarjeta recortada (ORB + RANSAC).
+
+No depende de Streamlit. Si una plantilla tiene imagen de referencia
+(templates/<nombre>.referencia.png o .jpg, una tarjeta de muestra recortada
+al mismo encuadre que la plantilla), se busca la homografía que lleva la
+referencia sobre la imagen a redactar y las regiones se transforman con
+ella. Así un recorte algo desplazado, girado o escalado no desplaza las
+zonas a ocultar.
+
+Los puntos y descriptores ORB de la referencia se calculan una sola vez por
+fichero (y mtime) y se guardan en memoria; en cada llamada solo se extraen
+los de la imagen, sobre una copia de ANCHO_ALINEACION px de ancho.
+
+Si no hay coincidencias suficientes o la homografía mueve las esquinas más
+de MAX_DESPLAZAMIENTO, no se alinea y se usan las regiones sin tocar.
+
+Objetivo: unos pocos ms por tarjeta (benchmarks/bench_alineacion.py).
+"""
+import threading
+
+import cv2
+import numpy as np
+
+ANCHO_ALINEACION = 480
+MAX_CARACTERISTICAS = 500
+MAX_CARACTERISTICAS_REFERENCIA = 300   # el emparejado cuesta referencia x imagen
+NIVELES_PIRAMIDE = 3                    # el recorte apenas cambia de escala
+RATIO_LOWE = 0.75
+MIN_INLIERS = 20
+UMBRAL_RANSAC = 3.0            # px en la copia reducida
+MAX_DESPLAZAMIENTO = 0.1       # de las esquinas, relativo al ancho/alto de la tarjeta
+MAX_REFERENCIAS = 32
+
+_referencias = {}
+_lock = threading.Lock()
+
+
+def _caracteristicas(image, ancho, maximo=MAX_CARACTERISTICAS):
+    h, w = image.shape[:2]
+    escala = min(1.0, ancho / w)
+    gray = image if image.ndim == 2 else cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+    if escala < 1.0:
+        # pyrDown hasta menos del doble y un resize lineal: mucho más barato que
+        # INTER_AREA con un factor no entero, que era la mitad del tiempo total
+        while gray.shape[1] >= 2 * ancho:
+            gray = cv2.pyrDown(gray)
+        gray = cv2.resize(gray, (ancho, max(1, round(h * escala))), interpolation=cv2.INTER_LINEAR)
+    orb = cv2.ORB_create(nfeatures=maximo, nlevels=NIVELES_PIRAMIDE)
+    puntos, descriptores = orb.detectAndCompute(gray, None)
+    if len(puntos) > maximo:
+        # ORB puede devolver algunos de más; se quedan los de mayor respuesta
+        orden = np.argsort([-p.response for p in puntos])[:maximo]
+        puntos, descriptores = [puntos[i] for i in orden], descriptores[orden]
+    coordenadas = np.float32([p.pt for p in puntos]).reshape(-1, 2) / escala
+    return coordenadas, descriptores, escala
+
+
+class Referencia:
+    """
+    Puntos y descriptores ORB precalculados de una tarjeta de referencia.
+
+    Atributos:
+        puntos (np.ndarray): (n, 2) coordenadas normalizadas 0-1.
+        descriptores (np.ndarray): (n, 32) uint8, o None si no hay puntos.
+        size (tuple): (w, h) de la imagen de referencia.
+    """
+
+    def __init__(self, image, ancho=ANCHO_ALINEACION):
+        h, w = image.shape[:2]
+        coordenadas, self.descriptores, _ = _caracteristicas(image, ancho, MAX_CARACTERISTICAS_REFERENCIA)
+        self.puntos = coordenadas / (w, h)
+        self.size = (w, h)
+
+
+def cargar_referencia(referencia):
+    """
+    Referencia precalculada de un fichero, sin recalcular mientras no cambie.
+
+    Args:
+        referencia (tuple): (ruta, mtime_ns), como Plantilla.referencia.
+
+    Returns:
+        Referencia: o None si el fichero no se puede leer.
+    """
+    with _lock:
+        ref = _referencias.get(referencia)
+    if ref is not None:
+        return ref
+    image = cv2.imread(referencia[0], cv2.IMREAD_GRAYSCALE)
+    if image is None:
+        return None
+    ref = Referencia(image)
+    with _lock:
+        # una versión nueva del fichero deja obsoletas las anteriores
+        for clave in [c for c in _referencias if c[0] == referencia[0]]:
+            del _referencias[clave]
+        if len(_referencias) >= MAX_REFERENCIAS:
+            _referencias.clear()
+        _referencias[referencia] = ref
+    return ref
+
+
+def homografia(image, referencia, ancho=ANCHO_ALINEACION):
+    """
+    Homografía de coordenadas normalizadas de la referencia (0-1) a píxeles de 'image'.
+
+    Args:
+        image (np.ndarray): tarjeta recortada, BGR o gris.
+        referencia (Referencia): referencia precalculada de la plantilla.
+        ancho (int): ancho de la copia reducida sobre la que se extraen los puntos.
+
+    Returns:
+        np.ndarray: matriz 3x3 float64, o None si no se puede alinear con seguridad.
+    """
+    if referencia.descriptores is None or len(referencia.puntos) < MIN_INLIERS:
+        return None
+    coordenadas, descriptores, escala = _caracteristicas(image, ancho)
+    if descriptores is None or len(coordenadas) < MIN_INLIERS:
+        return None
+
+    pares = cv2.BFMatcher(cv2.NORM_HAMMING).knnMatch(referencia.descriptores, descriptores, k=2)
+    buenos = [p[0] for p in pares if len(p) == 2 and p[0].distance < RATIO_LOWE * p[1].distance]
+    if len(buenos) < MIN_INLIERS:
+        return None
+
+    h, w = image.shape[:2]
+    origen = referencia.puntos[[m.queryIdx for m in buenos]] * (w, h)
+    destino = coordenadas[[m.trainIdx for m in buenos]]
+    H, inliers = cv2.findHomography(origen, destino, cv2.RANSAC, UMBRAL_RANSAC / escala)
+    if H is None or int(inliers.sum()) < MIN_INLIERS:
+        return None
+    H = H @ np.diag([w, h, 1.0])
+
+    # un recorte algo descentrado mueve poco las esquinas; más es una mala coincidencia
+    esquinas = np.float64([[0, 0], [1, 0], [1, 1], [0, 1]])
+    movidas = cv2.perspectiveTransform(esquinas[None], H)[0]
+    if np.any(np.abs(movidas - esquinas * (w, h)) > MAX_DESPLAZAMIENTO * np.array([w, h])):
+        return None
+    return H
+
+
+def alinear_plantilla(image, template):
+    """
+    Regiones de la plantilla alineadas con 'image'.
+
+    Returns:
+        list: vértices de cada región en píxeles de 'image' (como
+        Plantilla.poligonos), o None si la plantilla no tiene referencia o
+        la alineación no es fiable.
+    """
+    if not getattr(template, 'referencia', None):
+        return None
+    referencia = cargar_referencia(template.referencia)
+    if referencia is None:
+        return None
+    H = homografia(image, referencia)
+    if H is None:
+        return None
+    h, w = image.shape[:2]
+    return template.poligonos((w, h), H)
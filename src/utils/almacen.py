@@ -0,0 +1,282 @@
+"""
+Almacén de imágenes por sesión con presupuesto de memoria.
+
+Las imágenes de cada sesión (original, recorte, confirmada, vista previa)
+se guardan aquí en lugar de en st.session_state. Cada entrada está viva
+(array a resolución completa) o dormida (comprimida en JPEG/PNG):
+
+- obtener() despierta la entrada (la decodifica si hace falta) y la marca
+  como usada; solo las etapas que necesitan la resolución completa la piden.
+- Las entradas sin usar durante 'segundos_vivo' se duermen en el siguiente
+  ajuste; las vistas previas trabajan con copias reducidas.
+- Si una sesión supera 'max_bytes_sesion' o el total supera
+  'max_bytes_global', se duermen y después se expulsan las entradas usadas
+  hace más tiempo (LRU), empezando por las de esa sesión.
+- Las sesiones sin actividad durante 'segundos_sesion' se descartan
+  (Streamlit no avisa cuando una pestaña se cierra).
+
+La huella de la imagen se calcula al guardar. Por defecto se duerme en PNG
+(sin pérdidas), así la huella se conserva al despertar y las cachés que
+dependen de ella (descargas) siguen valiendo. Con formato 'jpg' los píxeles
+despertados ya no son los originales y la huella se recalcula.
+No depende de Streamlit (ver src/utils/sesion.py).
+"""
+import os
+import threading
+import time
+from collections import OrderedDict
+
+import cv2
+import numpy as np
+from dotenv import load_dotenv
+
+from src.utils.cache_resultados import huella_imagen
+
+load_dotenv()
+
+MB = 1024 * 1024
+
+
+class _Datos:
+    # píxeles de una entrada: array vivo o bytes comprimidos (compartidos por las copias)
+    __slots__ = ("array", "comprimido", "con_perdidas")
+
+    def __init__(self, array):
+        self.array = array
+        self.comprimido = None
+        self.con_perdidas = False
+
+    @property
+    def bytes(self):
+        return (self.array.nbytes if self.array is not None else 0) + len(self.comprimido or b"")
+
+
+class _Entrada:
+    __slots__ = ("datos", "huella", "shape", "ultimo_uso")
+
+    def __init__(self, datos, huella, shape):
+        self.datos = datos
+        self.huella = huella
+        self.shape = shape
+        self.ultimo_uso = time.monotonic()
+
+
+def _bytes(entradas):
+    # los datos compartidos entre copias cuentan una sola vez
+    return sum(d.bytes for d in {id(e.datos): e.datos for e in entradas}.values())
+
+
+class AlmacenImagenes:
+    """
+    Imágenes por (sesión, nombre) con presupuesto por sesión y global.
+
+    Args:
+        max_bytes_sesion (int): bytes máximos por sesión.
+        max_bytes_global (int): bytes máximos en total.
+        segundos_vivo (float): tras este tiempo sin uso una entrada se comprime.
+        segundos_sesion (float): tras este tiempo sin uso se descarta la sesión.
+        formato (str): 'png' (sin pérdidas) o 'jpg' (calidad 'calidad') para
+                       dormir; con 'jpg' la huella se recalcula al despertar.
+        calidad (int): calidad JPEG de las entradas dormidas.
+    """
+
+    def __init__(self, max_bytes_sesion=48 * MB, max_bytes_global=1024 * MB, segundos_vivo=60.0,
+                 segundos_sesion=3600.0, formato='png', calidad=95):
+        self.max_bytes_sesion = max_bytes_sesion
+        self.max_bytes_global = max_bytes_global
+        self.segundos_vivo = segundos_vivo
+        self.segundos_sesion = segundos_sesion
+        self.formato = formato
+        self.calidad = calidad
+        self.comprimidas = 0
+        self.descomprimidas = 0
+        self.expulsadas = 0
+        self._lock = threading.RLock()
+        # (sesion, nombre) -> _Entrada, en orden de uso (LRU primero)
+        self._entradas = OrderedDict()
+
+    def guardar(self, sesion, nombre, image, huella=None):
+        """
+        Guarda (o sustituye) una imagen. El almacén no la copia: el llamante
+        no debe modificarla después.
+
+        Args:
+            huella (str): huella a asociar; por defecto se calcula de los píxeles.
+
+        Returns:
+            str: la huella de la imagen.
+        """
+        entrada = _Entrada(_Datos(image), huella or huella_imagen(image), image.shape)
+        with self._lock:
+            self._entradas.pop((sesion, nombre), None)
+            self._entradas[(sesion, nombre)] = entrada
+            self._ajustar(sesion)
+        return entrada.huella
+
+    def obtener(self, sesion, nombre):
+        """
+        Devuelve la imagen a resolución completa (despertándola si está
+        comprimida) o None si no existe o fue expulsada.
+        """
+        with self._lock:
+            entrada = self._entradas.get((sesion, nombre))
+            if entrada is None:
+                return None
+            self._entradas.move_to_end((sesion, nombre))
+            entrada.ultimo_uso = time.monotonic()
+            datos = entrada.datos
+            if datos.array is None:
+                array = cv2.imdecode(np.frombuffer(datos.comprimido, dtype=np.uint8), cv2.IMREAD_UNCHANGED)
+                array.flags.writeable = False
+                datos.array, datos.comprimido = array, None
+                if datos.con_perdidas:
+                    # los píxeles recomprimidos ya no son los de la huella original
+                    nueva = huella_imagen(array)
+                    for otra in self._entradas.values():
+                        if otra.datos is datos:
+                            otra.huella = nueva
+                    datos.con_perdidas = False
+                self.descomprimidas += 1
+                self._ajustar(sesion)
+            return datos.array
+
+    def huella(self, sesion, nombre):
+        with self._lock:
+            entrada = self._entradas.get((sesion, nombre))
+            return None if entrada is None else entrada.huella
+
+    def contiene(self, sesion, nombre):
+        with self._lock:
+            return (sesion, nombre) in self._entradas
+
+    def copiar(self, sesion, origen, destino):
+        """
+        Copia la entrada 'origen' en 'destino' compartiendo los datos (solo lectura).
+        """
+        with self._lock:
+            entrada = self._entradas.get((sesion, origen))
+            if entrada is None:
+                return False
+            copia = _Entrada(entrada.datos, entrada.huella, entrada.shape)
+            if entrada.datos.array is not None:
+                entrada.datos.array.flags.writeable = False
+            self._entradas.pop((sesion, destino), None)
+            self._entradas[(sesion, destino)] = copia
+            self._ajustar(sesion)
+            return True
+
+    def borrar(self, sesion, nombre=None):
+        """
+        Borra una entrada o, sin 'nombre', todas las de la sesión.
+        """
+        with self._lock:
+            for clave in [c for c in self._entradas if c[0] == sesion and nombre in (None, c[1])]:
+                del self._entradas[clave]
+
+    def dormir(self, sesion=None):
+        """
+        Comprime ya todas las entradas vivas (de una sesión o de todas).
+        """
+        with self._lock:
+            for (s, _), entrada in self._entradas.items():
+                if sesion in (None, s):
+                    self._comprimir(entrada.datos)
+
+    def uso(self, sesion=None):
+        """
+        Uso actual de memoria.
+
+        Returns:
+            dict: bytes totales, vivos y comprimidos, entradas, sesiones y
+                  contadores; con 'sesion', también los de esa sesión.
+        """
+        with self._lock:
+            entradas = list(self._entradas.items())
+            datos = {id(e.datos): e.datos for _, e in entradas}.values()
+            informe = {
+                "bytes": sum(d.bytes for d in datos),
+                "bytes_vivos": sum(d.array.nbytes for d in datos if d.array is not None),
+                "bytes_comprimidos": sum(len(d.comprimido) for d in datos if d.comprimido is not None),
+                "entradas": len(entradas),
+                "sesiones": len({s for (s, _), _ in entradas}),
+                "max_bytes_sesion": self.max_bytes_sesion,
+                "max_bytes_global": self.max_bytes_global,
+                "comprimidas": self.comprimidas,
+                "descomprimidas": self.descomprimidas,
+                "expulsadas": self.expulsadas,
+            }
+            if sesion is not None:
+                propias = [(n, e) for (s, n), e in entradas if s == sesion]
+                informe["sesion"] = {
+                    "bytes": _bytes(e for _, e in propias),
+                    "imagenes": {n: {"shape": list(e.shape), "viva": e.datos.array is not None, "bytes": e.datos.bytes}
+                                 for n, e in propias},
+                }
+            return informe
+
+    # --- internos (con el lock tomado) ---
+
+    def _comprimir(self, datos):
+        if datos.array is None:
+            return
+        if self.formato == 'png':
+            ok, buf = cv2.imencode('.png', datos.array, [cv2.IMWRITE_PNG_COMPRESSION, 1])
+        else:
+            ok, buf = cv2.imencode('.jpg', datos.array, [cv2.IMWRITE_JPEG_QUALITY, self.calidad])
+        if not ok:
+            return
+        datos.comprimido, datos.array = buf.tobytes(), None
+        datos.con_perdidas = self.formato != 'png'
+        self.comprimidas += 1
+
+    def _ajustar(self, sesion):
+        """
+        Duerme lo inactivo y aplica los presupuestos: primero comprime y, si
+        no basta, expulsa, siempre de la entrada usada hace más tiempo. La
+        entrada usada más recientemente no se comprime ni se expulsa aquí.
+        """
+        ahora = time.monotonic()
+        actividad = {}
+        for (s, _), entrada in self._entradas.items():
+            actividad[s] = max(actividad.get(s, 0.0), entrada.ultimo_uso)
+            if ahora - entrada.ultimo_uso > self.segundos_vivo:
+                self._comprimir(entrada.datos)
+        for clave in [c for c in self._entradas if ahora - actividad[c[0]] > self.segundos_sesion]:
+            del self._entradas[clave]
+            self.expulsadas += 1
+
+        propias = [c for c in self._entradas if c[0] == sesion]
+        self._reducir(propias, self.max_bytes_sesion)
+        self._reducir(list(self._entradas), self.max_bytes_global)
+
+    def _reducir(self, claves, limite):
+        if not claves or _bytes(self._entradas[c] for c in claves) <= limite:
+            return
+        protegidos = self._entradas[claves[-1]].datos
+        for clave in claves:
+            datos = self._entradas[clave].datos
+            if datos is not protegidos:
+                self._comprimir(datos)
+                if _bytes(self._entradas[c] for c in claves) <= limite:
+                    return
+        for clave in claves[:-1]:
+            if self._entradas[clave].datos is protegidos:
+                continue
+            del self._entradas[clave]
+            self.expulsadas += 1
+            if _bytes(self._entradas[c] for c in claves if c in self._entradas) <= limite:
+                return
+
+
+def almacen_desde_entorno():
+    """
+    Almacén configurado con ALMACEN_MB_SESION, ALMACEN_MB_GLOBAL,
+    ALMACEN_SEGUNDOS_VIVO, ALMACEN_SEGUNDOS_SESION y ALMACEN_FORMATO.
+    """
+    return AlmacenImagenes(
+        max_bytes_sesion=int(os.getenv('ALMACEN_MB_SESION', '48')) * MB,
+        max_bytes_global=int(os.getenv('ALMACEN_MB_GLOBAL', '1024')) * MB,
+        segundos_vivo=float(os.getenv('ALMACEN_SEGUNDOS_VIVO', '60')),
+        segundos_sesion=float(os.getenv('ALMACEN_SEGUNDOS_SESION', '3600')),
+        formato=os.getenv('ALMACEN_FORMATO', 'png'),
+    )
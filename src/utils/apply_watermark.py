@@ -2,55 +2,162 @@ import cv2
 import numpy as np
 import ast
 import os
+from functools import lru_cache
 
-def apply_rotated_watermark(img, text, angle=30, opacity=1, color=(255, 255, 255), output_path=None):
+from src.utils.redaccion import color_para
+
+FONT = cv2.FONT_HERSHEY_SIMPLEX
+FONT_SCALE = 1.5
+THICKNESS = 2
+SPACING = 50
+ANGLE = 35
+
+@lru_cache(maxsize=32)
+def _sello(text, font, font_scale, thickness, angle):
+    """
+    El texto dibujado una sola vez y rotado 'angle' grados.
+
+    Returns:
+        tuple: (sello uint8 (hs, ws) con 0/1, (dx, dy) posición de la esquina
+               superior izquierda del sello respecto al origen del texto)
+    """
+    (text_w, text_h), baseline = cv2.getTextSize(text, font, font_scale, thickness)
+    margen = thickness
+    origen = np.float64([margen, text_h + margen])
+    caja = np.zeros((text_h + baseline + 2 * margen, text_w + 2 * margen), dtype=np.uint8)
+    cv2.putText(caja, text, org=(margen, text_h + margen), fontFace=font,
+                fontScale=font_scale, color=1, thickness=thickness, lineType=cv2.FILLED)
+
+    # rotación alrededor del origen del texto; el sello es la caja rotada
+    A = cv2.getRotationMatrix2D((0, 0), angle, 1.0)[:, :2]
+    hc, wc = caja.shape
+    esquinas = (np.float64([[0, 0], [wc, 0], [wc, hc], [0, hc]]) - origen) @ A.T
+    dx, dy = np.floor(esquinas.min(axis=0))
+    ws, hs = (np.ceil(esquinas.max(axis=0)) - (dx, dy)).astype(int)
+    M = np.hstack([A, (-A @ origen - (dx, dy))[:, None]])
+    sello = cv2.warpAffine(caja, M, (int(ws), int(hs)), flags=cv2.INTER_NEAREST)
+    sello.flags.writeable = False
+    return sello, (dx, dy)
+
+@lru_cache(maxsize=32)
+def _mascara_marca_de_agua(text, angle, font_scale, spacing, h, w, thickness=THICKNESS, font=FONT):
+    """
+    Renderiza la máscara binaria (h, w) del texto repetido y rotado.
+
+    El texto se dibuja y rota una sola vez (_sello) y se estampa en los nodos
+    de la rejilla rotada. Los nodos se obtienen con el mapeo inverso de las
+    esquinas de la imagen al espacio de la rejilla, así solo se recorren los
+    que caen dentro: no hay lienzo del tamaño de la diagonal ni un putText
+    por celda, y la máscara se genera directamente a (h, w).
+
+    Se cachea por (texto, ángulo, escala, espaciado, h, w, grosor, fuente):
+    cambiar la opacidad o el color no obliga a volver a dibujarla. La máscara
+    devuelta es de solo lectura porque se comparte entre llamadas.
+    """
+    (text_w, text_h), _ = cv2.getTextSize(text, font, font_scale, thickness)
+    periodo = np.float64([max(1, text_w + spacing), max(1, text_h + spacing)])
+    sello, (dx, dy) = _sello(text, font, font_scale, thickness, angle)
+    hs, ws = sello.shape
+
+    # rejilla girada alrededor del centro de la imagen: nodo (i, j) -> A @ (i, j) * periodo + centro
+    A = cv2.getRotationMatrix2D((0, 0), angle, 1.0)[:, :2]
+    centro = np.float64([w / 2, h / 2])
+    esquinas = np.float64([[-ws, -hs], [w + ws, -hs], [w + ws, h + hs], [-ws, h + hs]]) - centro
+    nodos = esquinas @ np.linalg.inv(A).T / periodo
+    (i0, j0), (i1, j1) = np.floor(nodos.min(axis=0)), np.ceil(nodos.max(axis=0))
+    ii, jj = np.meshgrid(np.arange(i0, i1 + 1), np.arange(j0, j1 + 1))
+    anclas = (np.stack([ii.ravel(), jj.ravel()], axis=1) * periodo) @ A.T + centro
+    xs = np.round(anclas[:, 0] + dx).astype(int)
+    ys = np.round(anclas[:, 1] + dy).astype(int)
+    dentro = (xs < w) & (ys < h) & (xs + ws > 0) & (ys + hs > 0)
+
+    mask = np.zeros((h, w), dtype=np.uint8)
+    for x, y in zip(xs[dentro].tolist(), ys[dentro].tolist()):
+        xa, ya, xb, yb = max(x, 0), max(y, 0), min(x + ws, w), min(y + hs, h)
+        mask[ya:yb, xa:xb] |= sello[ya - y:yb - y, xa - x:xb - x]
+    # solo contiene 0 y 1: se reinterpreta como bool sin copiar
+    mask = mask.view(bool)
+    mask.flags.writeable = False
+    return mask
+
+@lru_cache(maxsize=4)
+def _indices_marca_de_agua(text, angle, font_scale, spacing, h, w, thickness, font, canales):
+    """
+    Posiciones planas (una por canal) de los píxeles de la máscara en una
+    imagen (h, w, canales) contigua. Se cachean junto a la máscara para no
+    recorrerla en cada mezcla.
+    """
+    mask = _mascara_marca_de_agua(text, angle, font_scale, spacing, h, w, thickness, font)
+    return _indices_mascara(mask, canales)
+
+def _indices_mascara(mask, canales):
+    base = np.flatnonzero(mask).astype(np.int64 if mask.size * canales >= 2**31 else np.int32) * canales
+    indices = tuple(base + k for k in range(canales))
+    for idx in indices:
+        idx.flags.writeable = False
+    return indices
+
+def mezclar_mascara(img, mask, color, opacity, out=None, indices=None):
+    """
+    Mezcla el color con la imagen solo en los píxeles de la máscara, en uint8.
+
+    Equivale a np.where(mask, color*opacity + (1-opacity)*img, img) pero sin
+    construir imágenes float completas: la mezcla de cada canal es una tabla
+    (LUT) de 256 entradas aplicada solo a los píxeles enmascarados, leídos y
+    escritos por su posición plana.
+
+    Args:
+        img (np.ndarray): imagen uint8 (BGR o gris). No se modifica salvo que sea 'out'.
+        mask (np.ndarray): máscara booleana (h, w).
+        color (tuple): color BGR (o nivel de gris si img tiene un canal).
+        opacity (float): opacidad del color entre 0 y 1.
+        out (np.ndarray): destino contiguo con la forma de img (puede ser img
+                          para mezclar en el sitio). None para una copia nueva.
+        indices (tuple): posiciones precalculadas (ver _indices_marca_de_agua).
+
+    Returns:
+        np.ndarray: 'out' (o la copia nueva) con la marca de agua.
+    """
+    if out is None:
+        out = img.copy()
+    elif not out.flags.c_contiguous:
+        raise ValueError("'out' debe ser un array contiguo")
+    elif out is not img:
+        np.copyto(out, img)
+    canales = 1 if img.ndim == 2 else img.shape[2]
+    color = np.broadcast_to(np.asarray(color, dtype=np.float64).ravel(), (canales,))
+    niveles = np.arange(256, dtype=np.float64)
+    lut = (color[None, :] * opacity + (1 - opacity) * niveles[:, None]).astype(np.uint8)
+
+    if indices is None:
+        indices = _indices_mascara(mask, canales)
+    plano = out.reshape(-1)
+    for k, idx in enumerate(indices):
+        plano[idx] = np.take(lut[:, k], np.take(plano, idx))
+    return out
+
+def apply_rotated_watermark(img, text, angle=30, opacity=1, color=(255, 255, 255), output_path=None,
+                            font_scale=FONT_SCALE, thickness=THICKNESS, spacing=SPACING, font=FONT, out=None):
+    """
+    Tiled, rotated text watermark.
+
+    Returns a new image unless 'out' is given: then the result is written into
+    'out' (which may be 'img' itself to blend in place) and 'out' is returned.
+    """
     # 1. Load the base image
     h, w = img.shape[:2]
+    canales = 1 if img.ndim == 2 else img.shape[2]
 
-    if img.ndim != 3:
-        img = cv2.cvtColor(img, cv2.COLOR_GRAY2BGR) # treat the GRAY scale as colored
+    color = (ast.literal_eval(os.getenv('COLOR_WHITE')) if color is None else color)
+    # gray images stay single-channel: the colour is mapped to its luminance
+    color = color_para(img, color)
 
-    # 2. Create a larger canvas to handle rotation without clipping edges
-    # We use a canvas larger than the image to ensure tiles cover corners
-    diagonal = int(np.sqrt(h**2 + w**2))
-    watermark_layer = np.zeros((diagonal, diagonal, 3), dtype=np.uint8)
-    #watermark_layer = np.zeros((h, w, 3), dtype=np.uint8)
+    # 2-6. Rotated text mask and its pixel positions (cached)
+    mask = _mascara_marca_de_agua(text, angle, font_scale, spacing, h, w, thickness, font)
+    indices = _indices_marca_de_agua(text, angle, font_scale, spacing, h, w, thickness, font, canales)
 
-    # 3. Define text properties
-    font = cv2.FONT_HERSHEY_SIMPLEX
-    font_scale = 1.5
-    color = (ast.literal_eval(os.getenv('COLOR_WHITE')) if color is None else color)
-    thickness = 2
-    
-    (text_w, text_h), _ = cv2.getTextSize(text, font, font_scale, thickness)
-    
-    # 4. Draw repeated text on the larger canvas (straight first)
-    # Adjust spacing by changing the +200 and +100 values
-    # create a mask for the text over the image
-    for y in range(0, diagonal, text_h + 50):
-        for x in range(0, diagonal, text_w + 50):
-            cv2.putText(watermark_layer, text, org=(x, y), fontFace=font, 
-                        fontScale=font_scale, color=(1,1,1), thickness=thickness, lineType=cv2.FILLED)
-
-    # 5. Rotate the entire watermark canvas by 'angle' degrees
-    center = (diagonal // 2, diagonal // 2)
-    M = cv2.getRotationMatrix2D(center, angle, 1.0)
-    rotated_watermark = cv2.warpAffine(watermark_layer, M, (diagonal, diagonal), flags=cv2.INTER_NEAREST)
-
-    # 6. Crop the rotated canvas back to the original image size
-    # We take the center portion to match the original image dimensions
-    start_y = (diagonal - h) // 2
-    start_x = (diagonal - w) // 2
-    cropped_watermark = rotated_watermark[start_y:start_y+h, start_x:start_x+w]
-
-    # 7. Blend with original image
-    #if color != (0,0,0): 
-    #    output = cv2.addWeighted(img, (1-opacity), cropped_watermark, opacity, 0)
-    #else:# black letters case
-    #    output = np.multiply(img,cropped_watermark*opacity).astype(np.uint8)
-        
-    fondo_color = np.ones_like(img, dtype=np.uint8) * np.array(color, dtype=np.uint8)
-    output = np.where(cropped_watermark!=0, fondo_color*opacity + (1-opacity)*img, img).astype(np.uint8)
+    # 7. Blend with original image, only on the masked pixels
+    output = mezclar_mascara(img, mask, color, opacity, out=out, indices=indices)
 
     # Save the final image if an output path is provided
     if output_path:
@@ -0,0 +1,277 @@
+"""
+Caché direccionada por contenido para resultados codificados (bytes).
+
+La clave es una huella de (imagen de origen, parámetros de procesado,
+formato, calidad), de modo que repetir una descarga con los mismos ajustes
+no vuelve a procesar ni a codificar nada, aunque la pida otra sesión. El
+tamaño total está acotado y se expulsan primero las entradas usadas hace
+más tiempo (LRU).
+
+Como los resultados son documentos de identidad, cada entrada caduca a los
+'ttl' segundos y un temporizador las purga aunque nadie vuelva a pedirlas.
+La capa opcional en disco (un fichero por clave, permisos 0600) sobrevive a
+reinicios y tiene su propio límite de tamaño y la misma caducidad.
+"""
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+
+
+def huella_imagen(image):
+    """
+    Huella rápida (blake2b, 128 bits) de los píxeles y la forma de la imagen.
+    """
+    h = hashlib.blake2b(digest_size=16)
+    h.update(repr((image.shape, image.dtype.str)).encode())
+    h.update(memoryview(np.ascontiguousarray(image)).cast('B'))
+    return h.hexdigest()
+
+
+def huella_parametros(**parametros):
+    """
+    Huella estable de un conjunto de parámetros serializables a JSON.
+    """
+    texto = json.dumps(parametros, sort_keys=True, default=repr, separators=(',', ':'))
+    return hashlib.blake2b(texto.encode(), digest_size=16).hexdigest()
+
+
+class CacheBytes:
+    """
+    LRU de bytes acotada por tamaño total y con caducidad, segura entre hilos.
+
+    Args:
+        max_bytes (int): tamaño máximo de la suma de los valores en memoria.
+        ttl (float): segundos de vida de cada entrada (None: sin caducidad).
+        carpeta (str): carpeta de la capa en disco (None: solo memoria).
+        max_bytes_disco (int): tamaño máximo de la capa en disco.
+    """
+
+    def __init__(self, max_bytes=256 * 1024 * 1024, ttl=None, carpeta=None, max_bytes_disco=1024 * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.carpeta = carpeta
+        self.max_bytes_disco = max_bytes_disco
+        self.bytes = 0
+        self.aciertos = 0
+        self.aciertos_disco = 0
+        self.fallos = 0
+        self.caducadas = 0
+        self._lock = threading.Lock()
+        # clave -> (valor, instante de caducidad)
+        self._datos = OrderedDict()
+        self._temporizador = None
+        if carpeta:
+            os.makedirs(carpeta, mode=0o700, exist_ok=True)
+
+    def _caduca(self):
+        return float('inf') if self.ttl is None else time.time() + self.ttl
+
+    def _ruta(self, clave):
+        return os.path.join(self.carpeta, clave + '.bin')
+
+    def get(self, clave):
+        with self._lock:
+            entrada = self._datos.get(clave)
+            if entrada is not None and entrada[1] <= time.time():
+                self._quitar(clave)
+                self.caducadas += 1
+                entrada = None
+            if entrada is not None:
+                self._datos.move_to_end(clave)
+                self.aciertos += 1
+                return entrada[0]
+        valor, caduca = self._leer_disco(clave)
+        with self._lock:
+            if valor is None:
+                self.fallos += 1
+                return None
+            self.aciertos_disco += 1
+        # al subir a memoria conserva la caducidad que tenía en disco
+        self._guardar_memoria(clave, valor, caduca)
+        return valor
+
+    def put(self, clave, valor):
+        if len(valor) > self.max_bytes:
+            return
+        self._guardar_memoria(clave, valor, self._caduca())
+        self._escribir_disco(clave, valor)
+
+    def _guardar_memoria(self, clave, valor, caduca):
+        with self._lock:
+            self._quitar(clave)
+            self._datos[clave] = (valor, caduca)
+            self.bytes += len(valor)
+            while self.bytes > self.max_bytes:
+                _, (expulsado, _) = self._datos.popitem(last=False)
+                self.bytes -= len(expulsado)
+
+    def _quitar(self, clave):
+        anterior = self._datos.pop(clave, None)
+        if anterior is not None:
+            self.bytes -= len(anterior[0])
+
+    def _leer_disco(self, clave):
+        # (valor, instante de caducidad) o (None, None)
+        if not self.carpeta:
+            return None, None
+        ruta = self._ruta(clave)
+        try:
+            caduca = float('inf') if self.ttl is None else os.path.getmtime(ruta) + self.ttl
+            if caduca <= time.time():
+                os.remove(ruta)
+                return None, None
+            with open(ruta, 'rb') as f:
+                return f.read(), caduca
+        except OSError:
+            return None, None
+
+    def _escribir_disco(self, clave, valor):
+        if not self.carpeta or len(valor) > self.max_bytes_disco:
+            return
+        temporal = self._ruta(clave) + f'.{os.getpid()}.{threading.get_ident()}.tmp'
+        try:
+            fd = os.open(temporal, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+            with os.fdopen(fd, 'wb') as f:
+                f.write(valor)
+            os.replace(temporal, self._ruta(clave))
+        except OSError:
+            return
+
+    def obtener_o_calcular(self, clave, calcular):
+        """
+        Devuelve el valor cacheado o lo calcula con calcular() y lo guarda.
+        """
+        valor = self.get(clave)
+        if valor is None:
+            valor = calcular()
+            self.put(clave, valor)
+        return valor
+
+    def purgar(self):
+        """
+        Borra las entradas caducadas (memoria y disco) y recorta el disco a
+        'max_bytes_disco' empezando por los ficheros más antiguos.
+
+        Returns:
+            int: entradas borradas.
+        """
+        ahora = time.time()
+        with self._lock:
+            caducadas = [c for c, (_, caduca) in self._datos.items() if caduca <= ahora]
+            for clave in caducadas:
+                self._quitar(clave)
+            borradas = len(caducadas)
+            self.caducadas += borradas
+        if self.carpeta:
+            ficheros = []
+            for nombre in os.listdir(self.carpeta):
+                ruta = os.path.join(self.carpeta, nombre)
+                try:
+                    info = os.stat(ruta)
+                except OSError:
+                    continue
+                if nombre.endswith('.tmp'):
+                    # restos de una escritura interrumpida
+                    if info.st_mtime + 60 <= ahora:
+                        _borrar(ruta)
+                elif self.ttl is not None and info.st_mtime + self.ttl <= ahora:
+                    borradas += _borrar(ruta)
+                else:
+                    ficheros.append((info.st_mtime, info.st_size, ruta))
+            total = sum(tamano for _, tamano, _ in ficheros)
+            for _, tamano, ruta in sorted(ficheros):
+                if total <= self.max_bytes_disco:
+                    break
+                borradas += _borrar(ruta)
+                total -= tamano
+        return borradas
+
+    def iniciar_purga(self, intervalo=60.0):
+        """
+        Llama a purgar() cada 'intervalo' segundos en un hilo daemon.
+        """
+        def ciclo():
+            self.purgar()
+            self._temporizador = threading.Timer(intervalo, ciclo)
+            self._temporizador.daemon = True
+            self._temporizador.start()
+
+        if self._temporizador is None:
+            ciclo()
+        return self
+
+    def detener_purga(self):
+        if self._temporizador is not None:
+            self._temporizador.cancel()
+            self._temporizador = None
+
+    def vaciar(self):
+        """
+        Borra todas las entradas, también las del disco.
+        """
+        with self._lock:
+            self._datos.clear()
+            self.bytes = 0
+        if self.carpeta:
+            for nombre in os.listdir(self.carpeta):
+                _borrar(os.path.join(self.carpeta, nombre))
+
+    def estadisticas(self):
+        with self._lock:
+            return {
+                "entradas": len(self._datos), "bytes": self.bytes, "max_bytes": self.max_bytes,
+                "aciertos": self.aciertos, "aciertos_disco": self.aciertos_disco,
+                "fallos": self.fallos, "caducadas": self.caducadas, "ttl": self.ttl,
+                "disco": bool(self.carpeta),
+            }
+
+    def a_prometheus(self, nombre="dni_cache_resultados"):
+        """
+        Contadores de la caché en formato de texto de Prometheus.
+        """
+        e = self.estadisticas()
+        lineas = [
+            f"# HELP {nombre}_peticiones_total Consultas a la caché por resultado.",
+            f"# TYPE {nombre}_peticiones_total counter",
+            f'{nombre}_peticiones_total{{resultado="acierto"}} {e["aciertos"]}',
+            f'{nombre}_peticiones_total{{resultado="acierto_disco"}} {e["aciertos_disco"]}',
+            f'{nombre}_peticiones_total{{resultado="fallo"}} {e["fallos"]}',
+            f"# HELP {nombre}_caducadas_total Entradas borradas por caducidad.",
+            f"# TYPE {nombre}_caducadas_total counter",
+            f"{nombre}_caducadas_total {e['caducadas']}",
+            f"# HELP {nombre}_bytes Bytes en memoria.",
+            f"# TYPE {nombre}_bytes gauge",
+            f"{nombre}_bytes {e['bytes']}",
+        ]
+        return "\n".join(lineas) + "\n"
+
+    def __len__(self):
+        return len(self._datos)
+
+
+def _borrar(ruta):
+    try:
+        os.remove(ruta)
+        return 1
+    except OSError:
+        return 0
+
+
+def cache_desde_entorno(prefijo='CACHE_DESCARGAS', mb=256):
+    """
+    CacheBytes configurada con <prefijo>_MB, <prefijo>_TTL_S, <prefijo>_CARPETA
+    y <prefijo>_DISCO_MB, con la purga periódica (<prefijo>_PURGA_S) en marcha.
+    """
+    ttl = os.getenv(f'{prefijo}_TTL_S', '900')
+    cache = CacheBytes(
+        max_bytes=int(os.getenv(f'{prefijo}_MB', str(mb))) * 1024 * 1024,
+        ttl=float(ttl) if float(ttl) > 0 else None,
+        carpeta=os.getenv(f'{prefijo}_CARPETA') or None,
+        max_bytes_disco=int(os.getenv(f'{prefijo}_DISCO_MB', '1024')) * 1024 * 1024,
+    )
+    return cache.iniciar_purga(float(os.getenv(f'{prefijo}_PURGA_S', '60')))
@@ -0,0 +1,162 @@
+"""
+Captura desde vídeo (fichero o cámara) quedándose con el mejor fotograma.
+
+No depende de Streamlit. Cada fotograma analizado se reduce a 'lado' px y
+se puntúa con:
+
+- confianza de detectar_documento (un solo nivel y sin refinar esquinas),
+- nitidez: varianza del laplaciano dentro del documento,
+- reflejos: fracción de píxeles saturados dentro del documento.
+
+Entre los fotogramas con confianza suficiente gana el más nítido una vez
+penalizados los reflejos. La puntuación 0-1 combina los tres factores y
+sirve para mostrarla y para parar en cuanto una captura es buena.
+
+El análisis va en tiempo real: si el fotograma anterior tardó más que el
+intervalo entre fotogramas (1/fps), los siguientes se descartan con grab()
+sin decodificarlos hasta volver a ir al día. Al terminar, las esquinas del
+mejor fotograma se refinan una sola vez a resolución completa.
+
+Objetivo: < 33 ms por fotograma analizado a 720p (benchmarks/bench_captura.py).
+"""
+import time
+
+import cv2
+import numpy as np
+
+from src.utils.deteccion import detectar_documento, ordenar_esquinas, reducir, refinar_esquinas
+
+LADO_ANALISIS = 512
+NITIDEZ_REFERENCIA = 2000.0  # varianza del laplaciano que puntúa 0.5
+CONFIANZA_MINIMA = 0.6
+UMBRAL_REFLEJO = 245
+FPS_POR_DEFECTO = 30.0
+
+
+def puntuar_fotograma(frame, lado=LADO_ANALISIS):
+    """
+    Puntúa un fotograma para la captura.
+
+    Returns:
+        dict: {"puntuacion", "confianza", "nitidez", "reflejo", "nitidez_util": float,
+               "puntos": np.ndarray (4, 2) en coordenadas del fotograma o None}
+    """
+    small, escala = reducir(frame, lado)
+    gray = small if small.ndim == 2 else cv2.cvtColor(small, cv2.COLOR_BGR2GRAY)
+    deteccion = detectar_documento(gray, niveles=(max(gray.shape),), refinar=False)
+    if deteccion is None:
+        return {"puntuacion": 0.0, "confianza": 0.0, "nitidez": 0.0, "reflejo": 0.0, "nitidez_util": 0.0,
+                "puntos": None}
+
+    quad = deteccion["puntos"]
+    x, y, w, h = cv2.boundingRect(np.round(quad).astype(np.int32))
+    x, y = max(0, x), max(0, y)
+    roi = gray[y:y + h, x:x + w]
+    mascara = np.zeros(roi.shape, dtype=np.uint8)
+    cv2.fillConvexPoly(mascara, np.round(quad - (x, y)).astype(np.int32), 255)
+
+    _, desviacion = cv2.meanStdDev(cv2.Laplacian(roi, cv2.CV_16S, ksize=3), mask=mascara)
+    nitidez = float(desviacion[0, 0]) ** 2
+    area = max(1, cv2.countNonZero(mascara))
+    reflejo = cv2.countNonZero(cv2.bitwise_and(cv2.inRange(roi, UMBRAL_REFLEJO, 255), mascara)) / area
+
+    # un 10% de píxeles quemados anula el fotograma
+    factor_reflejo = max(0.0, 1.0 - 10 * reflejo)
+    puntuacion = deteccion["confianza"] * nitidez / (nitidez + NITIDEZ_REFERENCIA) * factor_reflejo
+    return {"puntuacion": puntuacion, "confianza": deteccion["confianza"], "nitidez": nitidez,
+            "reflejo": reflejo, "nitidez_util": nitidez * factor_reflejo, "puntos": quad / escala}
+
+
+class MejorFotograma:
+    """
+    Conserva el fotograma más nítido (sin reflejos) de entre los que tienen
+    un documento detectado con confianza suficiente.
+    """
+
+    def __init__(self):
+        self.frame = None
+        self.puntuacion = None
+        self.indice = None
+
+    def considerar(self, frame, puntuacion, indice):
+        if puntuacion["puntos"] is None or puntuacion["confianza"] < CONFIANZA_MINIMA:
+            return False
+        if self.puntuacion is not None and puntuacion["nitidez_util"] <= self.puntuacion["nitidez_util"]:
+            return False
+        # el buffer del fotograma puede reutilizarse en la siguiente lectura
+        self.frame, self.puntuacion, self.indice = frame.copy(), puntuacion, indice
+        return True
+
+
+def capturar(fuente, max_fotogramas=None, lado=LADO_ANALISIS, tiempo_real=True, parar_en=None, progreso=None):
+    """
+    Analiza un vídeo y devuelve su mejor fotograma.
+
+    Args:
+        fuente: ruta de un fichero de vídeo, índice de cámara o cv2.VideoCapture.
+        max_fotogramas (int): fotogramas a recorrer como máximo.
+        lado (int): lado mayor de la copia reducida que se analiza.
+        tiempo_real (bool): descartar fotogramas si el análisis se retrasa
+                            respecto al ritmo del vídeo (1/fps).
+        parar_en (float): terminar en cuanto un fotograma alcance esta puntuación.
+        progreso (callable): progreso(indice, puntuacion, mejor) tras cada análisis.
+
+    Returns:
+        dict: {"imagen": fotograma BGR o None, "puntos": esquinas refinadas
+               (tl, tr, br, bl) o None, "puntuacion": dict o None,
+               "indice": int, "estadisticas": dict}
+    """
+    cap = fuente if isinstance(fuente, cv2.VideoCapture) else cv2.VideoCapture(fuente)
+    if not cap.isOpened():
+        raise ValueError(f"No se pudo abrir el vídeo {fuente}")
+    fps = cap.get(cv2.CAP_PROP_FPS) or FPS_POR_DEFECTO
+    intervalo = 1.0 / fps
+
+    mejor = MejorFotograma()
+    tiempos = []
+    leidos = saltados = 0
+    t0 = time.perf_counter()
+    try:
+        while max_fotogramas is None or leidos < max_fotogramas:
+            # fotogramas que ya han pasado mientras se analizaba el anterior
+            if tiempo_real and time.perf_counter() - t0 > (leidos + 1) * intervalo:
+                if not cap.grab():
+                    break
+                leidos += 1
+                saltados += 1
+                continue
+            ok, frame = cap.read()
+            if not ok:
+                break
+            inicio = time.perf_counter()
+            puntuacion = puntuar_fotograma(frame, lado)
+            tiempos.append((time.perf_counter() - inicio) * 1000)
+            mejor.considerar(frame, puntuacion, leidos)
+            if progreso is not None:
+                progreso(leidos, puntuacion, mejor)
+            leidos += 1
+            if parar_en is not None and mejor.puntuacion and mejor.puntuacion["puntuacion"] >= parar_en:
+                break
+    finally:
+        if not isinstance(fuente, cv2.VideoCapture):
+            cap.release()
+
+    puntos = None
+    if mejor.frame is not None:
+        escala = lado / max(mejor.frame.shape[:2])
+        radio = max(4, int(round(5 / min(1.0, escala))))
+        puntos = ordenar_esquinas(refinar_esquinas(mejor.frame, mejor.puntuacion["puntos"], radio=radio))
+    return {
+        "imagen": mejor.frame,
+        "puntos": puntos,
+        "puntuacion": mejor.puntuacion,
+        "indice": mejor.indice,
+        "estadisticas": {
+            "fotogramas": leidos,
+            "analizados": len(tiempos),
+            "saltados": saltados,
+            "fps": fps,
+            "p50_ms": float(np.percentile(tiempos, 50)) if tiempos else None,
+            "p95_ms": float(np.percentile(tiempos, 95)) if tiempos else None,
+        },
+    }
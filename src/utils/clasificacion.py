@@ -0,0 +1,178 @@
+"""
+Clasificación automática de la plantilla (anverso / reverso) de una tarjeta recortada.
+
+No depende de Streamlit. Sobre una copia gris de ANCHO_CLASIFICACION px se
+miden dos señales:
+
+- banda MRZ: el reverso del DNI lleva tres líneas OCR que ocupan casi todo
+  el ancho en la parte inferior. Tras un gradiente horizontal y un cierre se
+  cuentan las franjas de filas con bordes en casi todo el ancho. Puntúa a
+  favor de las plantillas con "cara": "reverso" y en contra de las de
+  "cara": "anverso".
+- firma: si la plantilla tiene imagen de referencia (ver alineacion.py), su
+  miniatura normalizada, calculada una sola vez por fichero, se compara por
+  correlación con la de la imagen.
+
+La puntuación de cada plantilla es la media de sus señales (0-1) y la
+confianza es la probabilidad softmax de la mejor frente a las demás (o su
+puntuación si es la única que se puede clasificar). Por debajo de
+CONFIANZA_MINIMA hay que elegir la plantilla a mano. Las plantillas sin
+cara ni referencia no se pueden clasificar y se ignoran.
+
+Objetivo: < 5 ms por tarjeta (benchmarks/bench_clasificacion.py).
+"""
+import threading
+
+import cv2
+import numpy as np
+
+from src.utils.deteccion import reducir
+
+ANCHO_CLASIFICACION = 256
+TAMANO_FIRMA = (48, 30)
+ZONA_MRZ = 0.45                  # parte inferior de la tarjeta en la que se busca la MRZ
+COBERTURA_MRZ = 0.6              # fracción del ancho con bordes en una fila de la MRZ
+ALTO_LINEA_MRZ = (0.025, 0.09)   # alto de una línea de la MRZ, relativo al alto de la tarjeta
+LINEAS_MRZ = 3
+TEMPERATURA = 0.1
+CONFIANZA_MINIMA = 0.8
+MAX_FIRMAS = 32
+
+_firmas = {}
+_lock = threading.Lock()
+
+
+def _gris_reducida(image, ancho):
+    small, _ = reducir(image, ancho)
+    return small if small.ndim == 2 else cv2.cvtColor(small, cv2.COLOR_BGR2GRAY)
+
+
+def firma(image, ancho=ANCHO_CLASIFICACION):
+    """
+    Miniatura TAMANO_FIRMA de media 0 y norma 1 (el producto escalar de dos
+    firmas es su correlación).
+    """
+    gray = cv2.resize(_gris_reducida(image, ancho), TAMANO_FIRMA, interpolation=cv2.INTER_AREA)
+    v = gray.astype(np.float32).ravel()
+    v -= v.mean()
+    return v / max(float(np.linalg.norm(v)), 1e-6)
+
+
+def firma_referencia(referencia):
+    """
+    Firma de la imagen de referencia de una plantilla, sin recalcular mientras no cambie.
+
+    Args:
+        referencia (tuple): (ruta, mtime_ns), como Plantilla.referencia.
+
+    Returns:
+        np.ndarray: o None si el fichero no se puede leer.
+    """
+    with _lock:
+        f = _firmas.get(referencia)
+    if f is not None:
+        return f
+    image = cv2.imread(referencia[0], cv2.IMREAD_GRAYSCALE)
+    if image is None:
+        return None
+    f = firma(image)
+    with _lock:
+        if len(_firmas) >= MAX_FIRMAS:
+            _firmas.clear()
+        _firmas[referencia] = f
+    return f
+
+
+def lineas_mrz(gray):
+    """
+    Número de líneas tipo MRZ (texto en casi todo el ancho) en la parte
+    inferior de una tarjeta gris ya reducida.
+    """
+    h, w = gray.shape
+    zona = gray[int(h * (1 - ZONA_MRZ)):]
+    bordes = cv2.convertScaleAbs(cv2.Sobel(zona, cv2.CV_16S, 1, 0, ksize=3))
+    _, bordes = cv2.threshold(bordes, 0, 255, cv2.THRESH_BINARY | cv2.THRESH_OTSU)
+    # une los caracteres de una línea (la MRZ tiene paso fijo y huecos cortos)
+    bordes = cv2.morphologyEx(bordes, cv2.MORPH_CLOSE, cv2.getStructuringElement(cv2.MORPH_RECT, (max(3, w // 20), 1)))
+    llenas = np.count_nonzero(bordes, axis=1) >= COBERTURA_MRZ * w
+
+    alto_min, alto_max = ALTO_LINEA_MRZ[0] * h, ALTO_LINEA_MRZ[1] * h
+    lineas, racha = 0, 0
+    for llena in np.append(llenas, False):
+        if llena:
+            racha += 1
+            continue
+        if alto_min <= racha <= alto_max:
+            lineas += 1
+        racha = 0
+    return lineas
+
+
+def clasificar(image, plantillas, ancho=ANCHO_CLASIFICACION):
+    """
+    Elige la plantilla que mejor encaja con una tarjeta recortada.
+
+    Args:
+        image (np.ndarray): tarjeta recortada, BGR o gris.
+        plantillas (list): plantillas compiladas candidatas.
+        ancho (int): ancho de la copia reducida que se analiza.
+
+    Returns:
+        dict: {"plantilla": nombre o None, "confianza": float 0-1,
+               "puntuaciones": {nombre: float}, "lineas_mrz": int}
+    """
+    gray = _gris_reducida(image, ancho)
+    lineas = lineas_mrz(gray)
+    # una sola línea es ambigua (0.5); dos de las tres ya bastan para decir que hay MRZ
+    mrz = min(1.0, lineas / (LINEAS_MRZ - 1))
+    firma_imagen = None
+
+    puntuaciones = {}
+    for plantilla in plantillas:
+        senales = []
+        cara = plantilla.get("cara")
+        if cara == "reverso":
+            senales.append(mrz)
+        elif cara == "anverso":
+            senales.append(1.0 - mrz)
+        if plantilla.referencia:
+            f = firma_referencia(plantilla.referencia)
+            if f is not None:
+                if firma_imagen is None:
+                    firma_imagen = firma(gray, ancho)
+                # correlación -1..1 a 0..1
+                senales.append((float(firma_imagen @ f) + 1) / 2)
+        if senales:
+            puntuaciones[plantilla.nombre] = sum(senales) / len(senales)
+
+    resultado = {"plantilla": None, "confianza": 0.0, "puntuaciones": puntuaciones, "lineas_mrz": lineas}
+    if not puntuaciones:
+        return resultado
+    if len(puntuaciones) == 1:
+        # sin alternativas la confianza es la propia puntuación
+        (resultado["plantilla"], resultado["confianza"]), = puntuaciones.items()
+        return resultado
+    nombres = list(puntuaciones)
+    p = np.exp((np.array([puntuaciones[n] for n in nombres]) - max(puntuaciones.values())) / TEMPERATURA)
+    p /= p.sum()
+    mejor = int(np.argmax(p))
+    resultado["plantilla"] = nombres[mejor]
+    resultado["confianza"] = float(p[mejor])
+    return resultado
+
+
+def elegir_plantilla(image, plantillas, confianza_minima=CONFIANZA_MINIMA):
+    """
+    Plantilla de una tarjeta recortada para los modos desatendidos (lotes y
+    servicio con template=auto).
+
+    Returns:
+        tuple: (Plantilla, resultado de clasificar())
+
+    Raises:
+        ValueError: si no se alcanza 'confianza_minima' (hay que elegirla a mano).
+    """
+    resultado = clasificar(image, plantillas)
+    if resultado["plantilla"] is None or resultado["confianza"] < confianza_minima:
+        raise ValueError(f"No se pudo identificar la plantilla (confianza {resultado['confianza']:.2f})")
+    return next(p for p in plantillas if p.nombre == resultado["plantilla"]), resultado
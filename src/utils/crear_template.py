@@ -3,16 +3,19 @@ from PIL import Image, ImageDraw
 from streamlit_image_coordinates import streamlit_image_coordinates
 import cv2
 
+from src.utils.sesion import imagen
+from src.utils.plantillas import migrar_plantilla
+
 
 def crear_template_page():
  
     st.title("🎯 Marcar Rectángulos")
 
-    if st.session_state['imagen_confirmada'] is None:
+    img_cv2_bgr = imagen('confirmada')
+    if img_cv2_bgr is None:
         st.warning("⚠️ No hay imagen cargada. Por favor, vuelve al Paso 1.")
     else:
         
-        img_cv2_bgr = st.session_state['imagen_confirmada']
         # 1. Definir un ancho máximo de visualización (ej. 800 píxeles)
         WIDTH_DISPLAY = 600
         ratio = img_cv2_bgr.shape[1] / WIDTH_DISPLAY
@@ -65,10 +68,11 @@ def crear_template_page():
             st.rerun()
 
         if st.button("💾 Finalizar y Generar JSON"):
-            template = {
+            # formato 2: regiones con nombre y coordenadas normalizadas (ver plantillas.py)
+            template = migrar_plantilla({
                 "size": [width, height],
                 "rectangles": st.session_state.rects
-            }
+            })
             st.session_state.nueva_template= template
             st.success("JSON guardado en sesión como plantilla NUEVO.")
             if st.button("Volver al Paso 1 para utilizar la plantilla", on_click=cambiar_crear_template_state):
@@ -0,0 +1,203 @@
+"""
+Detección automática del documento (tarjeta ID-1) en una foto.
+
+No depende de Streamlit. Trabaja sobre una versión reducida de la imagen
+(pirámide de 2 niveles: ~512 px y, si no hay candidato claro, ~1024 px),
+elige el cuadrilátero con mejor puntuación según área, rectangularidad y
+proporción ID-1 (85.6 x 54 mm), devuelve las esquinas a la resolución
+original y las refina a nivel subpíxel ajustando rectas a los bordes.
+"""
+import cv2
+import numpy as np
+
+PROPORCION_ID1 = 85.6 / 54.0
+TOLERANCIA_PROPORCION = 0.35   # relativa (la perspectiva deforma la proporción)
+AREA_MINIMA = 0.08             # fracción de la imagen
+NIVELES = (512, 1024)          # lado mayor de cada nivel de la pirámide
+
+
+def ordenar_esquinas(puntos):
+    """
+    Ordena 4 puntos como (tl, tr, br, bl).
+    """
+    puntos = np.asarray(puntos, dtype=np.float32).reshape(4, 2)
+    rect = np.zeros((4, 2), dtype=np.float32)
+    s = puntos.sum(axis=1)
+    rect[0] = puntos[np.argmin(s)]
+    rect[2] = puntos[np.argmax(s)]
+    diff = np.diff(puntos, axis=1).ravel()
+    rect[1] = puntos[np.argmin(diff)]
+    rect[3] = puntos[np.argmax(diff)]
+    return rect
+
+
+def reducir(image, lado):
+    """
+    Reducción barata: INTER_NEAREST hasta el doble del tamaño final (solo lee
+    los píxeles que usa) y después INTER_AREA para suavizar el submuestreo.
+
+    Returns:
+        tuple: (imagen con lado mayor <= 'lado', escala aplicada); sin copia
+        si ya es menor.
+    """
+    h, w = image.shape[:2]
+    escala = lado / max(h, w)
+    if escala >= 1:
+        return image, 1.0
+    destino = (max(1, round(w * escala)), max(1, round(h * escala)))
+    if escala < 0.5:
+        image = cv2.resize(image, (2 * destino[0], 2 * destino[1]), interpolation=cv2.INTER_NEAREST)
+    small = cv2.resize(image, destino, interpolation=cv2.INTER_AREA)
+    return small, destino[0] / w
+
+
+def _proporcion(quad):
+    tl, tr, br, bl = quad
+    ancho = (np.linalg.norm(tr - tl) + np.linalg.norm(br - bl)) / 2
+    alto = (np.linalg.norm(bl - tl) + np.linalg.norm(br - tr)) / 2
+    if min(ancho, alto) == 0:
+        return 0.0
+    return max(ancho, alto) / min(ancho, alto)
+
+
+def _candidatos(gray):
+    """
+    Contornos de bordes (Canny con umbrales automáticos) y de una
+    segmentación de Otsu, para cubrir fondos con y sin contraste de bordes.
+    """
+    gray = cv2.GaussianBlur(gray, (5, 5), 0)
+    mediana = float(np.median(gray))
+    edged = cv2.Canny(gray, int(max(0, 0.66 * mediana)), int(min(255, 1.33 * mediana)))
+    edged = cv2.dilate(edged, np.ones((3, 3), np.uint8))
+    cnts, _ = cv2.findContours(edged, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+    _, otsu = cv2.threshold(gray, 0, 255, cv2.THRESH_BINARY + cv2.THRESH_OTSU)
+    for binaria in (otsu, 255 - otsu):
+        c, _ = cv2.findContours(binaria, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+        cnts += c
+    return cnts
+
+
+def _puntuar(cnts, area_imagen):
+    """
+    Devuelve (puntuación, quad) del mejor cuadrilátero, o (0, None).
+    """
+    mejor = (0.0, None)
+    for c in sorted(cnts, key=cv2.contourArea, reverse=True)[:10]:
+        area = cv2.contourArea(c)
+        if area < AREA_MINIMA * area_imagen:
+            break
+        peri = cv2.arcLength(c, True)
+        hull = cv2.convexHull(c)
+        approx = cv2.approxPolyDP(hull, 0.02 * peri, True)
+        if len(approx) != 4:
+            continue
+        quad = ordenar_esquinas(approx)
+        area_quad = cv2.contourArea(quad)
+        (_, _), (rw, rh), _ = cv2.minAreaRect(quad)
+        rectangularidad = area_quad / (rw * rh) if rw * rh > 0 else 0
+        desvio = abs(_proporcion(quad) / PROPORCION_ID1 - 1)
+        if desvio > TOLERANCIA_PROPORCION:
+            continue
+        # cuánto del contorno explica el cuadrilátero, forma y tamaño relativo
+        ajuste = min(area, area_quad) / max(area, area_quad)
+        puntuacion = (ajuste * rectangularidad * (1 - desvio / TOLERANCIA_PROPORCION) ** 0.5
+                      * min(1.0, area_quad / (0.25 * area_imagen)) ** 0.25)
+        if puntuacion > mejor[0]:
+            mejor = (puntuacion, quad)
+    return mejor
+
+
+def _interseccion(l1, l2):
+    (vx1, vy1, x1, y1), (vx2, vy2, x2, y2) = l1, l2
+    det = vx1 * (-vy2) - vy1 * (-vx2)
+    if abs(det) < 1e-9:
+        return None
+    t = ((x2 - x1) * (-vy2) - (y2 - y1) * (-vx2)) / det
+    return np.array([x1 + t * vx1, y1 + t * vy1], dtype=np.float32)
+
+
+def refinar_esquinas(image, esquinas, radio=24, muestras=24):
+    """
+    Refina las esquinas a nivel subpíxel sobre la imagen a resolución completa.
+
+    Para cada lado se toman 'muestras' perfiles perpendiculares de +-radio px
+    (con cv2.remap, sin convertir la imagen entera), se localiza el máximo del
+    gradiente con interpolación parabólica, se ajusta una recta robusta
+    (cv2.fitLine, Huber) y las esquinas son las intersecciones de lados
+    consecutivos. Si un lado no tiene suficientes bordes se mantiene el original.
+    """
+    esquinas = np.asarray(esquinas, dtype=np.float32)
+    offs = np.arange(-radio, radio + 1, dtype=np.float32)
+    ts = np.linspace(0.1, 0.9, muestras, dtype=np.float32)
+    lineas = []
+    for i in range(4):
+        p, q = esquinas[i], esquinas[(i + 1) % 4]
+        d = q - p
+        largo = float(np.linalg.norm(d))
+        if largo < 1:
+            return esquinas
+        t = d / largo
+        normal = np.array([-t[1], t[0]], dtype=np.float32)
+        base = p + ts[:, None] * d
+        coords = base[:, None, :] + offs[None, :, None] * normal
+        perfil = cv2.remap(image, coords[..., 0], coords[..., 1], cv2.INTER_LINEAR, borderMode=cv2.BORDER_REPLICATE)
+        if perfil.ndim == 3:
+            perfil = perfil.mean(axis=2)
+        perfil = cv2.GaussianBlur(perfil.astype(np.float32), (5, 1), 0)
+        grad = np.abs(np.diff(perfil, axis=1))
+        k = grad.argmax(axis=1)
+        fila = np.arange(muestras)
+        g0 = grad[fila, np.clip(k - 1, 0, grad.shape[1] - 1)]
+        g1 = grad[fila, k]
+        g2 = grad[fila, np.clip(k + 1, 0, grad.shape[1] - 1)]
+        den = g0 - 2 * g1 + g2
+        sub = np.where(np.abs(den) > 1e-6, 0.5 * (g0 - g2) / np.where(den == 0, 1, den), 0)
+        pos = offs[0] + 0.5 + k + np.clip(sub, -0.5, 0.5)
+        fuertes = g1 > max(4.0, 0.5 * float(np.median(g1)))
+        if fuertes.sum() < 4:
+            lineas.append((t[0], t[1], p[0], p[1]))
+            continue
+        puntos = (base + pos[:, None] * normal)[fuertes]
+        lineas.append(tuple(cv2.fitLine(puntos, cv2.DIST_HUBER, 0, 0.01, 0.01).ravel()))
+
+    refinadas = esquinas.copy()
+    for i in range(4):
+        # la esquina i es la intersección del lado anterior (i-1 -> i) y el siguiente (i -> i+1)
+        punto = _interseccion(lineas[i - 1], lineas[i])
+        if punto is not None and np.linalg.norm(punto - esquinas[i]) <= 2 * radio:
+            refinadas[i] = punto
+    return refinadas
+
+
+def detectar_documento(image, niveles=NIVELES, confianza_minima=0.5, refinar=True):
+    """
+    Busca el documento en la imagen.
+
+    Args:
+        image (np.ndarray): imagen BGR o gris a resolución completa.
+        niveles (tuple): lados mayores de la pirámide, de menor a mayor.
+        confianza_minima (float): puntuación (0-1) para aceptar sin subir de nivel.
+        refinar (bool): refinar las esquinas a nivel subpíxel.
+
+    Returns:
+        dict: {"puntos": np.ndarray (4, 2) float32 (tl, tr, br, bl) en
+               coordenadas de la imagen original, "confianza": float}
+              o None si no se encuentra ningún candidato.
+    """
+    mejor = (0.0, None, 1.0)
+    for lado in niveles:
+        small, escala = reducir(image, lado)
+        gray = small if small.ndim == 2 else cv2.cvtColor(small, cv2.COLOR_BGR2GRAY)
+        puntuacion, quad = _puntuar(_candidatos(gray), gray.shape[0] * gray.shape[1])
+        if puntuacion > mejor[0]:
+            mejor = (puntuacion, quad, escala)
+        if mejor[0] >= confianza_minima or escala == 1.0:
+            break
+
+    puntuacion, quad, escala = mejor
+    if quad is None:
+        return None
+    puntos = quad / escala
+    if refinar:
+        puntos = refinar_esquinas(image, puntos, radio=max(4, int(round(5 / escala))))
+    return {"puntos": ordenar_esquinas(puntos), "confianza": float(puntuacion)}
@@ -1,12 +1,23 @@
 import streamlit as st
 import cv2
+import os
 import numpy as np
 from streamlit_image_coordinates import streamlit_image_coordinates
 from PIL import Image, ImageDraw
 
-def ejecutar_escanner_interactivo(modo="Manual", img_cv2_bgr=None):
+from src.utils.instrumentacion import etapa
+from src.utils.deteccion import detectar_documento
+from src.utils.perspectiva import MOTOR, POLITICA_RECORTE
+from src.utils.cache_resultados import huella_imagen
+from src.utils.sesion import borrar_imagen, copiar_imagen, guardar_imagen, imagen
+
+def ejecutar_escanner_interactivo(modo="Manual", img_cv2_bgr=None, deteccion=None, huella_original=None):
     """
     Maneja la interfaz de escaneo. 
+    En modo Auto usa 'deteccion' ({"puntos", "confianza"}, p.ej. la del
+    fotograma elegido de un vídeo) si se da, en lugar de volver a detectar.
+    'huella_original' identifica la imagen entre reruns: la detección y el
+    recorte solo se rehacen cuando cambian la imagen o las esquinas.
     Retorna: np.ndarray (BGR) si se confirma el escaneo, de lo contrario None.
     """
 
@@ -19,6 +30,9 @@ def ejecutar_escanner_interactivo(modo="Manual", img_cv2_bgr=None):
     # 2.2 Crear una versión pequeña solo para la interfaz de clics
     img_cv2_rgb = cv2.resize(cv2.cvtColor(img_cv2_bgr, cv2.COLOR_BGR2RGB), (WIDTH_DISPLAY, new_h))
 
+    if huella_original is None:
+        huella_original = huella_imagen(img_cv2_bgr)
+
     puntos_finales = None
 
     # --- LÓGICA DE SELECCIÓN ---
@@ -71,49 +85,34 @@ def ejecutar_escanner_interactivo(modo="Manual", img_cv2_bgr=None):
         puntos_finales = marco_imagen * ratio
                 
     else: # MODO AUTOMÁTICO
-        gray = cv2.cvtColor(img_cv2_rgb, cv2.COLOR_RGB2GRAY)
-        #edged = cv2.Canny(cv2.GaussianBlur(gray, (5, 5), 0), 50, 200)
-        edged = cv2.Canny(gray, 50, 200)
-        cnts, _ = cv2.findContours(edged, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
-        cnts = sorted(cnts, key=cv2.contourArea, reverse=False)[:1]
+        # la detección trabaja sobre la imagen original y devuelve sus coordenadas
+        if deteccion is None:
+            deteccion = detectar_memorizado(img_cv2_bgr, huella_original)
         
-        for c in cnts:
-            peri = cv2.arcLength(c, True)
-            approx = cv2.approxPolyDP(c, 0.02 * peri, True)
-            if len(approx) == 4:
-                puntos_finales = approx.reshape(4, 2).astype("float32")
-                st.success("¡Objeto detectado!")
-                # Dibujar preview del automático
-                img_auto_preview = img_cv2_rgb.copy()
-                cv2.drawContours(img_auto_preview, [approx], -1, (0, 255, 0), 10)
-                st.image(img_auto_preview, caption="Detección Automática")
-                # devolvemos los putnos finales escalados
-                puntos_finales = puntos_finales * ratio
+        if deteccion is not None:
+            puntos_finales = deteccion["puntos"]
+            st.success(f"¡Objeto detectado! (confianza {deteccion['confianza']:.0%})")
+            # Dibujar preview del automático
+            img_auto_preview = img_cv2_rgb.copy()
+            cv2.polylines(img_auto_preview, [np.round(puntos_finales / ratio).astype(np.int32)], True, (0, 255, 0), 4)
+            st.image(img_auto_preview, caption="Detección Automática")
         
         if puntos_finales is None:
             st.error("No se encontró un contorno claro. Usa el modo manual.")
 
     # --- PROCESAMIENTO Y RETORNO ---
     if puntos_finales is not None:
-        # Ordenar puntos (tl, tr, br, bl)
-        rect = np.zeros((4, 2), dtype="float32")
-        s = puntos_finales.sum(axis=1)
-        rect[0] = puntos_finales[np.argmin(s)]
-        rect[2] = puntos_finales[np.argmax(s)]
-        diff = np.diff(puntos_finales, axis=1)
-        rect[1] = puntos_finales[np.argmin(diff)]
-        rect[3] = puntos_finales[np.argmax(diff)]
-
-        (tl, tr, br, bl) = rect
-        w = int(max(np.linalg.norm(br - bl), np.linalg.norm(tr - tl)))
-        h = int(max(np.linalg.norm(tr - br), np.linalg.norm(tl - bl)))
-
-        dst = np.float32([[0, 0], [w-1, 0], [w-1, h-1], [0, h-1]])
-        M = cv2.getPerspectiveTransform(rect, dst)
-        
         # OJO: Aplicamos la transformación sobre la imagen BGR original de OpenCV
-        warped_bgr = cv2.warpPerspective(img_cv2_bgr, M, (w, h))
-        st.session_state['warped_bgr'] = warped_bgr
+        max_lado = int(os.getenv('MAX_LADO_SALIDA')) if os.getenv('MAX_LADO_SALIDA') else None
+        clave = (huella_original, np.asarray(puntos_finales, dtype=np.float32).tobytes(), POLITICA_RECORTE, max_lado)
+        warped_bgr = imagen('recorte') if st.session_state.get('recorte_clave') == clave else None
+        if warped_bgr is None:
+            with etapa('recorte', img_cv2_bgr) as e:
+                warped_bgr = recortar_perspectiva(img_cv2_bgr, puntos_finales, politica=POLITICA_RECORTE,
+                                                  max_lado=max_lado)
+                e.salida(warped_bgr)
+            guardar_imagen('recorte', warped_bgr)
+            st.session_state.recorte_clave = clave
         
         # Aplicar ajustes
         #resultado_bgr = cv2.convertScaleAbs(warped_bgr, alpha=contraste, beta=brillo)
@@ -125,10 +124,31 @@ def ejecutar_escanner_interactivo(modo="Manual", img_cv2_bgr=None):
             
     return None
 
+def detectar_memorizado(img_cv2_bgr, huella_original):
+    """
+    detectar_documento una sola vez por imagen: el resultado queda en
+    session_state junto a la huella de la imagen de la que sale.
+    """
+    guardada = st.session_state.get('deteccion_auto')
+    if guardada is None or guardada[0] != huella_original:
+        guardada = (huella_original, detectar_documento(img_cv2_bgr))
+        st.session_state.deteccion_auto = guardada
+    return guardada[1]
+
+def recortar_perspectiva(img_cv2_bgr, puntos_finales, politica='bordes', max_lado=None, interpolacion=cv2.INTER_LINEAR):
+    """
+    Corrige la perspectiva del cuadrilátero definido por 4 puntos (en
+    coordenadas de la imagen original), con el motor memoizado de
+    src/utils/perspectiva.py.
+
+    Retorna: np.ndarray (solo lectura) con el documento recortado y enderezado.
+    """
+    return MOTOR.recortar(img_cv2_bgr, puntos_finales, politica=politica, max_lado=max_lado, interpolacion=interpolacion)
+
 def activar_ejecutar():
     if st.session_state.confirm_scan:
         st.session_state.ejecutar_enabled = True
-        st.session_state['imagen_confirmada'] = st.session_state['warped_bgr'] # Devolvemos la imagen como la leería cv2
+        copiar_imagen('recorte', 'confirmada') # Devolvemos la imagen como la leería cv2
     else:
         st.session_state.ejecutar_enabled = False
-        del st.session_state['imagen_confirmada']
\ No newline at end of file
+        borrar_imagen('confirmada')
\ No newline at end of file
@@ -0,0 +1,45 @@
+"""
+Buffers de trabajo reutilizables entre llamadas.
+
+procesar_imagen(inplace=True) y los modos por lotes piden aquí sus arrays
+intermedios y de salida en lugar de reservarlos en cada llamada. Cada
+buffer se identifica por nombre y se conserva mientras se pida con la misma
+forma y tipo; si cambian, se sustituye (solo hay uno vivo por nombre).
+
+Los buffers son por hilo (threading.local): las sesiones de Streamlit y los
+hilos de descarga no comparten memoria de trabajo. Quien recibe un buffer
+solo puede usarlo hasta la siguiente petición del mismo nombre en el mismo
+hilo.
+"""
+import threading
+
+import numpy as np
+
+
+class EspacioTrabajo(threading.local):
+    """
+    Buffers con nombre, uno por hilo.
+    """
+
+    def __init__(self):
+        self._buffers = {}
+
+    def obtener(self, nombre, shape, dtype=np.uint8):
+        """
+        Devuelve el buffer 'nombre' con la forma y tipo pedidos (contenido sin inicializar).
+        """
+        shape, dtype = tuple(shape), np.dtype(dtype)
+        buf = self._buffers.get(nombre)
+        if buf is None or buf.shape != shape or buf.dtype != dtype:
+            buf = np.empty(shape, dtype=dtype)
+            self._buffers[nombre] = buf
+        return buf
+
+    def bytes(self):
+        return sum(b.nbytes for b in self._buffers.values())
+
+    def liberar(self):
+        self._buffers.clear()
+
+
+ESPACIO = EspacioTrabajo()
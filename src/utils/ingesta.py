@@ -0,0 +1,151 @@
+"""
+Ingesta de imágenes subidas: decodificación sin copias, reducida y orientada.
+
+- Los bytes comprimidos se pasan a cv2.imdecode como vista (memoryview /
+  np.frombuffer), sin bytearray ni np.asarray intermedios.
+- Solo se lee la cabecera (PIL, perezoso) para conocer el tamaño y la
+  orientación EXIF antes de decodificar.
+- Si la imagen es mucho mayor que el lado necesario, los JPEG se decodifican
+  directamente a 1/2, 1/4 o 1/8 con IMREAD_REDUCED_COLOR_*.
+- La orientación EXIF se aplica explícitamente con rotaciones/volteos baratos.
+"""
+import io
+import os
+
+import cv2
+import numpy as np
+from PIL import Image
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# lado mayor mínimo que debe conservar la imagen decodificada (el recorte
+# posterior necesita algo más de resolución que la tarjeta ID-1 a 300 ppp)
+LADO_INGESTA = int(os.getenv('LADO_INGESTA', '2000'))
+
+_REDUCIDOS = ((8, cv2.IMREAD_REDUCED_COLOR_8), (4, cv2.IMREAD_REDUCED_COLOR_4), (2, cv2.IMREAD_REDUCED_COLOR_2))
+_REDUCIDOS_GRIS = {cv2.IMREAD_REDUCED_COLOR_8: cv2.IMREAD_REDUCED_GRAYSCALE_8,
+                   cv2.IMREAD_REDUCED_COLOR_4: cv2.IMREAD_REDUCED_GRAYSCALE_4,
+                   cv2.IMREAD_REDUCED_COLOR_2: cv2.IMREAD_REDUCED_GRAYSCALE_2,
+                   cv2.IMREAD_COLOR: cv2.IMREAD_GRAYSCALE}
+
+EXIF_ORIENTACION = 0x0112
+
+
+def _como_buffer(origen):
+    """
+    Vista de solo lectura sobre los bytes comprimidos, sin copiarlos.
+    """
+    if hasattr(origen, 'getbuffer'):      # BytesIO / UploadedFile de Streamlit
+        return origen.getbuffer()
+    if isinstance(origen, (bytes, bytearray, memoryview)):
+        return memoryview(origen)
+    return memoryview(origen.read())
+
+
+class _LectorVista(io.RawIOBase):
+    """
+    Fichero de solo lectura sobre una vista de bytes, sin copiarla: PIL lee
+    de aquí solo los trozos de la cabecera que necesita.
+    """
+
+    def __init__(self, vista):
+        self._vista = vista.cast('B')
+        self._pos = 0
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def readinto(self, destino):
+        n = max(0, min(len(destino), len(self._vista) - self._pos))
+        destino[:n] = self._vista[self._pos:self._pos + n]
+        self._pos += n
+        return n
+
+    def seek(self, desplazamiento, desde=io.SEEK_SET):
+        base = {io.SEEK_SET: 0, io.SEEK_CUR: self._pos, io.SEEK_END: len(self._vista)}[desde]
+        self._pos = max(0, base + desplazamiento)
+        return self._pos
+
+    def tell(self):
+        return self._pos
+
+
+def leer_cabecera(buffer):
+    """
+    Devuelve (formato, (ancho, alto), orientación EXIF) leyendo solo la cabecera.
+    """
+    with Image.open(io.BufferedReader(_LectorVista(memoryview(buffer)))) as im:
+        try:
+            orientacion = im.getexif().get(EXIF_ORIENTACION, 1)
+        except Exception:
+            orientacion = 1
+        return im.format, im.size, orientacion
+
+
+def orientar(image, orientacion):
+    """
+    Aplica la orientación EXIF (1-8) a una imagen decodificada.
+    """
+    if orientacion == 5:
+        # trasposición (simetría respecto a la diagonal principal)
+        return cv2.transpose(image)
+    if orientacion == 7:
+        # trasposición respecto a la otra diagonal
+        return cv2.rotate(cv2.transpose(image), cv2.ROTATE_180)
+    if orientacion in (2, 4):
+        image = cv2.flip(image, 1)
+    if orientacion in (3, 4):
+        image = cv2.rotate(image, cv2.ROTATE_180)
+    elif orientacion == 6:
+        image = cv2.rotate(image, cv2.ROTATE_90_CLOCKWISE)
+    elif orientacion == 8:
+        image = cv2.rotate(image, cv2.ROTATE_90_COUNTERCLOCKWISE)
+    return image
+
+
+def factor_reduccion(size, lado_objetivo):
+    """
+    Mayor factor (8, 4, 2) con el que el lado mayor sigue siendo >= lado_objetivo.
+    """
+    lado = max(size)
+    for factor, flag in _REDUCIDOS:
+        if lado / factor >= lado_objetivo:
+            return factor, flag
+    return 1, cv2.IMREAD_COLOR
+
+
+def decodificar_subida(origen, lado_objetivo=LADO_INGESTA, gris=False):
+    """
+    Decodifica una imagen subida (UploadedFile, BytesIO o bytes) a BGR, o a
+    gris (un canal) con gris=True: el JPEG se decodifica directamente a
+    luminancia, sin reconstruir ni convertir los tres canales.
+
+    Args:
+        origen: fichero subido o bytes con la imagen comprimida.
+        lado_objetivo (int): lado mayor mínimo que debe conservar la imagen.
+                             None para decodificar siempre a tamaño completo.
+        gris (bool): decodificar a un solo canal.
+
+    Returns:
+        np.ndarray: imagen BGR (o gris) orientada, o None si no se puede decodificar.
+    """
+    buffer = _como_buffer(origen)
+    try:
+        formato, size, orientacion = leer_cabecera(buffer)
+    except Exception:
+        formato, size, orientacion = None, None, 1
+
+    flag = cv2.IMREAD_COLOR
+    if lado_objetivo and formato == 'JPEG' and size is not None:
+        _, flag = factor_reduccion(size, lado_objetivo)
+    if gris:
+        flag = _REDUCIDOS_GRIS[flag]
+
+    image = cv2.imdecode(np.frombuffer(buffer, dtype=np.uint8), flag | cv2.IMREAD_IGNORE_ORIENTATION)
+    if image is None:
+        return None
+    return orientar(image, orientacion)
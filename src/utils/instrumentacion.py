@@ -0,0 +1,225 @@
+"""
+Instrumentación opcional por etapas (tiempo, memoria reservada y shape).
+
+Uso:
+    with sesion_medicion() as medidor:
+        with etapa('resize', image) as e:
+            image = cv2.resize(image, size)
+            e.salida(image)
+    medidor.registros   # [{'etapa': 'resize', 'ms': ..., 'bytes': ..., ...}]
+
+Fuera de una sesion_medicion, etapa() devuelve un objeto nulo compartido:
+el coste es una consulta a un ContextVar por etapa, sin reloj ni tracemalloc.
+Las sesiones se guardan en un ContextVar, así que cada sesión de Streamlit
+(un hilo por script run) mide solo lo suyo.
+"""
+import json
+import logging
+import threading
+import time
+import tracemalloc
+from contextlib import contextmanager
+from contextvars import ContextVar
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+logger = logging.getLogger("dni.instrumentacion")
+
+_medidor_actual = ContextVar("medidor_actual", default=None)
+
+# tracemalloc es global al proceso: se arranca con la primera sesión que mide
+# memoria y se para con la última
+_tracemalloc_lock = threading.Lock()
+_tracemalloc_usuarios = 0
+
+
+class _EtapaNula:
+    """
+    Etapa que no mide nada (instrumentación desactivada).
+    """
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def salida(self, image):
+        pass
+
+
+_ETAPA_NULA = _EtapaNula()
+
+
+class _Etapa:
+    __slots__ = ("medidor", "nombre", "shape_entrada", "shape_salida", "t0", "mem0")
+
+    def __init__(self, medidor, nombre, image):
+        self.medidor = medidor
+        self.nombre = nombre
+        self.shape_entrada = tuple(image.shape) if image is not None else None
+        self.shape_salida = None
+
+    def __enter__(self):
+        if self.medidor.memoria:
+            tracemalloc.reset_peak()
+            self.mem0 = tracemalloc.get_traced_memory()[0]
+        self.t0 = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        ms = (time.perf_counter() - self.t0) * 1000
+        reservado = None
+        if self.medidor.memoria:
+            reservado = tracemalloc.get_traced_memory()[1] - self.mem0
+        self.medidor.registrar({
+            "etapa": self.nombre,
+            "ms": ms,
+            "bytes": reservado,
+            "shape_entrada": self.shape_entrada,
+            "shape_salida": self.shape_salida,
+            "error": exc_type.__name__ if exc_type else None,
+        })
+        return False
+
+    def salida(self, image):
+        self.shape_salida = tuple(image.shape) if image is not None else None
+
+
+class Medidor:
+    """
+    Acumula los registros de una ejecución instrumentada.
+
+    Args:
+        memoria (bool): medir bytes reservados con tracemalloc (más lento).
+        log (bool): emitir cada registro como log estructurado (JSON).
+    """
+
+    def __init__(self, memoria=True, log=False):
+        self.memoria = memoria
+        self.log = log
+        self.registros = []
+
+    def registrar(self, registro):
+        self.registros.append(registro)
+        AGREGADO.acumular(registro)
+        if self.log:
+            logger.info(json.dumps(registro))
+
+    def total_ms(self):
+        return sum(r["ms"] for r in self.registros)
+
+
+class Agregado:
+    """
+    Contadores acumulados por etapa entre ejecuciones (para Prometheus).
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._etapas = {}
+
+    def acumular(self, registro):
+        with self._lock:
+            e = self._etapas.setdefault(registro["etapa"], {"n": 0, "segundos": 0.0, "bytes": 0, "errores": 0})
+            e["n"] += 1
+            e["segundos"] += registro["ms"] / 1000
+            e["bytes"] += registro["bytes"] or 0
+            e["errores"] += 1 if registro["error"] else 0
+
+    def a_prometheus(self):
+        """
+        Formato de texto de exposición de Prometheus.
+        """
+        with self._lock:
+            etapas = {k: dict(v) for k, v in self._etapas.items()}
+        lineas = [
+            "# HELP dni_etapa_segundos_total Tiempo acumulado por etapa.",
+            "# TYPE dni_etapa_segundos_total counter",
+        ]
+        lineas += [f'dni_etapa_segundos_total{{etapa="{k}"}} {v["segundos"]:.6f}' for k, v in etapas.items()]
+        lineas += ["# HELP dni_etapa_ejecuciones_total Número de ejecuciones por etapa.",
+                   "# TYPE dni_etapa_ejecuciones_total counter"]
+        lineas += [f'dni_etapa_ejecuciones_total{{etapa="{k}"}} {v["n"]}' for k, v in etapas.items()]
+        lineas += ["# HELP dni_etapa_bytes_total Bytes reservados acumulados por etapa.",
+                   "# TYPE dni_etapa_bytes_total counter"]
+        lineas += [f'dni_etapa_bytes_total{{etapa="{k}"}} {v["bytes"]}' for k, v in etapas.items()]
+        lineas += ["# HELP dni_etapa_errores_total Errores por etapa.",
+                   "# TYPE dni_etapa_errores_total counter"]
+        lineas += [f'dni_etapa_errores_total{{etapa="{k}"}} {v["errores"]}' for k, v in etapas.items()]
+        return "\n".join(lineas) + "\n"
+
+
+AGREGADO = Agregado()
+
+
+def etapa(nombre, image=None):
+    """
+    Context manager que mide una etapa si hay una sesion_medicion activa.
+    """
+    medidor = _medidor_actual.get()
+    if medidor is None:
+        return _ETAPA_NULA
+    return _Etapa(medidor, nombre, image)
+
+
+@contextmanager
+def sesion_medicion(memoria=True, log=False, medidor=None):
+    """
+    Activa la instrumentación en el contexto actual.
+
+    Args:
+        memoria (bool): medir bytes reservados (activa tracemalloc si no lo estaba).
+        log (bool): emitir logs estructurados por etapa.
+        medidor (Medidor): continuar acumulando en un medidor existente.
+
+    Yields:
+        Medidor: con los registros de las etapas ejecutadas.
+    """
+    global _tracemalloc_usuarios
+    medidor = medidor or Medidor(memoria=memoria, log=log)
+    if medidor.memoria:
+        with _tracemalloc_lock:
+            _tracemalloc_usuarios += 1
+            if not tracemalloc.is_tracing():
+                tracemalloc.start()
+    token = _medidor_actual.set(medidor)
+    try:
+        yield medidor
+    finally:
+        _medidor_actual.reset(token)
+        if medidor.memoria:
+            with _tracemalloc_lock:
+                _tracemalloc_usuarios -= 1
+                if _tracemalloc_usuarios == 0:
+                    tracemalloc.stop()
+
+
+def servir_prometheus(puerto=9108, host="127.0.0.1", extra=()):
+    """
+    Arranca en un hilo daemon un endpoint /metrics con los contadores agregados.
+
+    Args:
+        extra (iterable): otros objetos con a_prometheus() que añadir (cachés).
+
+    Returns:
+        ThreadingHTTPServer: el servidor (llamar a shutdown() para pararlo).
+    """
+    class _Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path != "/metrics":
+                self.send_error(404)
+                return
+            cuerpo = "".join(o.a_prometheus() for o in (AGREGADO, *extra)).encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4")
+            self.send_header("Content-Length", str(len(cuerpo)))
+            self.end_headers()
+            self.wfile.write(cuerpo)
+
+        def log_message(self, *args):
+            pass
+
+    servidor = ThreadingHTTPServer((host, puerto), _Handler)
+    threading.Thread(target=servidor.serve_forever, daemon=True).start()
+    return servidor
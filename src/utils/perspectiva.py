@@ -0,0 +1,160 @@
+"""
+Motor de corrección de perspectiva reutilizable.
+
+- Memoiza la homografía y el resultado por (imagen, esquinas, tamaño,
+  interpolación): un rerun de Streamlit con los mismos 4 puntos no vuelve a
+  calcular getPerspectiveTransform ni warpPerspective.
+- El tamaño de salida lo fija una política: 'bordes' (longitud de los lados,
+  comportamiento original), 'id1' (proporción ID-1 con el ancho medido) o un
+  tamaño fijo (w, h), p.ej. 1011x638 para un DNI a 300 ppp.
+- Con 'max_lado' el recorte y el redimensionado posterior se hacen en un
+  único warp, así la imagen solo se remuestrea una vez.
+- Los recortes memoizados están fuera del almacén de imágenes de las
+  sesiones, así que su memoria se limita aparte (PERSPECTIVA_MB, 64 MB por
+  defecto, además de 'max_entradas').
+"""
+import os
+import threading
+import weakref
+from collections import OrderedDict
+
+import cv2
+import numpy as np
+from dotenv import load_dotenv
+
+from src.utils.deteccion import PROPORCION_ID1, ordenar_esquinas
+
+load_dotenv()
+
+MB = 1024 * 1024
+TAMANO_DNI_300PPP = (1011, 638)
+
+INTERPOLACIONES = {
+    'nearest': cv2.INTER_NEAREST,
+    'linear': cv2.INTER_LINEAR,
+    'cubic': cv2.INTER_CUBIC,
+    'lanczos': cv2.INTER_LANCZOS4,
+}
+
+
+def leer_politica(texto):
+    """
+    Convierte 'bordes', 'id1' o 'ANCHOxALTO' (p.ej. de una variable de entorno) en política.
+    """
+    texto = (texto or 'bordes').strip().lower()
+    if texto in ('bordes', 'id1'):
+        return texto
+    w, h = texto.split('x')
+    return (int(w), int(h))
+
+
+def tamano_salida(rect, politica='bordes', max_lado=None):
+    """
+    Tamaño (w, h) del recorte según la política.
+
+    Args:
+        rect (np.ndarray): esquinas ordenadas (tl, tr, br, bl).
+        politica: 'bordes', 'id1' o (w, h) fijo. Con 'id1' y con un tamaño
+                  fijo la orientación (apaisada o vertical) sigue a los lados medidos.
+        max_lado (int): limitar el lado mayor del resultado.
+    """
+    (tl, tr, br, bl) = rect
+    w = max(np.linalg.norm(br - bl), np.linalg.norm(tr - tl))
+    h = max(np.linalg.norm(tr - br), np.linalg.norm(tl - bl))
+    vertical = h > w
+
+    if politica == 'id1':
+        largo = max(w, h)
+        w, h = largo, largo / PROPORCION_ID1
+        if vertical:
+            w, h = h, w
+    elif isinstance(politica, (tuple, list)):
+        w, h = sorted(politica, reverse=True)
+        if vertical:
+            w, h = h, w
+
+    if max_lado and max(w, h) > max_lado:
+        f = max_lado / max(w, h)
+        w, h = w * f, h * f
+    return max(1, int(w)), max(1, int(h))
+
+
+class MotorPerspectiva:
+    """
+    Recorta y endereza cuadriláteros con memoización de los últimos resultados.
+
+    Args:
+        max_entradas (int): número de resultados memoizados (LRU).
+        max_bytes (int): bytes máximos de los resultados memoizados; un
+                         recorte mayor se devuelve sin guardarlo.
+    """
+
+    def __init__(self, max_entradas=8, max_bytes=64 * MB):
+        self.max_entradas = max_entradas
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._memo = OrderedDict()
+        self._bytes = 0
+
+    def homografia(self, puntos, politica='bordes', max_lado=None):
+        """
+        Returns:
+            tuple: (M, (w, h)) para llevar el cuadrilátero a un rectángulo de salida.
+        """
+        rect = ordenar_esquinas(puntos)
+        w, h = tamano_salida(rect, politica, max_lado)
+        dst = np.float32([[0, 0], [w-1, 0], [w-1, h-1], [0, h-1]])
+        return cv2.getPerspectiveTransform(rect, dst), (w, h)
+
+    def recortar(self, image, puntos, politica='bordes', max_lado=None, interpolacion=cv2.INTER_LINEAR):
+        """
+        Recorte enderezado de 'image' definido por 4 puntos (en sus coordenadas).
+
+        El resultado se comparte entre llamadas con la misma clave: no
+        modificarlo en el sitio.
+        """
+        if isinstance(interpolacion, str):
+            interpolacion = INTERPOLACIONES[interpolacion]
+        puntos = np.asarray(puntos, dtype="float32").reshape(4, 2)
+        politica = tuple(politica) if isinstance(politica, list) else politica
+        clave = (id(image), image.shape, np.round(puntos, 2).tobytes(), politica, max_lado, interpolacion)
+
+        with self._lock:
+            entrada = self._memo.get(clave)
+            if entrada is not None and entrada[0]() is image:
+                self._memo.move_to_end(clave)
+                return entrada[1]
+
+        M, size = self.homografia(puntos, politica, max_lado)
+        warped = cv2.warpPerspective(image, M, size, flags=interpolacion)
+        warped.flags.writeable = False
+
+        if warped.nbytes > self.max_bytes:
+            return warped
+        with self._lock:
+            anterior = self._memo.pop(clave, None)
+            if anterior is not None:
+                self._bytes -= anterior[1].nbytes
+            self._memo[clave] = (weakref.ref(image), warped)
+            self._bytes += warped.nbytes
+            while len(self._memo) > self.max_entradas or self._bytes > self.max_bytes:
+                self._bytes -= self._memo.popitem(last=False)[1][1].nbytes
+        return warped
+
+    def uso(self):
+        """
+        Returns:
+            dict: {"entradas": int, "bytes": int, "max_bytes": int}
+        """
+        with self._lock:
+            return {"entradas": len(self._memo), "bytes": self._bytes, "max_bytes": self.max_bytes}
+
+    def limpiar(self):
+        with self._lock:
+            self._memo.clear()
+            self._bytes = 0
+
+
+MOTOR = MotorPerspectiva(max_bytes=int(os.getenv('PERSPECTIVA_MB', '64')) * MB)
+
+POLITICA_RECORTE = leer_politica(os.getenv('TAMANO_RECORTE'))
@@ -0,0 +1,485 @@
+"""
+Registro de plantillas compiladas.
+
+Formato actual (versión 2), con coordenadas normalizadas 0-1:
+
+    {"version": 2, "size": [w, h], "cara": "anverso",
+     "regiones": [{"nombre": "zona_1", "forma": "rectangulo", "puntos": [[x1, y1], [x2, y2]],
+                   "modo": "desenfoque", "fuerza": 15.5},
+                  {"nombre": "zona_2", "forma": "poligono", "puntos": [[x, y], ...],
+                   "modo": "solido", "color": [0, 0, 0]}]}
+
+Cada región tiene nombre único, forma ("rectangulo" con dos esquinas o
+"poligono" con 3 o más vértices) y, opcionalmente, su propio modo
+("desenfoque", "solido" o "pixelado"), fuerza (sigma en px al tamaño 'size')
+y color BGR del modo sólido. Sin modo se usa el elegido en la barra lateral.
+'size' solo fija la proporción y la escala de la fuerza y la marca de agua.
+
+El formato 1 ({"size": [w, h], "rectangles": [[p1, p2], ...]}, en píxeles o
+con "normalized": true) se sigue aceptando y se migra al cargarlo; para
+reescribir los ficheros:
+
+    python -m src.utils.plantillas migrar [carpeta]
+
+Al compilar, las regiones se guardan en un array estructurado (REGION) y sus
+vértices en un único array (n, 2), de modo que escalarlas a un tamaño es una
+sola operación de numpy y el compositor (redaccion.redactar_regiones) las
+aplica todas de una vez por modo.
+
+Carga, valida y compila una sola vez todas las plantillas de
+TEMPLATES_FOLDER; los polígonos escalados a cada tamaño de salida se guardan
+en la plantilla (Plantilla.poligonos). En cada consulta solo se vuelve a
+leer el JSON de los ficheros cuyo mtime ha cambiado (y se quitan los
+borrados). Las plantillas no válidas se registran en el log
+"dni.plantillas" y quedan en RegistroPlantillas.errores.
+
+Una plantilla puede tener una imagen de referencia junto al JSON
+(<nombre>.referencia.png o .jpg) para alinear los rectángulos con cada
+tarjeta (src/utils/alineacion.py); cambiarla también recompila la plantilla.
+"""
+import argparse
+import hashlib
+import json
+import logging
+import math
+import os
+import shutil
+import sys
+import threading
+import time
+from pathlib import Path
+
+import numpy as np
+from dotenv import load_dotenv
+
+from src.utils.redaccion import normalizar_rectangulos
+
+load_dotenv()
+
+logger = logging.getLogger("dni.plantillas")
+
+# máximo de tamaños escalados que se guardan por plantilla (cada foto puede traer el suyo)
+MAX_ESCALADOS = 64
+EXTENSIONES_REFERENCIA = ('.png', '.jpg', '.jpeg')
+
+VERSION_PLANTILLA = 2
+FORMAS = ("rectangulo", "poligono")
+MODOS_REGION = ("desenfoque", "solido", "pixelado")
+MAX_NOMBRE_REGION = 32
+DECIMALES = 6      # de las coordenadas migradas: 1e-6 es menos de un píxel incluso a 12 MP
+
+# región compilada; los vértices de la región i son vertices[inicio:fin]
+REGION = np.dtype([
+    ("nombre", f"U{MAX_NOMBRE_REGION}"),
+    ("forma", "u1"),        # índice en FORMAS
+    ("modo", "u1"),         # 0 = el de la barra lateral, i + 1 = MODOS_REGION[i]
+    ("fuerza", "f4"),       # sigma en px al tamaño de la plantilla, NaN = la del modo
+    ("color", "u1", 3),     # BGR del modo sólido
+    ("caja", "f4", 4),      # x1, y1, x2, y2 envolventes, normalizados
+    ("inicio", "u4"),
+    ("fin", "u4"),
+])
+
+
+def buscar_referencia(carpeta, nombre):
+    """
+    Imagen de referencia de una plantilla, si existe.
+
+    Returns:
+        tuple: (ruta, mtime_ns), o None.
+    """
+    for extension in EXTENSIONES_REFERENCIA:
+        ruta = os.path.join(carpeta, f"{Path(nombre).stem}.referencia{extension}")
+        try:
+            return ruta, os.stat(ruta).st_mtime_ns
+        except OSError:
+            continue
+    return None
+
+
+CARAS = ("anverso", "reverso")
+
+
+def validar_plantilla(datos):
+    """
+    Comprueba el formato 2 ({"version": 2, "size": [w, h], "regiones": [...]})
+    o el 1 ({"size": [w, h], "rectangles": [[p1, p2], ...]}, con
+    "normalized": true si las coordenadas están entre 0 y 1), ambos con
+    "cara" opcional ("anverso" o "reverso") para la clasificación automática.
+
+    Raises:
+        ValueError: si la plantilla no es válida.
+    """
+    if not isinstance(datos, dict):
+        raise ValueError("la plantilla debe ser un objeto JSON")
+    size = datos.get("size")
+    if (not isinstance(size, (list, tuple)) or len(size) != 2
+            or not all(isinstance(v, int) and v > 0 for v in size)):
+        raise ValueError(f"'size' debe ser [ancho, alto] positivos, no {size!r}")
+    if datos.get("cara") not in (None,) + CARAS:
+        raise ValueError(f"'cara' debe ser una de {CARAS}, no {datos['cara']!r}")
+    version = datos.get("version", 1)
+    if version == VERSION_PLANTILLA:
+        _validar_regiones(datos.get("regiones"))
+        return
+    if version != 1:
+        raise ValueError(f"versión de plantilla desconocida: {version!r}")
+    rectangles = datos.get("rectangles")
+    if not isinstance(rectangles, list):
+        raise ValueError("'rectangles' debe ser una lista")
+    for i, r in enumerate(rectangles):
+        if (not isinstance(r, (list, tuple)) or len(r) != 2
+                or not all(isinstance(p, (list, tuple)) and len(p) == 2
+                           and all(isinstance(v, (int, float)) for v in p) for p in r)):
+            raise ValueError(f"el rectángulo {i} debe ser [[x1, y1], [x2, y2]], no {r!r}")
+        if datos.get("normalized") and not all(0 <= v <= 1 for p in r for v in p):
+            raise ValueError(f"el rectángulo {i} tiene coordenadas fuera de [0, 1]: {r!r}")
+
+
+def _validar_regiones(regiones):
+    if not isinstance(regiones, list):
+        raise ValueError("'regiones' debe ser una lista")
+    nombres = set()
+    for i, region in enumerate(regiones):
+        if not isinstance(region, dict):
+            raise ValueError(f"la región {i} debe ser un objeto")
+        nombre = region.get("nombre")
+        if not isinstance(nombre, str) or not 0 < len(nombre) <= MAX_NOMBRE_REGION:
+            raise ValueError(f"la región {i} necesita un 'nombre' de 1 a {MAX_NOMBRE_REGION} caracteres")
+        if nombre in nombres:
+            raise ValueError(f"región repetida: {nombre!r}")
+        nombres.add(nombre)
+        forma = region.get("forma")
+        if forma not in FORMAS:
+            raise ValueError(f"'forma' de {nombre!r} debe ser una de {FORMAS}, no {forma!r}")
+        puntos = region.get("puntos")
+        if (not isinstance(puntos, list)
+                or not all(isinstance(p, (list, tuple)) and len(p) == 2
+                           and all(isinstance(v, (int, float)) and 0 <= v <= 1 for v in p) for p in puntos)):
+            raise ValueError(f"'puntos' de {nombre!r} debe ser una lista de [x, y] entre 0 y 1")
+        if forma == "rectangulo":
+            if len(puntos) != 2 or puntos[0][0] == puntos[1][0] or puntos[0][1] == puntos[1][1]:
+                raise ValueError(f"el rectángulo {nombre!r} necesita dos esquinas opuestas distintas")
+        elif len(puntos) < 3:
+            raise ValueError(f"el polígono {nombre!r} necesita al menos 3 vértices")
+        modo = region.get("modo")
+        if modo not in (None,) + MODOS_REGION:
+            raise ValueError(f"'modo' de {nombre!r} debe ser uno de {MODOS_REGION}, no {modo!r}")
+        fuerza = region.get("fuerza")
+        if fuerza is not None and (not isinstance(fuerza, (int, float)) or not 0 < fuerza < math.inf):
+            raise ValueError(f"'fuerza' de {nombre!r} debe ser un número positivo, no {fuerza!r}")
+        color = region.get("color")
+        if color is not None and (not isinstance(color, (list, tuple)) or len(color) != 3
+                                  or not all(isinstance(v, int) and 0 <= v <= 255 for v in color)):
+            raise ValueError(f"'color' de {nombre!r} debe ser [B, G, R] entre 0 y 255, no {color!r}")
+
+
+def normalizar_plantilla(datos):
+    """
+    Convierte una plantilla del formato 1 en píxeles a coordenadas
+    normalizadas (0-1), con las esquinas ordenadas y recortadas. 'size' se
+    conserva como referencia de proporción y de escala de la marca de agua.
+    """
+    if datos.get("normalized"):
+        return dict(datos)
+    w, h = datos["size"]
+    rects = normalizar_rectangulos(datos["rectangles"], (h, w))
+    normalizada = {
+        "size": list(datos["size"]),
+        "normalized": True,
+        "rectangles": [[[x1 / w, y1 / h], [x2 / w, y2 / h]] for x1, y1, x2, y2 in rects],
+    }
+    if datos.get("cara"):
+        normalizada["cara"] = datos["cara"]
+    return normalizada
+
+
+def migrar_plantilla(datos):
+    """
+    Plantilla en formato 2. Las del formato 1 se normalizan y cada rectángulo
+    pasa a ser una región "zona_<n>" sin modo propio (usa el de la barra
+    lateral), así que se redactan igual que antes.
+    """
+    if datos.get("version", 1) == VERSION_PLANTILLA:
+        return dict(datos)
+    normalizada = normalizar_plantilla(datos)
+    regiones = []
+    for (ax, ay), (bx, by) in normalizada["rectangles"]:
+        x1, y1, x2, y2 = min(ax, bx), min(ay, by), max(ax, bx), max(ay, by)
+        if x2 > x1 and y2 > y1:
+            regiones.append({"nombre": f"zona_{len(regiones) + 1}", "forma": "rectangulo",
+                             "puntos": [[round(v, DECIMALES) for v in p] for p in ((x1, y1), (x2, y2))]})
+    migrada = {"version": VERSION_PLANTILLA, "size": list(datos["size"])}
+    if datos.get("cara"):
+        migrada["cara"] = datos["cara"]
+    migrada["regiones"] = regiones
+    return migrada
+
+
+def compilar_regiones(datos):
+    """
+    Compila las regiones de una plantilla del formato 2.
+
+    Returns:
+        tuple: (regiones, vertices): array estructurado REGION y array
+        float32 (n, 2) con los vértices normalizados de todas las regiones
+        (los rectángulos se expanden a sus 4 esquinas).
+    """
+    filas, vertices = [], []
+    for region in datos["regiones"]:
+        puntos = region["puntos"]
+        xs, ys = [p[0] for p in puntos], [p[1] for p in puntos]
+        caja = (min(xs), min(ys), max(xs), max(ys))
+        if region["forma"] == "rectangulo":
+            x1, y1, x2, y2 = caja
+            puntos = [(x1, y1), (x2, y1), (x2, y2), (x1, y2)]
+        modo = region.get("modo")
+        filas.append((region["nombre"], FORMAS.index(region["forma"]),
+                      0 if modo is None else MODOS_REGION.index(modo) + 1,
+                      region.get("fuerza") or np.nan, region.get("color") or (0, 0, 0),
+                      caja, len(vertices), len(vertices) + len(puntos)))
+        vertices.extend(puntos)
+    # una sola conversión a arrays para todas las regiones
+    regiones = np.array(filas, dtype=REGION)
+    vertices = np.array(vertices, dtype=np.float32).reshape(-1, 2)
+    return regiones, vertices
+
+
+class Plantilla(dict):
+    """
+    Plantilla compilada. Es un dict con las claves de la plantilla en formato
+    2 ('version', 'size', 'regiones' y 'cara' si la tiene), así que se puede
+    pasar tal cual a procesar_imagen, y además guarda las regiones compiladas
+    y sus polígonos escalados a cada tamaño.
+
+    Atributos:
+        nombre (str): nombre de la plantilla (fichero sin extensión).
+        regiones (np.ndarray): array estructurado REGION, una fila por región.
+        vertices (np.ndarray): (n, 2) float32, vértices normalizados de todas las regiones.
+        huella (str): hash de la geometría (vértices y regiones), clave de las máscaras precalculadas.
+        referencia (tuple): (ruta, mtime_ns) de la imagen de referencia, o None.
+    """
+
+    def __init__(self, nombre, datos, referencia=None):
+        super().__init__(migrar_plantilla(datos))
+        self.nombre = nombre
+        self.referencia = referencia
+        self.regiones, self.vertices = compilar_regiones(self)
+        # identifica la geometría (para reutilizar las máscaras del compositor)
+        self.huella = hashlib.blake2b(self.vertices.tobytes() + self.regiones["fin"].tobytes(), digest_size=16).hexdigest()
+        self._poligonos = {}
+
+    def poligonos(self, size, H=None):
+        """
+        Vértices de cada región en píxeles para una imagen de tamaño (w, h).
+
+        Args:
+            size (tuple): (w, h) de la imagen.
+            H (np.ndarray): homografía 3x3 de coordenadas normalizadas a
+                            píxeles (alineacion.homografia). Sin ella se escala
+                            a 'size' y el resultado se guarda.
+
+        Returns:
+            list: un array int32 (k, 2) por región, en el orden de 'regiones'.
+        """
+        size = tuple(int(v) for v in size)
+        if H is None:
+            poligonos = self._poligonos.get(size)
+            if poligonos is not None:
+                return poligonos
+            puntos = self.vertices * np.float32(size)
+        else:
+            homogeneos = self.vertices.astype(np.float64) @ H[:, :2].T + H[:, 2]
+            puntos = homogeneos[:, :2] / homogeneos[:, 2:]
+        # todas las regiones en una sola operación; después se parten por región
+        poligonos = (np.split(np.round(puntos).astype(np.int32), self.regiones["fin"][:-1].astype(np.intp))
+                     if len(self.regiones) else [])
+        if H is None:
+            if len(self._poligonos) >= MAX_ESCALADOS:
+                self._poligonos.clear()
+            self._poligonos[size] = poligonos
+        return poligonos
+
+    def efectos(self, heredado, escala, fuerza):
+        """
+        Efecto que se aplica a cada región.
+
+        Args:
+            heredado (tuple): (modo, fuerza_px, color) elegido en la barra
+                              lateral para las regiones sin modo propio, o
+                              None si esas regiones no se redactan.
+            escala (float): ancho de la imagen / ancho de la plantilla.
+            fuerza (float): sigma en px de las regiones con modo propio y sin fuerza.
+
+        Returns:
+            list: (modo, fuerza_px, color) o None por región, con modo de MODOS_REGION.
+        """
+        efectos = []
+        for modo, fuerza_region, color in zip(self.regiones["modo"].tolist(), self.regiones["fuerza"].tolist(),
+                                              self.regiones["color"].tolist()):
+            if modo == 0:
+                efectos.append(heredado)
+            elif MODOS_REGION[modo - 1] == "solido":
+                efectos.append(("solido", 0.0, tuple(color)))
+            else:
+                efectos.append((MODOS_REGION[modo - 1],
+                                fuerza if math.isnan(fuerza_region) else fuerza_region * escala, None))
+        return efectos
+
+
+def compilar_plantilla(template, nombre='NUEVO'):
+    """
+    Devuelve la plantilla compilada (sin recompilar si ya lo está).
+    """
+    if isinstance(template, Plantilla):
+        return template
+    validar_plantilla(template)
+    return Plantilla(nombre, template)
+
+
+class RegistroPlantillas:
+    """
+    Plantillas de una carpeta, compiladas y recargadas según su mtime.
+
+    Args:
+        carpeta (str): carpeta con los JSON (por defecto TEMPLATES_FOLDER).
+        intervalo (float): segundos durante los que se da por buena la última
+                           lectura de la carpeta (0: se comprueba en cada consulta).
+
+    Atributos:
+        errores (dict): {nombre: motivo} de las plantillas no válidas.
+    """
+
+    def __init__(self, carpeta=None, intervalo=0.0):
+        self.carpeta = carpeta or os.getenv('TEMPLATES_FOLDER')
+        self.intervalo = intervalo
+        self._lock = threading.Lock()
+        self._plantillas = {}
+        self._mtimes = {}
+        self._leida = None
+        self.errores = {}
+
+    def recargar(self):
+        """
+        Relee solo los ficheros nuevos o modificados y quita los borrados.
+        """
+        with self._lock:
+            ahora = time.monotonic()
+            if self._leida is not None and ahora - self._leida < self.intervalo:
+                return
+            vistos = {}
+            try:
+                if self.carpeta and os.path.isdir(self.carpeta):
+                    with os.scandir(self.carpeta) as it:
+                        for entrada in it:
+                            if entrada.is_file() and entrada.name.endswith('.json'):
+                                nombre = Path(entrada.name).stem
+                                vistos[nombre] = (entrada.path, entrada.stat().st_mtime_ns,
+                                                  buscar_referencia(self.carpeta, nombre))
+            except OSError as e:
+                # un fallo pasajero no borra las plantillas ya cargadas
+                logger.warning("No se pudo leer %s: %s", self.carpeta, e)
+                return
+            self._leida = ahora
+
+            for nombre in list(self._mtimes):
+                if nombre not in vistos:
+                    self._mtimes.pop(nombre)
+                    self._plantillas.pop(nombre, None)
+                    self.errores.pop(nombre, None)
+
+            for nombre, (ruta, mtime, referencia) in vistos.items():
+                if self._mtimes.get(nombre) == (mtime, referencia):
+                    continue
+                self._mtimes[nombre] = (mtime, referencia)
+                try:
+                    with open(ruta, 'r') as file:
+                        datos = json.load(file)
+                    validar_plantilla(datos)
+                    self._plantillas[nombre] = Plantilla(nombre, datos, referencia=referencia)
+                    self.errores.pop(nombre, None)
+                except (OSError, ValueError) as e:
+                    self._plantillas.pop(nombre, None)
+                    self.errores[nombre] = str(e)
+                    logger.warning("Plantilla %s no válida: %s", nombre, e)
+
+    def nombres(self):
+        self.recargar()
+        return sorted(self._plantillas)
+
+    def obtener(self, nombre):
+        """
+        Returns:
+            Plantilla: la plantilla compilada, o None si no existe o no es válida.
+        """
+        self.recargar()
+        return self._plantillas.get(Path(nombre).stem)
+
+    def version(self, nombre=None):
+        """
+        mtime del JSON y de la imagen de referencia de una plantilla (o de
+        todas, sin 'nombre'): cambia al editar cualquiera de los dos, así que
+        sirve de clave para invalidar resultados cacheados.
+
+        Returns:
+            tuple: (mtime_ns, referencia), o None si la plantilla no existe;
+                   sin 'nombre', un dict {nombre: version}.
+        """
+        self.recargar()
+        with self._lock:
+            if nombre is None:
+                return dict(sorted(self._mtimes.items()))
+            return self._mtimes.get(Path(nombre).stem)
+
+
+def volcar_plantilla(datos):
+    """
+    JSON de una plantilla del formato 2 con una región por línea.
+    """
+    cabecera = {k: v for k, v in datos.items() if k != "regiones"}
+    lineas = [f"  {json.dumps(k)}: {json.dumps(v, ensure_ascii=False)}," for k, v in cabecera.items()]
+    regiones = ",\n".join(f"    {json.dumps(r, ensure_ascii=False)}" for r in datos["regiones"])
+    return "{\n" + "\n".join(lineas) + f'\n  "regiones": [\n{regiones}\n  ]\n}}\n'
+
+
+def migrar_carpeta(carpeta):
+    """
+    Reescribe en formato 2 las plantillas de 'carpeta' que aún están en el 1,
+    guardando el original como <nombre>.json.v1.
+
+    Returns:
+        list: nombres de las plantillas migradas.
+    """
+    migradas = []
+    for ruta in sorted(Path(carpeta).glob('*.json')):
+        with open(ruta, 'r') as file:
+            datos = json.load(file)
+        validar_plantilla(datos)
+        if datos.get("version", 1) == VERSION_PLANTILLA:
+            continue
+        shutil.copy2(ruta, ruta.with_name(ruta.name + '.v1'))
+        with open(ruta, 'w') as file:
+            file.write(volcar_plantilla(migrar_plantilla(datos)))
+        migradas.append(ruta.stem)
+    return migradas
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Utilidades de plantillas.")
+    sub = parser.add_subparsers(dest="orden", required=True)
+    migrar = sub.add_parser("migrar", help="Reescribe las plantillas del formato 1 al 2")
+    migrar.add_argument("carpeta", nargs="?", default=os.getenv('TEMPLATES_FOLDER'))
+    args = parser.parse_args(argv)
+
+    if args.orden == "migrar":
+        try:
+            migradas = migrar_carpeta(args.carpeta)
+        except (OSError, ValueError) as e:
+            print(f"No se pudo migrar: {e}", file=sys.stderr)
+            return 1
+        print(f"Migradas {len(migradas)} plantillas: {', '.join(migradas) or '-'}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
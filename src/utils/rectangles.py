@@ -7,6 +7,9 @@ from dotenv import load_dotenv
 import streamlit as st
 import plotly.express as px
 
+from src.utils.redaccion import (color_para, desenfocar, desenfocar_regiones, poligonos_rectangulos,
+                                  redactar_regiones, sigma_desde_kernel)
+
 load_dotenv()
 
 def selector_y_guardado(imagen):
@@ -147,24 +150,35 @@ def _draw_rectangle_callback(event, x, y, flags, param):
         
 def draw_rectangle_on_image(image, corners, color=(128, 128, 128), thickness=-1):
     """
-    Draws a rectangle on an image given the coordinates of two opposite corners.
+    Draws rectangles on an image given the coordinates of two opposite corners.
+
+    Filled rectangles (thickness=-1) are applied with the cached mask
+    compositor in src/utils/redaccion.py: one masked copy per group of
+    nearby rectangles instead of one OpenCV call per rectangle. Outlines are
+    drawn with a single cv2.polylines call.
 
     Args:
         image (numpy array): numpy array from cv2 (BGR)
-        corner1 (tuple): The (x, y) coordinates of the first corner.
-        corner2 (tuple): The (x, y) coordinates of the opposite corner.
-        color (tuple): The BGR color of the rectangle. Default is green.
-        thickness (int): The thickness of the rectangle's border. Default is 2.
+        corners (list): [[corner1, corner2], ...] (x, y) coordinates of opposite corners.
+        color (tuple): The BGR color of the rectangle. Default is grey.
+        thickness (int): The thickness of the rectangle's border, -1 to fill it.
     
     Returns:
         np.ndarray: The image with the rectangle drawn on it, or None if the image
                     could not be loaded.
     """
-    try:        
-        for corner1, corner2 in corners:
-        
-            # Draw the rectangle using the two opposite corners
-            cv2.rectangle(image, corner1, corner2, color, thickness)
+    try:
+        # las esquinas se ordenan sin recortar (como cv2.rectangle, ambas incluidas)
+        rects = [(min(c1[0], c2[0]), min(c1[1], c2[1]), max(c1[0], c2[0]) + 1, max(c1[1], c2[1]) + 1)
+                 for c1, c2 in corners]
+        poligonos = poligonos_rectangulos(rects)
+        if thickness < 0:
+            # en gris se rellena con la luminancia del color, sin pasar a BGR
+            color = tuple(color) if isinstance(color, (tuple, list)) else color
+            redactar_regiones(image, poligonos, [('solido', 0.0, color)] * len(rects),
+                              clave=('rectangulos', tuple(rects)))
+        elif poligonos:
+            cv2.polylines(image, poligonos, True, color_para(image, color), thickness)
         
         return image
     
@@ -172,49 +186,35 @@ def draw_rectangle_on_image(image, corners, color=(128, 128, 128), thickness=-1)
         print(f"An unexpected error occurred: {e}")
         return None
     
-def apply_gaussian_blur_to_rectangle(image, corners, kernel_size=(101, 101)):
+def apply_gaussian_blur_to_rectangle(image, corners, kernel_size=(101, 101), metodo='piramide', suavizado=0):
     """
-    Applies a Gaussian blur to a rectangular region of an image.
+    Applies a Gaussian-like blur to the rectangular regions of an image.
+
+    Overlapping rectangles are merged and blurred in a single pass using the
+    redaction engine in src/utils/redaccion.py, with the same visual strength
+    as cv2.GaussianBlur(kernel_size) but at a fraction of the cost. The masks
+    are cached per (rectangles, image shape), so each group of regions costs
+    one blur and one masked copy.
 
     Args:
-        image_path (str): The path to the image file.
-        corner1 (tuple): The (x, y) coordinates of the first corner.
-        corner2 (tuple): The (x, y) coordinates of the opposite corner.
-        kernel_size (tuple): The size of the Gaussian blur kernel.
+        image (np.ndarray): numpy array from cv2 (BGR or GRAY).
+        corners (list): [[corner1, corner2], ...] (x, y) coordinates of opposite corners.
+        kernel_size (tuple): The size of the equivalent Gaussian blur kernel.
                              (e.g., (15, 15)). Must be positive and odd.
+        metodo (str): 'piramide', 'caja' or 'pixelar' (see redaccion.py).
+        suavizado (float): width in px of the feathered blur edges (0 = sharp).
 
     Returns:
         np.ndarray: The image with the blurred rectangle, or None if an error occurs.
     """
     try:
+        fuerza = sigma_desde_kernel(kernel_size)
         
         if corners:
-        
-            for corner1, corner2 in corners:
-            
-                # Ensure coordinates are in a consistent order (top-left, bottom-right)
-                x1, y1 = min(corner1[0], corner2[0]), min(corner1[1], corner2[1])
-                x2, y2 = max(corner1[0], corner2[0]), max(corner1[1], corner2[1])
-
-                # Extract the rectangular region of interest (ROI)
-                roi = image[y1:y2, x1:x2]
-            
-                # Apply Gaussian blur to the ROI
-                blurred_roi = cv2.GaussianBlur(roi, kernel_size, 0)
-            
-                # Place the blurred ROI back into the original image
-                image[y1:y2, x1:x2] = blurred_roi
+            image = desenfocar_regiones(image, corners, fuerza=fuerza, metodo=metodo, suavizado=suavizado)
                 
         else: # not rectangles
-            # Extract the rectangular region of interest (ROI)
-            roi = image
-            
-            # Apply Gaussian blur to the ROI
-            blurred_roi = cv2.GaussianBlur(roi, kernel_size, 0)
-            
-            # Place the blurred ROI back into the original image
-            image = blurred_roi
-            
+            image = desenfocar(image, fuerza=fuerza, metodo=metodo)
         
         return image
         
@@ -0,0 +1,51 @@
+"""
+Acceso desde Streamlit al almacén de imágenes de src/utils/almacen.py.
+
+El almacén es único por proceso (st.cache_resource) y cada sesión se
+identifica por un id guardado en st.session_state. En session_state solo
+quedan datos pequeños; las imágenes se piden aquí cuando una etapa las
+necesita a resolución completa.
+"""
+import uuid
+
+import streamlit as st
+
+from src.utils.almacen import almacen_desde_entorno
+
+
+@st.cache_resource
+def almacen():
+    return almacen_desde_entorno()
+
+
+def sesion_id():
+    if 'sesion_id' not in st.session_state:
+        st.session_state.sesion_id = uuid.uuid4().hex
+    return st.session_state.sesion_id
+
+
+def imagen(nombre):
+    """
+    La imagen 'nombre' de esta sesión (solo lectura) o None.
+    """
+    return almacen().obtener(sesion_id(), nombre)
+
+
+def guardar_imagen(nombre, image, huella=None):
+    return almacen().guardar(sesion_id(), nombre, image, huella)
+
+
+def hay_imagen(nombre):
+    return almacen().contiene(sesion_id(), nombre)
+
+
+def huella(nombre):
+    return almacen().huella(sesion_id(), nombre)
+
+
+def copiar_imagen(origen, destino):
+    return almacen().copiar(sesion_id(), origen, destino)
+
+
+def borrar_imagen(nombre=None):
+    almacen().borrar(sesion_id(), nombre)
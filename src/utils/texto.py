@@ -0,0 +1,122 @@
+"""
+Detección de regiones de texto con métodos clásicos (solo CPU, sin modelos).
+
+No depende de Streamlit. Sobre una copia de ANCHO_TRABAJO px de ancho:
+
+1. gradiente morfológico (el texto es una zona de muchos bordes finos),
+2. umbral de Otsu,
+3. cierre horizontal que une los caracteres de una misma línea,
+4. componentes conexas filtradas por alto, proporción y densidad de bordes.
+
+Las cajas se devuelven en coordenadas de la imagen de entrada. Con
+ajustar_rectangulos() los rectángulos de la plantilla crecen hasta cubrir
+el texto que ya tocaban, así un recorte algo descentrado no deja datos a
+la vista. Los rectángulos nunca se encogen; con ajustar_poligonos() las
+regiones que crecen pasan a ser su rectángulo ampliado.
+
+Objetivo: < 50 ms por tarjeta en un núcleo (benchmarks/bench_texto.py).
+"""
+import cv2
+import numpy as np
+
+ANCHO_TRABAJO = 640
+ALTO_LINEA = (0.02, 0.12)      # alto de una línea de texto, relativo al alto de la tarjeta
+ANCHO_MAXIMO = 0.7             # relativo al ancho de la tarjeta (descarta bordes y bandas)
+DENSIDAD_MINIMA = 0.2          # fracción de píxeles de borde dentro de la caja
+SOLAPE_MINIMO = 0.15           # fracción de la caja de texto dentro del rectángulo
+
+
+def detectar_texto(image, ancho_trabajo=ANCHO_TRABAJO):
+    """
+    Cajas de texto de una tarjeta recortada.
+
+    Args:
+        image (np.ndarray): tarjeta BGR o gris.
+        ancho_trabajo (int): ancho de la copia reducida sobre la que se trabaja.
+
+    Returns:
+        list: [(x1, y1, x2, y2), ...] en píxeles de 'image'.
+    """
+    h, w = image.shape[:2]
+    escala = min(1.0, ancho_trabajo / w)
+    if escala < 1.0:
+        image = cv2.resize(image, (ancho_trabajo, max(1, round(h * escala))), interpolation=cv2.INTER_AREA)
+    gray = image if image.ndim == 2 else cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+    hs, ws = gray.shape
+
+    gradiente = cv2.morphologyEx(gray, cv2.MORPH_GRADIENT, cv2.getStructuringElement(cv2.MORPH_ELLIPSE, (3, 3)))
+    _, bordes = cv2.threshold(gradiente, 0, 255, cv2.THRESH_BINARY | cv2.THRESH_OTSU)
+    # une los caracteres de una palabra/línea sin pegar líneas vecinas
+    ancho_cierre = max(3, round(ws * 0.02))
+    lineas = cv2.morphologyEx(bordes, cv2.MORPH_CLOSE, cv2.getStructuringElement(cv2.MORPH_RECT, (ancho_cierre, 1)))
+    lineas = cv2.morphologyEx(lineas, cv2.MORPH_OPEN, cv2.getStructuringElement(cv2.MORPH_RECT, (1, 2)))
+
+    n, _, stats, _ = cv2.connectedComponentsWithStats(lineas, connectivity=8)
+    integral = cv2.integral(bordes // 255)
+    alto_min, alto_max = ALTO_LINEA[0] * hs, ALTO_LINEA[1] * hs
+    cajas = []
+    for x, y, cw, ch, _ in stats[1:]:
+        if not alto_min <= ch <= alto_max or cw > ANCHO_MAXIMO * ws or cw < ch * 0.8:
+            continue
+        densidad = (integral[y + ch, x + cw] - integral[y, x + cw] - integral[y + ch, x] + integral[y, x]) / (cw * ch)
+        if densidad < DENSIDAD_MINIMA:
+            continue
+        cajas.append((int(x / escala), int(y / escala), int(np.ceil((x + cw) / escala)), int(np.ceil((y + ch) / escala))))
+    return cajas
+
+
+def ajustar_rectangulos(rects, cajas, size, solape_minimo=SOLAPE_MINIMO, margen=0.005):
+    """
+    Amplía cada rectángulo hasta cubrir las cajas de texto que solapa.
+
+    Args:
+        rects (list): [(x1, y1, x2, y2), ...] de la plantilla, en píxeles.
+        cajas (list): cajas de detectar_texto() en las mismas coordenadas.
+        size (tuple): (w, h) de la imagen, para recortar al borde.
+        solape_minimo (float): fracción de la caja que debe caer dentro del
+                               rectángulo para absorberla.
+        margen (float): margen extra alrededor del texto absorbido, relativo al ancho.
+
+    Returns:
+        list: rectángulos ajustados (nunca más pequeños que los originales).
+    """
+    w, h = size
+    m = round(margen * w)
+    ajustados = []
+    for x1, y1, x2, y2 in rects:
+        nx1, ny1, nx2, ny2 = x1, y1, x2, y2
+        for bx1, by1, bx2, by2 in cajas:
+            ix = min(x2, bx2) - max(x1, bx1)
+            iy = min(y2, by2) - max(y1, by1)
+            if ix <= 0 or iy <= 0 or ix * iy < solape_minimo * (bx2 - bx1) * (by2 - by1):
+                continue
+            nx1, ny1 = min(nx1, bx1 - m), min(ny1, by1 - m)
+            nx2, ny2 = max(nx2, bx2 + m), max(ny2, by2 + m)
+        ajustados.append((max(0, nx1), max(0, ny1), min(w, nx2), min(h, ny2)))
+    return ajustados
+
+
+def ajustar_poligonos(poligonos, cajas, size, **kwargs):
+    """
+    ajustar_rectangulos() para las regiones de una plantilla.
+
+    Args:
+        poligonos (list): array int32 (k, 2) de vértices por región, en píxeles.
+        cajas (list): cajas de detectar_texto() en las mismas coordenadas.
+        size (tuple): (w, h) de la imagen.
+
+    Returns:
+        list: los mismos polígonos; los que han crecido se sustituyen por su
+        rectángulo ampliado (que los contiene).
+    """
+    envolventes = [(int(p[:, 0].min()), int(p[:, 1].min()), int(p[:, 0].max()), int(p[:, 1].max()))
+                   for p in poligonos]
+    ajustados = []
+    for poligono, caja, (x1, y1, x2, y2) in zip(poligonos, envolventes,
+                                                ajustar_rectangulos(envolventes, cajas, size, **kwargs)):
+        # ajustar_rectangulos recorta al borde: solo cuenta como crecer si se sale de la caja
+        if x1 < caja[0] or y1 < caja[1] or x2 > caja[2] or y2 > caja[3]:
+            x1, y1, x2, y2 = min(x1, caja[0]), min(y1, caja[1]), max(x2, caja[2]), max(y2, caja[3])
+            poligono = np.int32([[x1, y1], [x2, y1], [x2, y2], [x1, y2]])
+        ajustados.append(poligono)
+    return ajustados
@@ -0,0 +1,45 @@
+"""
+Orientación EXIF de las imágenes subidas, comparada con PIL.ImageOps.exif_transpose.
+
+    python -m pytest -q
+"""
+import io
+
+import cv2
+import numpy as np
+import pytest
+from PIL import Image, ImageOps
+
+from src.utils.ingesta import EXIF_ORIENTACION, decodificar_subida, orientar
+
+
+def _png_con_orientacion(rgb, orientacion):
+    exif = Image.Exif()
+    exif[EXIF_ORIENTACION] = orientacion
+    buf = io.BytesIO()
+    Image.fromarray(rgb).save(buf, format="PNG", exif=exif.tobytes())
+    return buf.getvalue()
+
+
+def _referencia(datos):
+    # lo que mostraría un visor: PIL aplica la orientación EXIF
+    return np.asarray(ImageOps.exif_transpose(Image.open(io.BytesIO(datos))).convert("RGB"))
+
+
+@pytest.fixture
+def rgb():
+    # no cuadrada y sin simetrías, para distinguir giros de volteos
+    return np.random.default_rng(0).integers(0, 256, (3, 5, 3), dtype=np.uint8)
+
+
+@pytest.mark.parametrize("orientacion", range(1, 9))
+def test_orientar_como_pil(rgb, orientacion):
+    esperado = _referencia(_png_con_orientacion(rgb, orientacion))
+    assert np.array_equal(orientar(rgb, orientacion), esperado)
+
+
+@pytest.mark.parametrize("orientacion", range(1, 9))
+def test_decodificar_subida_orienta(rgb, orientacion):
+    datos = _png_con_orientacion(rgb, orientacion)
+    bgr = decodificar_subida(datos, lado_objetivo=None)
+    assert np.array_equal(cv2.cvtColor(bgr, cv2.COLOR_BGR2RGB), _referencia(datos))
@@ -0,0 +1,135 @@
+"""
+Cobertura de la redacción: cada región de la plantilla queda oculta del todo
+y fuera de ellas la imagen no cambia, en todos los modos, a varios tamaños y
+en color y gris.
+
+    python -m pytest -q
+"""
+import json
+from pathlib import Path
+
+import cv2
+import numpy as np
+import pytest
+
+from src.editor import procesar_imagen
+from src.utils.plantillas import compilar_plantilla
+from src.utils.redaccion import FUERZA_POR_DEFECTO, redactar_regiones
+
+TEMPLATES = Path(__file__).resolve().parent.parent / "templates"
+TAMANOS = [(640, 404), (1011, 638), (1280, 807)]
+
+# rectángulos solapados, un polígono girado y una región pegada al borde
+PLANTILLA = {
+    "version": 2,
+    "size": [860, 542],
+    "regiones": [
+        {"nombre": "nombre", "forma": "rectangulo", "puntos": [[0.35, 0.2], [0.7, 0.3]]},
+        {"nombre": "apellidos", "forma": "rectangulo", "puntos": [[0.6, 0.25], [0.9, 0.4]]},
+        {"nombre": "firma", "forma": "poligono", "puntos": [[0.1, 0.6], [0.35, 0.55], [0.4, 0.8], [0.15, 0.85]]},
+        {"nombre": "numero", "forma": "rectangulo", "puntos": [[0.8, 0.85], [1.0, 1.0]]},
+    ],
+}
+
+
+def _plantilla(modo=None):
+    datos = json.loads(json.dumps(PLANTILLA))
+    if modo:
+        for region in datos["regiones"]:
+            region["modo"] = modo
+    return compilar_plantilla(datos, "PRUEBA")
+
+
+def _ruido(size, color, seed=0):
+    # ruido sin zonas planas: cualquier desenfoque o pixelado cambia casi todos los píxeles
+    w, h = size
+    forma = (h, w, 3) if color else (h, w)
+    return np.random.default_rng(seed).integers(0, 256, forma, dtype=np.uint8)
+
+
+def _mascara(plantilla, size):
+    w, h = size
+    mascara = np.zeros((h, w), dtype=np.uint8)
+    for poligono in plantilla.poligonos(size):
+        cv2.fillPoly(mascara, [poligono], 255)
+    return mascara > 0
+
+
+def _cambiados(a, b):
+    distintos = a != b
+    return distintos.any(axis=-1) if distintos.ndim == 3 else distintos
+
+
+@pytest.mark.parametrize("size", TAMANOS)
+@pytest.mark.parametrize("color", [True, False])
+@pytest.mark.parametrize("negro", [True, False])
+def test_solido_cubre_las_regiones(size, color, negro):
+    plantilla = _plantilla()
+    image = _ruido(size, color)
+    resultado = procesar_imagen(image, black_n_white=False, solid_black=negro, solid_white=not negro,
+                                template=plantilla, alinear=False)
+    dentro = _mascara(plantilla, size)
+    assert dentro.any()
+    assert np.all(resultado[dentro] == (0 if negro else 255))
+    assert np.array_equal(resultado[~dentro], image[~dentro])
+
+
+@pytest.mark.parametrize("size", TAMANOS)
+@pytest.mark.parametrize("color", [True, False])
+@pytest.mark.parametrize("modo", ["desenfoque", "pixelado"])
+def test_desenfoque_cubre_las_regiones(size, color, modo):
+    plantilla = _plantilla(modo)
+    image = _ruido(size, color)
+    resultado = procesar_imagen(image, black_n_white=False, template=plantilla, alinear=False)
+    dentro = _mascara(plantilla, size)
+    cambiados = _cambiados(resultado, image)
+    assert cambiados[dentro].mean() > 0.99
+    assert not cambiados[~dentro].any()
+
+
+@pytest.mark.parametrize("modo", [None, "desenfoque", "pixelado"])
+def test_suavizado_no_destapa_las_regiones(modo):
+    size = TAMANOS[1]
+    plantilla = _plantilla(modo)
+    image = _ruido(size, True)
+    nitido = procesar_imagen(image, black_n_white=False, gaussian=True, template=plantilla, alinear=False)
+    suave = procesar_imagen(image, black_n_white=False, gaussian=True, template=plantilla, alinear=False,
+                            suavizar_bordes=True)
+    dentro = _mascara(plantilla, size)
+    # el interior es el mismo y la transición solo toca una franja estrecha alrededor
+    assert np.array_equal(suave[dentro], nitido[dentro])
+    franja = cv2.dilate(dentro.view(np.uint8), np.ones((31, 31), np.uint8)) > 0
+    assert not _cambiados(suave, image)[~franja].any()
+
+
+@pytest.mark.parametrize("nombre", ["DNI_FRONTAL", "DNI_TRASERA"])
+@pytest.mark.parametrize("gris", [False, True])
+def test_plantillas_del_repositorio(nombre, gris):
+    with open(TEMPLATES / f"{nombre}.json", encoding="utf-8") as f:
+        plantilla = compilar_plantilla(json.load(f), nombre)
+    size = (1011, 638)
+    image = _ruido(size, True)
+    resultado = procesar_imagen(image, black_n_white=gris, solid_black=True, template=plantilla, alinear=False)
+    original = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY) if gris else image
+    dentro = _mascara(plantilla, size)
+    assert np.all(resultado[dentro] == 0)
+    assert np.array_equal(resultado[~dentro], original[~dentro])
+
+
+def test_resultado_estable_con_mascaras_en_cache():
+    plantilla = _plantilla()
+    image = _ruido(TAMANOS[0], True, seed=1)
+    primera = procesar_imagen(image, black_n_white=False, gaussian=True, template=plantilla, alinear=False)
+    segunda = procesar_imagen(image, black_n_white=False, gaussian=True, template=plantilla, alinear=False)
+    assert np.array_equal(primera, segunda)
+
+
+def test_sin_clave_igual_que_con_clave():
+    plantilla = _plantilla()
+    size = TAMANOS[0]
+    image = _ruido(size, True, seed=2)
+    efectos = [("desenfoque", FUERZA_POR_DEFECTO, None)] * len(plantilla.regiones)
+    poligonos = plantilla.poligonos(size)
+    con_clave = redactar_regiones(image.copy(), poligonos, efectos, clave=plantilla.huella)
+    sin_clave = redactar_regiones(image.copy(), poligonos, efectos)
+    assert np.array_equal(con_clave, sin_clave)